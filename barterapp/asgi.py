@@ -12,5 +12,13 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'barterapp.settings')
+# Serve the read-heavy views natively async, see main/async_views.py
+os.environ.setdefault('ASYNC_VIEWS', 'True')
 
 application = get_asgi_application()
+
+# Async views answer from the in-memory pricelist on the event loop,
+# so load it now rather than blocking the loop on the first request
+from main.generate_pricelist import store  # noqa: E402
+
+store.snapshot()
@@ -22,6 +22,7 @@ if env_file:
 SECRET_KEY = os.environ.get("SECRET_KEY", "your-local-secret-key")
 DEBUG = os.environ.get("DEBUG", "False") == "True"
 ALLOWED_HOSTS=['127.0.0.1', 'localhost', 'barter-or-buy.onrender.com']
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
 
 # Application definition
 
@@ -37,12 +38,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",  # Serve static files
+    "main.middleware.StaticFilesMiddleware",  # Serve static files (WhiteNoise)
+    "main.middleware.MetricsMiddleware",  # Per-view latency for /metrics
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
+    "main.middleware.ProfilingMiddleware",  # ?profile / X-Profile for staff
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
@@ -59,6 +62,7 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "main.context_processors.crop_catalogue",
             ],
         },
     },
@@ -86,6 +90,21 @@ else:
         }
     }
 
+# Pragmas set on every new SQLite connection by main.db.configure_sqlite, so several
+# workers on one host can write without "database is locked" errors. WAL lets reads run
+# alongside the single writer, NORMAL sync only fsyncs at checkpoints (a power cut can
+# lose the last commits but never corrupts the file), busy_timeout makes a writer wait
+# its turn, and mmap_size/cache_size (negative means KiB) keep hot pages in memory.
+# Set SQLITE_TUNING=False to use SQLite's defaults.
+SQLITE_PRAGMAS = {
+    'busy_timeout': int(os.environ.get("SQLITE_BUSY_TIMEOUT", 5000)),
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+    'cache_size': -int(os.environ.get("SQLITE_CACHE_KIB", 64 * 1024)),
+    'temp_store': 'MEMORY',
+} if os.environ.get("SQLITE_TUNING", "True") == "True" else {}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
@@ -127,24 +146,122 @@ LOGIN_REDIRECT_URL = '/inbox/'
 
 LOGOUT_REDIRECT_URL = '/login/'
 
+# Daily pricelists (DD_MM_YYYY.csv); the newest one is served, and the directory
+# is checked for a newer list at most every PRICELIST_RELOAD_INTERVAL seconds (0 disables)
+PRICELIST_DIR = os.path.join(BASE_DIR, 'main', 'data')
+PRICELIST_RELOAD_INTERVAL = int(os.environ.get("PRICELIST_RELOAD_INTERVAL", 60))
+
+# Preprocessed pricelist snapshots, memory-mapped by every worker so they share one copy
+# and a cold start or reload skips parsing the csv (empty disables)
+PRICELIST_CACHE_DIR = os.environ.get("PRICELIST_CACHE_DIR", os.path.join(BASE_DIR, 'cache', 'pricelist'))
+
+# Where `manage.py benchmark_pricelist` saves its JSON results
+BENCHMARK_DIR = os.environ.get("BENCHMARK_DIR", os.path.join(BASE_DIR, 'cache', 'benchmarks'))
+
+# Autocomplete suggestions returned per keystroke, and the most a client may ask for
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
+
+# Seconds browsers and proxies may reuse answers that only depend on the pricelist;
+# after that they revalidate with the ETag, which changes with the dataset version
+PRICE_CACHE_MAX_AGE = {
+    'autocomplete': int(os.environ.get("AUTOCOMPLETE_MAX_AGE", 300)),
+    'barter_matrix': int(os.environ.get("BARTER_MATRIX_MAX_AGE", 300)),
+    'buy': int(os.environ.get("BUY_MAX_AGE", 300)),
+    'barter': int(os.environ.get("BARTER_MAX_AGE", 300)),
+}
+
+# Seconds rendered /buy/?crop=... and /barter/?crop1=...&crop2=... pages, and the result
+# fragments of posted forms, are kept in the server-side cache. Entries are keyed on the
+# dataset version, so a new pricelist is never answered from an old page.
+PAGE_CACHE_TIMEOUT = int(os.environ.get("PAGE_CACHE_TIMEOUT", 3600))
+
+# Most crops that can be priced in one /prices/ request
+PRICE_BATCH_MAX = 1000
+
+# Most rows, and most columns, in one /barter/matrix/ response; pick crops with ?row= and ?col=
+# to see part of a larger list
+BARTER_MATRIX_MAX_KEYS = int(os.environ.get("BARTER_MATRIX_MAX_KEYS", 2000))
+
+# Route the read-heavy views to their async versions in main/async_views.py.
+# barterapp/asgi.py turns this on; under WSGI the sync views avoid an event loop per request.
+ASYNC_VIEWS = os.environ.get("ASYNC_VIEWS", "False") == "True"
+
+# Staff requests sent with an X-Profile header or ?profile are run under cProfile and their
+# stats saved here with a summary of the top functions (empty disables profiling entirely)
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(BASE_DIR, 'cache', 'profiles'))
+PROFILE_TOP_FUNCTIONS = 40
+
+# Bearer token a Prometheus scraper sends to read /metrics; staff users can always read it
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+# Each gunicorn worker keeps its own metrics, so every worker writes them to its own file in
+# this directory from a background thread every METRICS_WRITE_INTERVAL seconds, and /metrics
+# adds the files up. Files of exited workers are merged into one archive file by the next scrape.
+# Empty the directory when the server is restarted. Left empty, /metrics only shows the worker
+# that answers it, which is only right with a single worker; it is off under `manage.py test`.
+METRICS_DIR = "" if TESTING else os.environ.get("METRICS_DIR", os.path.join(BASE_DIR, 'cache', 'metrics'))
+METRICS_WRITE_INTERVAL = float(os.environ.get("METRICS_WRITE_INTERVAL", "1"))
+
+# Feedback messages shown per inbox page and per "load more"
+INBOX_PAGE_SIZE = 20
+
+# Feature usage events are buffered in memory and written in batches off the request path.
+# The buffer is off under `manage.py test`, where events are written straight away.
+# A batch whose write fails is tried again on the next flushes, up to ATTEMPTS times in all.
+FEATURE_USAGE_BUFFER = {
+    'ENABLED': not TESTING,
+    'MAX_QUEUE': 10000,
+    'BATCH_SIZE': 100,
+    'FLUSH_INTERVAL': 5.0,
+    'ATTEMPTS': 3,
+}
+
+# Log records are queued and written by a background thread in each worker process, to a
+# file that is rotated and gzipped at LOG_MAX_BYTES with LOG_BACKUP_COUNT old files kept.
+# Workers take turns on the file through a lock file beside it, so only one rotates it.
+# At most LOG_QUEUE_SIZE records wait to be written; any more are dropped and counted.
+# LOG_JSON writes one JSON object per line instead of plain messages.
+LOG_FILE = os.environ.get("LOG_FILE", os.path.join(BASE_DIR, 'feature_usage.log'))
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.environ.get("LOG_BACKUP_COUNT", 5))
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", 10000))
+LOG_JSON = os.environ.get("LOG_JSON", "False") == "True"
+
 LOGGING = {
     'version': 1,
-    'disable_exsiting_loggers': False,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'plain': {
+            'format': '%(message)s',
+        },
+        'json': {
+            '()': 'main.log_handlers.JsonFormatter',
+        },
+    },
     'handlers': {
         'file': {
             'level': 'INFO',
-            'class': 'logging.FileHandler',
-            'filename': 'feature_usage.log',
+            'class': 'main.log_handlers.CompressedRotatingFileHandler',
+            'filename': LOG_FILE,
+            'maxBytes': LOG_MAX_BYTES,
+            'backupCount': LOG_BACKUP_COUNT,
+            'formatter': 'json' if LOG_JSON else 'plain',
+        },
+        'queue': {
+            'class': 'main.log_handlers.QueueListenerHandler',
+            'handlers': ['cfg://handlers.file'],
+            'maxsize': LOG_QUEUE_SIZE,
         },
     },
     'loggers':{
         'django':{
-            'handlers': ['file'],
+            'handlers': ['queue'],
             'level': 'INFO',
             'propagate': True,
         },
         'feature_usage': {
-            'handlers': ['file'],
+            'handlers': ['queue'],
             'level': 'INFO',
             'propagate': False,
         },
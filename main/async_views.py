@@ -0,0 +1,113 @@
+# Async versions of the read-heavy views, routed instead of their sync counterparts
+# in views.py when settings.ASYNC_VIEWS is on (the ASGI entry point turns it on).
+# They answer from the in-memory pricelist on the event loop and queue usage events
+# without waiting on the database, so one process can hold many slow requests open.
+from functools import wraps
+from django.http import HttpResponseNotAllowed, JsonResponse
+from django.shortcuts import render
+from main.forms import CropSearchForm, Compare
+from .generate_pricelist import get_matching_crops
+from .usage import arecord_usage
+from .caching import page_cache, price_cache
+from .metrics import timed
+from .views import (autocomplete_limit, autocomplete_query, catalogue_response, prices_response,
+                    buy_query, barter_query, buy_page, barter_page)
+
+render = timed('template_render')(render)
+
+
+def require_methods(*methods):
+    """
+        Takes in the allowed request methods as arguments.
+        Async counterpart of Django's require_http_methods, which only wraps sync views in Django 4.2.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return HttpResponseNotAllowed(methods)
+            return await view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+async def index(request):
+    await arecord_usage('Site visit', 1)
+    return render(request, 'main/index.html')
+
+
+@require_methods('GET')
+@price_cache('autocomplete', autocomplete_query)
+async def autocomplete(request):
+    crop = request.GET.get('term', '').upper()
+    result = get_matching_crops(crop, limit=autocomplete_limit(request))
+    return JsonResponse(result, safe=False)
+
+
+@require_methods('GET')
+async def catalogue(request, version):
+    """
+        Serves every crop display key as JSON, see views.catalogue.
+    """
+    return catalogue_response(request, version)
+
+
+@require_methods('POST')
+async def prices(request):
+    """
+        Prices a batch of crops in one request, see views.prices.
+    """
+    return prices_response(request)
+
+# csrf_exempt only wraps sync views in Django 4.2, so mark the view directly
+prices.csrf_exempt = True
+
+
+@price_cache('buy', buy_query)
+@page_cache('buy', buy_query)
+async def buy_result(request):
+    return buy_page(request, CropSearchForm({'crop': buy_query(request)}))
+
+
+@price_cache('barter', barter_query)
+@page_cache('barter', barter_query)
+async def barter_result(request):
+    crop1, crop2 = barter_query(request)
+    return barter_page(request, Compare({'crop1': crop1, 'crop2': crop2}))
+
+
+async def buy(request):
+    """
+        Prices a posted or linked crop, see views.buy.
+    """
+    if request.method == 'POST':
+        form = CropSearchForm(request.POST)
+        if form.is_valid():
+            await arecord_usage('Buy', form.cleaned_data['crop'])
+        return buy_page(request, form)
+
+    crop = buy_query(request)
+    if not crop:
+        return buy_page(request, CropSearchForm())
+    await arecord_usage('Buy', crop)
+    return await buy_result(request)
+
+
+async def barter(request):
+    """
+        Compares two posted or linked crops, see views.barter.
+    """
+    if request.method == 'POST':
+        form = Compare(request.POST)
+        if form.is_valid():
+            crop1 = form.cleaned_data['crop1']
+            crop2 = form.cleaned_data['crop2']
+            await arecord_usage('Barter', f'Crop1 - {crop1}, Crop2 - {crop2}')
+        return barter_page(request, form)
+
+    crop1, crop2 = barter_query(request)
+    if not (crop1 or crop2):
+        return barter_page(request, Compare())
+    if crop1 and crop2:
+        await arecord_usage('Barter', f'Crop1 - {crop1}, Crop2 - {crop2}')
+    return await barter_result(request)
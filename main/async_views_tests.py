@@ -0,0 +1,107 @@
+import json
+from unittest.mock import patch
+from asgiref.sync import iscoroutinefunction
+from django.core.cache import cache
+from django.test import TestCase, AsyncRequestFactory, override_settings
+from django.http import HttpResponse
+from . import async_views
+from .middleware import StaticFilesMiddleware
+from .models import FeatureUsage
+from .usage import arecord_usage
+
+
+class AsyncAutocompleteViewTest(TestCase):
+
+    @patch('main.async_views.get_matching_crops')
+    async def test_autocomplete_view(self, mock_get_matching_crops):
+        """Test async autocomplete answers with an ETag and revalidates to 304"""
+        mock_get_matching_crops.return_value = ['APPLE - CARTON']
+
+        response = await async_views.autocomplete(AsyncRequestFactory().get('/autocomplete/', {'term': 'app'}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), ['APPLE - CARTON'])
+        mock_get_matching_crops.assert_called_once_with('APP', limit=10)
+
+        request = AsyncRequestFactory().get('/autocomplete/', {'term': 'app'},
+                                            headers={'If-None-Match': response['ETag']})
+        response = await async_views.autocomplete(request)
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('max-age=300', response['Cache-Control'])
+        self.assertEqual(mock_get_matching_crops.call_count, 1)
+
+    async def test_autocomplete_view_require_get(self):
+        """Test async autocomplete rejects other methods"""
+        response = await async_views.autocomplete(AsyncRequestFactory().post('/autocomplete/'))
+        self.assertEqual(response.status_code, 405)
+
+
+class AsyncPricesViewTest(TestCase):
+
+    @patch('main.views.price_batch')
+    async def test_prices_view(self, mock_price_batch):
+        """Test the async batch prices view shares the sync view's handling"""
+        mock_price_batch.return_value = ('2025-09-05-abc', [])
+        request = AsyncRequestFactory().post('/prices/', json.dumps({'crops': ['apple - carton']}),
+                                             content_type='application/json')
+
+        response = await async_views.prices(request)
+        self.assertEqual(response.status_code, 200)
+        mock_price_batch.assert_called_once_with(['APPLE - CARTON'])
+        self.assertTrue(async_views.prices.csrf_exempt)
+
+        response = await async_views.prices(AsyncRequestFactory().post('/prices/', 'nope',
+                                                                       content_type='application/json'))
+        self.assertEqual(response.status_code, 400)
+
+
+class AsyncBuyViewTest(TestCase):
+
+    @patch('main.views.resolve_crop', lambda crop: crop)
+    @patch('main.views.priceOf')
+    async def test_buy_view_post_valid(self, mock_priceOf):
+        """Test the async buy view prices the crop and records its use"""
+        mock_priceOf.return_value = '5.50'
+
+        response = await async_views.buy(AsyncRequestFactory().post('/buy/', {'crop': 'APPLE - CARTON'}))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'5.50', response.content)
+        mock_priceOf.assert_called_once_with('APPLE - CARTON')
+        self.assertEqual(await FeatureUsage.objects.filter(feature_name='Buy').acount(), 1)
+
+    @patch('main.views.resolve_crop', lambda crop: crop)
+    @patch('main.views.priceOf')
+    async def test_buy_link_is_cached(self, mock_priceOf):
+        """Test the async buy link is served from the page cache after the first request"""
+        mock_priceOf.return_value = '5.50'
+        cache.clear()
+
+        for crop in ('apple - carton', 'APPLE  - CARTON'):
+            response = await async_views.buy(AsyncRequestFactory().get('/buy/', {'crop': crop}))
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b'R5.50/kg', response.content)
+            self.assertIn('ETag', response)
+        mock_priceOf.assert_called_once_with('APPLE - CARTON')
+        self.assertEqual(await FeatureUsage.objects.filter(feature_name='Buy').acount(), 2)
+
+
+class AsyncRecordUsageTest(TestCase):
+
+    @override_settings(FEATURE_USAGE_BUFFER={'ENABLED': True})
+    @patch('main.usage.recorder')
+    async def test_buffered_usage_is_queued(self, mock_recorder):
+        """Test that buffered usage is queued on the event loop without a database write"""
+        await arecord_usage('Buy', 'APPLE - CARTON')
+
+        mock_recorder.record.assert_called_once_with('Buy', 'APPLE - CARTON')
+        self.assertEqual(await FeatureUsage.objects.acount(), 0)
+
+
+class StaticFilesMiddlewareTest(TestCase):
+
+    def test_middleware_follows_chain_mode(self):
+        """Test the static files middleware stays async in an async chain and sync in a sync one"""
+        async def async_view(request):
+            return HttpResponse()
+
+        self.assertTrue(iscoroutinefunction(StaticFilesMiddleware(async_view)))
+        self.assertFalse(iscoroutinefunction(StaticFilesMiddleware(lambda request: HttpResponse())))
@@ -0,0 +1,187 @@
+import csv
+import os
+import platform
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+import numpy as np
+import main.generate_pricelist as generate_pricelist
+from main.generate_pricelist import (load_dataframe, build_snapshot, make_snapshot,
+                                     get_matching_crops, priceOf, compare)
+from main.price_store import PriceStore
+from main.price_table import PriceTable
+
+
+# Vocabulary for synthetic pricelists, in the style of the real DESC and CONTAINER columns
+PRODUCE = ['APPLE', 'AVOCADO', 'BANANA', 'BEANS', 'BEETROOT', 'BROCCOLI', 'CABBAGE', 'CARROTS',
+           'CUCUMBER', 'GRAPES', 'LEMONS', 'LETTUCE', 'MANGO', 'NAARTJIE', 'ONIONS', 'ORANGES',
+           'PAWPAW', 'PEACHES', 'PEARS', 'PEPPERS', 'PINEAPPLE', 'POTATOES', 'PUMPKIN', 'TOMATOES']
+VARIETIES = ['BRAEBURN', 'CRIPPS RED', 'FUJI', 'GRANNY SMITH', 'HASS', 'FUERTE', 'CAVENDISH',
+             'DRUMHEAD', 'NAVEL', 'VALENCIA', 'EUREKA', 'KEITT', 'PACKHAM', 'QUEEN', 'RED',
+             'GREEN', 'YELLOW', 'WHITE', 'BABY', 'ICEBERG', 'BUTTERNUT', 'SWEET', 'MIXED', 'OTHER',
+             'Early Red One', 'Golden Delicious', 'Pink Lady', 'Royal Gala', 'Top Red', 'Sundowner']
+CONTAINERS = [('ECONOPACK (12kg)', 12.0), ('MARK 4 (18.3kg)', 18.3), ('BAG/PACKET (1KG)', 1.0),
+              ('JUMBLE PACK (9kg)', 9.0), ('Single Layer (3kg)', 3.0), ('Prepack Punnet (5kg)', 5.0),
+              ('CARTON - OPEN TOP (4KG)', 4.0), ('SMALL BAG (10kg)', 10.0), ('BAG (15KG)', 15.0),
+              ('BAG (20KG)', 20.0), ('Box (4kg)', 4.0), ('BOX (5KG)', 5.0), ('Bin (250kg)', 250.0),
+              ('POCKET', 10.0), ('Tomato box (4kg)', 4.0), ('CARTON', 0.0)]
+GRADES = ['1M', '1L', '2M', '2L', '1S', '1X', '2S', '']
+
+COLUMNS = ['ITEM', 'DESC', 'CONTAINER', 'MASS', 'GRADE', 'COUNT',
+           'LOW PRICE', 'HIGH PRICE', 'AVERAGE PRICE']
+
+
+def synthetic_pricelist(rows, seed=0):
+    """
+        Takes in a number of rows and a random seed as arguments.
+        Returns a dataframe with the real pricelist's columns and value formats,
+        with about two rows (grades) per DESC and CONTAINER pair, as in the real lists.
+        Larger lists reuse the same pairs, as more markets and dates would.
+    """
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    pairs = [(f'{produce} {variety}', container, mass)
+             for produce in PRODUCE for variety in VARIETIES for container, mass in CONTAINERS]
+    chosen = rng.permutation(len(pairs))[:max(1, min(rows // 2, len(pairs)))]
+    picks = chosen[rng.integers(0, len(chosen), rows)]
+
+    descs = np.array([pair[0] for pair in pairs], dtype=object)[picks]
+    containers = np.array([pair[1] for pair in pairs], dtype=object)[picks]
+    mass = np.array([pair[2] for pair in pairs])[picks]
+    low = rng.integers(10, 900, rows)
+    high = low + rng.integers(0, 200, rows)
+    average = low + (high - low) * rng.random(rows)
+    counts = rng.integers(10, 200, rows).astype(object)
+    counts[rng.random(rows) < 0.8] = ''
+
+    return pd.DataFrame({
+        'ITEM': pd.Series(descs).str[:4].str.upper(),
+        'DESC': descs,
+        'CONTAINER': containers,
+        'MASS': [f'{value:.2f}' for value in mass],
+        'GRADE': np.array(GRADES, dtype=object)[rng.integers(0, len(GRADES), rows)],
+        'COUNT': counts,
+        'LOW PRICE': low.astype(str),
+        'HIGH PRICE': high.astype(str),
+        'AVERAGE PRICE': [f'{value:,.2f}' for value in average],
+    }, columns=COLUMNS)
+
+
+def write_pricelist(frame, directory, day='05_09_2025'):
+    """
+        Takes in a pricelist dataframe, a directory and a DD_MM_YYYY date as arguments.
+        Writes the dataframe as a fully quoted csv like the real lists.
+        Returns the csv path.
+    """
+    path = os.path.join(directory, f'{day}.csv')
+    frame.to_csv(path, index=False, quoting=csv.QUOTE_ALL)
+    return path
+
+
+def timed(function, calls):
+    """
+        Takes in a function taking one argument and the arguments to call it with.
+        Returns the seconds taken to call it once per argument.
+    """
+    start = time.perf_counter()
+    for argument in calls:
+        function(argument)
+    return time.perf_counter() - start
+
+
+def peak_memory(function):
+    """
+        Takes in a function taking no arguments.
+        Returns its result and the peak bytes it allocated, as traced by tracemalloc.
+    """
+    tracemalloc.start()
+    try:
+        result = function()
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def operation_result(seconds, operations, unit='ops'):
+    """
+        Takes in the seconds taken, the number of operations (or rows) and their unit.
+        Returns the time, the throughput and the mean microseconds per operation.
+    """
+    return {'seconds': round(seconds, 6),
+            f'{unit}_per_second': round(operations / seconds, 1) if seconds else None,
+            'microseconds_per_op': round(seconds / operations * 1e6, 3) if operations else None}
+
+
+def benchmark_size(rows, queries=1000, seed=0):
+    """
+        Takes in a pricelist size, the number of queries per operation and a random seed.
+        Times loading, searching, price lookups and comparisons on a synthetic
+        pricelist of that size. Returns the results as a dict.
+    """
+    directory = tempfile.mkdtemp(prefix='pricelist-benchmark-')
+    try:
+        path = write_pricelist(synthetic_pricelist(rows, seed), directory)
+        results = {'rows': rows, 'csv_bytes': os.path.getsize(path)}
+
+        start = time.perf_counter()
+        load_dataframe(path)
+        results['load_dataframe'] = operation_result(time.perf_counter() - start, rows, 'rows')
+
+        start = time.perf_counter()
+        snapshot = build_snapshot(path, 'benchmark')
+        results['build_snapshot'] = operation_result(time.perf_counter() - start, rows, 'rows')
+        _, results['build_snapshot']['peak_bytes'] = peak_memory(lambda: build_snapshot(path, 'benchmark'))
+
+        cache = os.path.join(directory, 'cache')
+        os.mkdir(cache)
+        snapshot.table.save(cache)
+        start = time.perf_counter()
+        make_snapshot(PriceTable.load(cache), 'benchmark', path)
+        results['load_cached_snapshot'] = operation_result(time.perf_counter() - start, rows, 'rows')
+
+        table = snapshot.table
+        keys = sorted(table.keys())
+        results['distinct_crops'] = len(keys)
+        results['table_bytes'] = table.memory_usage()['total']
+
+        picker = random.Random(seed)
+        crops = [picker.choice(keys) for _ in range(queries)]
+        terms = [crop[:picker.randint(2, 6)] for crop in crops]
+        pairs = [(crops[i], crops[-i - 1]) for i in range(queries)]
+
+        store = PriceStore(None, None)
+        store.swap(snapshot)
+        served, generate_pricelist.store = generate_pricelist.store, store
+        try:
+            results['get_matching_crops'] = operation_result(
+                timed(lambda term: get_matching_crops(term, limit=10), terms), queries)
+            results['priceOf'] = operation_result(timed(priceOf, crops), queries)
+            results['compare'] = operation_result(timed(lambda pair: compare(*pair), pairs), queries)
+        finally:
+            generate_pricelist.store = served
+        return results
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def run_benchmarks(sizes, queries=1000, seed=0):
+    """
+        Takes in a list of pricelist sizes, the number of queries per operation and a random seed.
+        Returns a report of every size's results plus details of the run.
+    """
+    import pandas as pd
+
+    return {
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'queries': queries,
+        'seed': seed,
+        'results': [benchmark_size(rows, queries, seed) for rows in sizes],
+    }
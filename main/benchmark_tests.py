@@ -0,0 +1,45 @@
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from .benchmark import COLUMNS, synthetic_pricelist, write_pricelist, benchmark_size
+from .price_table import PriceTable
+
+
+class SyntheticPricelistTest(unittest.TestCase):
+
+    def test_synthetic_pricelist_matches_csv_schema(self):
+        """Test that the synthetic list has the real columns and loads like a real list"""
+        frame = synthetic_pricelist(200, seed=1)
+        self.assertEqual(list(frame.columns), COLUMNS)
+        self.assertEqual(len(frame), 200)
+        
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = write_pricelist(frame, directory)
+        self.assertEqual(os.path.basename(path), '05_09_2025.csv')
+        self.assertEqual(list(pd.read_csv(path).columns), COLUMNS)
+        
+        table = PriceTable.from_csv(path)
+        self.assertEqual(len(table), 200)
+        self.assertLessEqual(len(table.keys()), 100)
+
+    def test_synthetic_pricelist_is_repeatable(self):
+        """Test that a seed always gives the same list"""
+        pd.testing.assert_frame_equal(synthetic_pricelist(50, seed=3), synthetic_pricelist(50, seed=3))
+
+    def test_benchmark_size(self):
+        """Test that every operation is timed and the served pricelist is restored"""
+        import main.generate_pricelist as generate_pricelist
+        served = generate_pricelist.store
+        
+        results = benchmark_size(100, queries=20)
+        
+        self.assertIs(generate_pricelist.store, served)
+        self.assertEqual(results['rows'], 100)
+        for name in ('load_dataframe', 'build_snapshot', 'load_cached_snapshot'):
+            self.assertGreater(results[name]['rows_per_second'], 0)
+        for name in ('get_matching_crops', 'priceOf', 'compare'):
+            self.assertGreater(results[name]['ops_per_second'], 0)
+        self.assertGreater(results['build_snapshot']['peak_bytes'], 0)
@@ -0,0 +1,112 @@
+import hashlib
+from functools import wraps
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from django.views.decorators.http import condition
+from .generate_pricelist import store
+from .middleware import ProfilingMiddleware
+
+
+def price_etag(query):
+    """
+        Takes in a normalised query as an argument.
+        Returns an ETag value made of the dataset version and a hash of the query.
+    """
+    digest = hashlib.sha1(repr(query).encode()).hexdigest()[:16]
+    return f'{store.version}-{digest}'
+
+
+def price_cache(endpoint, query_key):
+    """
+        Takes in an endpoint name and a function returning a request's normalised query.
+        Decorates a GET view whose answer depends only on the pricelist and that query:
+        responses get a strong ETag and a Cache-Control max-age taken from
+        settings.PRICE_CACHE_MAX_AGE[endpoint], and a request whose If-None-Match
+        matches is answered with 304 before the view does any work.
+        Works on both sync and async views.
+    """
+    def etag(request, *args, **kwargs):
+        return price_etag(query_key(request))
+
+    def add_cache_control(request, response):
+        if request.method in ('GET', 'HEAD') and response.status_code in (200, 304):
+            patch_cache_control(response, public=True,
+                                max_age=settings.PRICE_CACHE_MAX_AGE[endpoint])
+        return response
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            # Django's condition() only wraps sync views, so async views get the same checks here
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                response_etag = quote_etag(etag(request))
+                response = get_conditional_response(request, etag=response_etag)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                if request.method in ('GET', 'HEAD') and not response.has_header('ETag'):
+                    response['ETag'] = response_etag
+                return add_cache_control(request, response)
+            return async_wrapper
+
+        conditional_view = condition(etag_func=etag)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            return add_cache_control(request, conditional_view(request, *args, **kwargs))
+        return wrapper
+    return decorator
+
+
+def page_cache(endpoint, query_key):
+    """
+        Takes in an endpoint name and a function returning a request's normalised query.
+        Decorates a GET view whose page depends only on the pricelist and that query:
+        its 200 responses, headers and all, are kept in Django's cache for
+        settings.PAGE_CACHE_TIMEOUT seconds, keyed on the dataset version and the query,
+        and served from there without running the view. Requests asking to be profiled
+        skip the cache, so ProfilingMiddleware sees the view's work.
+        Pages must not hold anything per user, such as a CSRF token.
+        Works on both sync and async views.
+    """
+    def cache_key(request):
+        if ProfilingMiddleware.requested(request):
+            return None
+        return f'page:{endpoint}:{price_etag(query_key(request))}'
+
+    def cacheable(request, response):
+        return (request.method == 'GET' and response.status_code == 200
+                and not response.streaming and not response.cookies)
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                key = cache_key(request)
+                if key is None:
+                    return await view(request, *args, **kwargs)
+                cached = await cache.aget(key)
+                if cached is not None:
+                    return cached
+                response = await view(request, *args, **kwargs)
+                if cacheable(request, response):
+                    await cache.aset(key, response, settings.PAGE_CACHE_TIMEOUT)
+                return response
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key = cache_key(request)
+            if key is None:
+                return view(request, *args, **kwargs)
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+            response = view(request, *args, **kwargs)
+            if cacheable(request, response):
+                cache.set(key, response, settings.PAGE_CACHE_TIMEOUT)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,56 @@
+from unittest.mock import Mock, patch
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+from .caching import page_cache, price_etag
+from .generate_pricelist import make_snapshot
+from .price_store import PriceStore
+from .price_table import PriceTable
+
+
+class PriceEtagTest(SimpleTestCase):
+
+    def test_etag_follows_dataset_version(self):
+        """Test that the ETag changes when a new pricelist version is swapped in"""
+        store = PriceStore(None, None)
+        store.swap(make_snapshot(PriceTable.empty(), '2025-09-05-aaaa'))
+        with patch('main.caching.store', store):
+            etag = price_etag(('APPLE', 10))
+            self.assertTrue(etag.startswith('2025-09-05-aaaa-'))
+            self.assertEqual(price_etag(('APPLE', 10)), etag)
+            
+            store.swap(make_snapshot(PriceTable.empty(), '2025-09-06-bbbb'))
+            self.assertNotEqual(price_etag(('APPLE', 10)), etag)
+
+
+class PageCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.view = Mock(side_effect=self.page)
+        self.cached_view = page_cache('buy', lambda request: request.GET.get('crop'))(self.view)
+
+    @staticmethod
+    def page(request):
+        response = HttpResponse('<p>R5.50/kg</p>', content_type='text/html; charset=utf-8')
+        response['Content-Language'] = 'en'
+        return response
+
+    def test_cached_page_keeps_headers(self):
+        """Test that a page served from the cache has the headers the view set"""
+        request = RequestFactory().get('/buy/', {'crop': 'APPLE'})
+        first = self.cached_view(request)
+        cached = self.cached_view(request)
+        self.assertEqual(self.view.call_count, 1)
+        self.assertEqual(cached.content, first.content)
+        self.assertEqual(cached['Content-Type'], 'text/html; charset=utf-8')
+        self.assertEqual(cached['Content-Language'], 'en')
+
+    def test_profiled_request_skips_cache(self):
+        """Test that a request asking to be profiled runs the view and leaves the cache alone"""
+        factory = RequestFactory()
+        self.cached_view(factory.get('/buy/', {'crop': 'APPLE', 'profile': '1'}))
+        self.cached_view(factory.get('/buy/', {'crop': 'APPLE'}))
+        self.cached_view(factory.get('/buy/', {'crop': 'APPLE'}, headers={'X-Profile': '1'}))
+        self.assertEqual(self.view.call_count, 3)
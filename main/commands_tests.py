@@ -0,0 +1,171 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import date, timedelta
+from io import StringIO
+from unittest.mock import patch
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db.models.query import QuerySet
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from .models import FeatureUsage, FeatureUsageDaily, PricelistIngest, PricePoint
+
+
+class RollupUsageCommandTest(TestCase):
+
+    def setUp(self):
+        now = timezone.now()
+        self.yesterday = timezone.localdate() - timedelta(days=1)
+        FeatureUsage.objects.create(feature_name='Buy', used_at=now - timedelta(days=1))
+        FeatureUsage.objects.create(feature_name='Buy', used_at=now - timedelta(days=1))
+        FeatureUsage.objects.create(feature_name='Barter', used_at=now - timedelta(days=10))
+        # A stale rollup that the command should replace
+        FeatureUsageDaily.objects.create(day=self.yesterday, feature_name='Buy', count=99)
+        # Today's rollup belongs to the usage writer, which is still adding to it
+        FeatureUsage.objects.create(feature_name='Buy', used_at=now)
+        FeatureUsageDaily.objects.create(day=timezone.localdate(), feature_name='Buy', count=7)
+
+    def test_rollup_usage_all_days(self):
+        """Test that every rollup before today is rebuilt from the raw events"""
+        out = StringIO()
+        call_command('rollup_usage', stdout=out)
+        
+        self.assertIn('Rebuilt 2 daily rollups.', out.getvalue())
+        self.assertEqual(FeatureUsageDaily.objects.get(feature_name='Buy', day=self.yesterday).count, 2)
+        self.assertEqual(FeatureUsageDaily.objects.get(feature_name='Barter').count, 1)
+        self.assertEqual(FeatureUsageDaily.objects.get(feature_name='Buy', day=timezone.localdate()).count, 7)
+
+    def test_rollup_usage_recent_days(self):
+        """Test that --days only rebuilds recent rollups"""
+        call_command('rollup_usage', days=7, stdout=StringIO())
+        
+        self.assertEqual(FeatureUsageDaily.objects.get(feature_name='Buy', day=self.yesterday).count, 2)
+        self.assertFalse(FeatureUsageDaily.objects.filter(feature_name='Barter').exists())
+
+    def test_rollup_usage_updates_a_row_written_meanwhile(self):
+        """Test that a rollup recreated by the usage writer during the rebuild is overwritten, not duplicated"""
+        delete = QuerySet.delete
+        def writer_adds_a_row(queryset):
+            result = delete(queryset)
+            FeatureUsageDaily.objects.create(day=self.yesterday, feature_name='Buy', count=1)
+            return result
+
+        with patch.object(QuerySet, 'delete', autospec=True, side_effect=writer_adds_a_row):
+            call_command('rollup_usage', stdout=StringIO())
+        self.assertEqual(FeatureUsageDaily.objects.get(feature_name='Buy', day=self.yesterday).count, 2)
+
+
+class LoadPriceHistoryCommandTest(TestCase):
+
+    def test_load_price_history(self):
+        """Test every dated pricelist is loaded once per date, however often the command runs"""
+        call_command('load_price_history', stdout=StringIO())
+        call_command('load_price_history', stdout=StringIO())
+
+        self.assertEqual(set(PricePoint.objects.values_list('date', flat=True).distinct()),
+                         {date(2025, 9, 1), date(2025, 9, 5)})
+        history = PricePoint.history('APPLE BRAEBURN - ECONOPACK (12KG)')
+        self.assertEqual([(point.date, point.price_per_kg) for point in history],
+                         [(date(2025, 9, 1), 11.5), (date(2025, 9, 5), 0.0)])
+        self.assertEqual(PricePoint.on(date(2025, 9, 5)).count(),
+                         PricePoint.objects.filter(date=date(2025, 9, 5)).count())
+        # Loaded through the ingest, so a later incremental ingest skips the files
+        self.assertEqual(sorted(PricelistIngest.objects.values_list('name', flat=True)),
+                         ['01_09_2025.csv', '05_09_2025.csv'])
+        out = StringIO()
+        call_command('ingest_pricelists', stdout=out)
+        self.assertIn('0 pricelists to ingest, 2 unchanged.', out.getvalue())
+
+    def test_load_price_history_rejects_undated_files(self):
+        """Test that a pricelist without a DD_MM_YYYY name is reported"""
+        with self.assertRaises(CommandError):
+            call_command('load_price_history', __file__, stdout=StringIO())
+
+
+class IngestPricelistsCommandTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        for name in ('01_09_2025.csv', '05_09_2025.csv'):
+            shutil.copy(os.path.join(settings.PRICELIST_DIR, name), self.directory)
+
+    def ingest(self, *args):
+        """Run the ingest command over the test directory and return its output"""
+        out = StringIO()
+        call_command('ingest_pricelists', '--dir', self.directory, *args, stdout=out)
+        return out.getvalue()
+
+    def test_ingest_pricelists_skips_unchanged_files(self):
+        """Test files are parsed in a pool, then only new or changed files are ingested again"""
+        output = self.ingest('--workers', '2', '--batch-size', '50')
+        self.assertIn('2 pricelists to ingest, 0 unchanged.', output)
+        self.assertIn('rows/s.', output)
+        self.assertEqual(PricelistIngest.objects.count(), 2)
+        self.assertEqual(PricePoint.objects.count(), sum(PricelistIngest.objects.values_list('prices', flat=True)))
+
+        self.assertIn('0 pricelists to ingest, 2 unchanged.', self.ingest())
+        with open(os.path.join(self.directory, '05_09_2025.csv'), 'a') as pricelist:
+            pricelist.write('\n"ZZZZ","ZUCCHINI","BOX (5KG)","5.00","1M","","10","10","10.00"\n')
+        self.assertIn('1 pricelists to ingest, 1 unchanged.', self.ingest())
+        self.assertEqual(PricePoint.history('ZUCCHINI - BOX (5KG)').get().price_per_kg, 2.0)
+
+    def test_ingest_pricelists_resumes_after_a_crash(self):
+        """Test a file that fails midway leaves nothing behind and is picked up by the next run"""
+        replace_date = PricePoint.replace_date
+        def crash_on_second_file(day, prices, batch_size):
+            if day == date(2025, 9, 5):
+                raise RuntimeError('killed')
+            replace_date(day, prices, batch_size)
+
+        with patch.object(PricePoint, 'replace_date', side_effect=crash_on_second_file):
+            with self.assertRaises(RuntimeError):
+                self.ingest('--workers', '1')
+        self.assertEqual(list(PricelistIngest.objects.values_list('name', flat=True)), ['01_09_2025.csv'])
+        self.assertFalse(PricePoint.objects.filter(date=date(2025, 9, 5)).exists())
+
+        self.assertIn('1 pricelists to ingest, 1 unchanged.', self.ingest('--workers', '1'))
+        self.assertTrue(PricePoint.objects.filter(date=date(2025, 9, 5)).exists())
+
+    def test_ingest_pricelists_given_files(self):
+        """Test that only the named pricelists are ingested"""
+        output = self.ingest(os.path.join(self.directory, '05_09_2025.csv'))
+        self.assertIn('1 pricelists to ingest, 0 unchanged.', output)
+        self.assertEqual(list(PricelistIngest.objects.values_list('name', flat=True)), ['05_09_2025.csv'])
+
+
+class BenchmarkPricelistCommandTest(SimpleTestCase):
+
+    def test_benchmark_pricelist_saves_results(self):
+        """Test that the benchmark saves JSON results and compares them with a baseline"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        output = os.path.join(directory, 'results.json')
+        call_command('benchmark_pricelist', sizes=[60], queries=5, output=output, stdout=StringIO())
+        
+        with open(output) as results_file:
+            report = json.load(results_file)
+        self.assertEqual([result['rows'] for result in report['results']], [60])
+        self.assertIn('priceOf', report['results'][0])
+        
+        out = StringIO()
+        call_command('benchmark_pricelist', sizes=[60], queries=5, baseline=output,
+                     output=os.path.join(directory, 'again.json'), stdout=out)
+        self.assertIn('x baseline', out.getvalue())
+
+
+class BenchmarkSqliteCommandTest(SimpleTestCase):
+
+    def test_benchmark_sqlite_reports_both_profiles(self):
+        """Test that the write throughput is reported before and after the pragmas"""
+        out = StringIO()
+        call_command('benchmark_sqlite', workers=2, transactions=10, batch_size=2, stdout=out)
+        
+        lines = out.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith('default'))
+        self.assertIn('delete', lines[0])
+        self.assertTrue(lines[1].startswith('SQLITE_PRAGMAS'))
+        self.assertIn('wal', lines[1])
+        self.assertIn('as fast with 2 workers', lines[2])
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.urls import reverse
+from django.utils.functional import SimpleLazyObject
+from .generate_pricelist import store
+
+
+def crop_catalogue(request):
+    """
+        Adds the versioned URL of the crop catalogue for searchSuggestions.js,
+        and the dataset version and timeout that result fragments are cached under.
+        The version is only read from the price store when a template uses it, so
+        pages without a crop search never load or recheck the pricelist.
+    """
+    return {'CROP_CATALOGUE_URL': SimpleLazyObject(lambda: reverse('catalogue', args=[store.version])),
+            'DATASET_VERSION': SimpleLazyObject(lambda: store.version),
+            'PAGE_CACHE_TIMEOUT': settings.PAGE_CACHE_TIMEOUT}
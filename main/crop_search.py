@@ -0,0 +1,300 @@
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from functools import cached_property
+
+
+# Anything but letters, digits and decimal points separates words
+SEPARATORS = re.compile(r'[^A-Z0-9.]+|(?<![0-9])\.|\.(?![0-9])')
+
+
+def singular(word):
+    """
+        Takes in an upper case word as an argument.
+        Returns it with a regular English plural ending removed, e.g.
+        TOMATOES -> TOMATO, CHERRIES -> CHERRY, CARROTS -> CARROT.
+    """
+    if len(word) <= 3 or not word.isalpha():
+        return word
+    if word.endswith('IES'):
+        return word[:-3] + 'Y'
+    if word.endswith(('OES', 'SES', 'XES', 'CHES', 'SHES')):
+        return word[:-2]
+    if word.endswith('S') and not word.endswith('SS'):
+        return word[:-1]
+    return word
+
+
+def normalize(text):
+    """
+        Takes in a crop name or display key as an argument.
+        Returns its words upper cased, without punctuation and in the singular,
+        e.g. "Carrots - Bag (10kg)" -> ("CARROT", "BAG", "10KG").
+    """
+    return tuple(singular(word) for word in SEPARATORS.split(text.upper()) if word)
+
+
+def deletes(word, distance):
+    """
+        Takes in a word and a maximum number of deletions as arguments.
+        Returns the set of strings left by deleting up to that many of its letters,
+        the word itself included.
+    """
+    results = {word}
+    edge = {word}
+    for _ in range(distance):
+        edge = {variant[:i] + variant[i + 1:] for variant in edge for i in range(len(variant))}
+        results |= edge
+    return results
+
+
+def edit_distance(first, second, limit):
+    """
+        Takes in two strings and the largest distance of interest as arguments.
+        Returns their edit distance, counting insertions, deletions, substitutions and
+        swaps of adjacent letters, or limit + 1 as soon as it must exceed the limit.
+    """
+    if abs(len(first) - len(second)) > limit:
+        return limit + 1
+    previous = None
+    row = list(range(len(second) + 1))
+    for i in range(1, len(first) + 1):
+        earlier, previous, row = previous, row, [i] + [0] * len(second)
+        for j in range(1, len(second) + 1):
+            cost = first[i - 1] != second[j - 1]
+            row[j] = min(previous[j] + 1, row[j - 1] + 1, previous[j - 1] + cost)
+            if (i > 1 and j > 1 and first[i - 1] == second[j - 2]
+                    and first[i - 2] == second[j - 1]):
+                row[j] = min(row[j], earlier[j - 2] + 1)
+        if min(row) > limit:
+            return limit + 1
+    return row[-1]
+
+
+class FuzzyKeyIndex:
+    """
+        Typo-tolerant lookup of display keys by their normalized words.
+        Every word of every key goes into a SymSpell-style dictionary of the strings
+        left by deleting up to MAX_DISTANCE letters, so the words near a misspelt
+        one are found with a few dictionary lookups instead of a scan of them all.
+        A key matches a query when each query word is within its allowed edit
+        distance of one of the key's words.
+    """
+
+    MAX_DISTANCE = 2
+    # Words a key may add to a query and still be resolved to it, sizes aside:
+    # "pineapple queen" means the carton, but "carrots - bag (10kg)" is not the thrift pack
+    MAX_EXTRA_WORDS = 1
+
+    def __init__(self, keys):
+        self.keys = sorted(set(keys))
+        self.exact = defaultdict(list)
+        self.key_words = []
+        postings = defaultdict(list)
+        for key_id, key in enumerate(self.keys):
+            words = normalize(key)
+            self.exact[words].append(key)
+            self.key_words.append(words)
+            for word in set(words):
+                postings[word].append(key_id)
+        self.postings = dict(postings)
+
+        self.variants = defaultdict(set)
+        for word in self.postings:
+            for variant in deletes(word, self.allowed_distance(word)):
+                self.variants[variant].add(word)
+
+    def allowed_distance(self, word):
+        """
+            Takes in a word as an argument.
+            Returns how many edits it may be from a key's word: none for up to
+            3 letters, one for up to 6 and MAX_DISTANCE beyond that.
+        """
+        if len(word) <= 3:
+            return 0
+        if len(word) <= 6:
+            return min(1, self.MAX_DISTANCE)
+        return self.MAX_DISTANCE
+
+    def similar_words(self, word):
+        """
+            Takes in a normalized query word as an argument.
+            Returns a dict of the key words within its allowed distance, with their distances.
+        """
+        limit = self.allowed_distance(word)
+        candidates = set()
+        for variant in deletes(word, limit):
+            candidates |= self.variants.get(variant, set())
+        similar = {}
+        for candidate in candidates:
+            distance = edit_distance(word, candidate, limit)
+            if distance <= limit:
+                similar[candidate] = distance
+        return similar
+
+    def matches(self, term):
+        """
+            Takes in a crop name as an argument.
+            Returns (total edit distance, number of key words, key) for every key
+            the name could mean, best first.
+        """
+        words = normalize(term)
+        if not words:
+            return []
+        if words in self.exact:
+            return [(0, len(words), key) for key in self.exact[words]]
+
+        scores = None
+        for word in sorted(set(words), key=len, reverse=True):
+            distances = {}
+            for similar, distance in self.similar_words(word).items():
+                for key_id in self.postings[similar]:
+                    if scores is None or key_id in scores:
+                        distances[key_id] = min(distance, distances.get(key_id, distance))
+            if scores is None:
+                scores = distances
+            else:
+                scores = {key_id: scores[key_id] + distance for key_id, distance in distances.items()}
+            if not scores:
+                return []
+        return sorted((distance, len(self.key_words[key_id]), self.keys[key_id])
+                      for key_id, distance in scores.items())
+
+    def suggest(self, term, limit=5):
+        """
+            Takes in a crop name and a result limit as arguments.
+            Returns up to limit display keys the name could mean, best first:
+            fewest edits, then fewest extra words, then alphabetical.
+        """
+        return [key for _, _, key in self.matches(term)[:limit]]
+
+    def extra_words(self, term, key):
+        """
+            Takes in a crop name and a display key as arguments.
+            Returns the set of the key's words that no word of the name is close to,
+            leaving out sizes such as 10KG.
+        """
+        covered = set()
+        for word in set(normalize(term)):
+            covered |= self.similar_words(word).keys()
+        return {word for word in normalize(key)
+                if word not in covered and not any(char.isdigit() for char in word)}
+
+    def resolve(self, term):
+        """
+            Takes in a crop name as an argument.
+            Returns the one display key it most likely means, or None if there is
+            no match within the allowed edit distances, several keys match as closely
+            or the best key adds more than MAX_EXTRA_WORDS words to the name.
+        """
+        matches = self.matches(term)
+        if not matches or (len(matches) > 1 and matches[0][0] == matches[1][0]):
+            return None
+        key = matches[0][2]
+        if len(self.extra_words(term, key)) > self.MAX_EXTRA_WORDS:
+            return None
+        return key
+
+
+class CropSearchIndex:
+    """
+        Search index over the pricelist display keys ("DESC - CONTAINER").
+        Holds a sorted array of keys for prefix queries and an n-gram
+        inverted index for substring queries, both built once per pricelist.
+    """
+
+    GRAM_SIZE = 3
+
+    def __init__(self, keys):
+        self.keys = sorted(set(keys))
+        postings = defaultdict(list)
+        for key_id, key in enumerate(self.keys):
+            for gram in self._grams(key):
+                postings[gram].append(key_id)
+        self.postings = {gram: tuple(ids) for gram, ids in postings.items()}
+
+    def __len__(self):
+        return len(self.keys)
+
+    @cached_property
+    def fuzzy(self):
+        """
+            Returns the typo-tolerant index over the same keys, built on first use.
+        """
+        return FuzzyKeyIndex(self.keys)
+
+    def _grams(self, key):
+        """
+            Takes in a display key as an argument.
+            Returns the set of every substring of the key up to GRAM_SIZE long.
+        """
+        grams = set()
+        for size in range(1, self.GRAM_SIZE + 1):
+            for start in range(len(key) - size + 1):
+                grams.add(key[start:start + size])
+        return grams
+
+    def _prefix_matches(self, term):
+        """
+            Takes in a search term as an argument.
+            Yields the ids of keys starting with the term, in key order.
+        """
+        for key_id in range(bisect_left(self.keys, term), len(self.keys)):
+            if not self.keys[key_id].startswith(term):
+                break
+            yield key_id
+
+    def _candidates(self, term):
+        """
+            Takes in a search term as an argument.
+            Returns the sorted ids of keys that contain every n-gram of the term.
+            Short terms are looked up directly; longer terms intersect
+            the posting lists of their n-grams, smallest first.
+        """
+        if len(term) <= self.GRAM_SIZE:
+            return self.postings.get(term, ())
+
+        lists = []
+        for start in range(len(term) - self.GRAM_SIZE + 1):
+            ids = self.postings.get(term[start:start + self.GRAM_SIZE])
+            if not ids:
+                return ()
+            lists.append(ids)
+        lists.sort(key=len)
+        candidates = set(lists[0])
+        for ids in lists[1:]:
+            candidates.intersection_update(ids)
+            if not candidates:
+                return ()
+        return sorted(candidates)
+
+    def search(self, term, limit=None):
+        """
+            Takes in a search term and an optional result limit as arguments.
+            Returns the matching display keys ranked with key prefix matches
+            first, then matches at the start of a word, then any other
+            substring match. Keys are alphabetical within each rank.
+        """
+        term = term.strip().upper()
+        results = []
+        for key_id in self._prefix_matches(term):
+            results.append(self.keys[key_id])
+            if limit is not None and len(results) >= limit:
+                return results
+
+        word_matches = []
+        inner_matches = []
+        for key_id in self._candidates(term):
+            key = self.keys[key_id]
+            if key.startswith(term):
+                continue
+            if (' ' + key).find(' ' + term) >= 0:
+                word_matches.append(key)
+            elif term in key:
+                inner_matches.append(key)
+
+        results.extend(word_matches)
+        results.extend(inner_matches)
+        if limit is not None:
+            return results[:limit]
+        return results
@@ -0,0 +1,101 @@
+import unittest
+from .crop_search import CropSearchIndex, FuzzyKeyIndex, edit_distance, normalize
+
+
+class CropSearchIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        """Set up an index over a few display keys"""
+        self.index = CropSearchIndex([
+            'APPLE CRIPPS RED - ECONOPACK (12KG)',
+            'APPLE CRIPPS RED - MARK 4 (18.3KG)',
+            'APPLE CRIPPS RED - MARK 4 (18.3KG)',
+            'PINEAPPLE QUEEN - CARTON (8KG)',
+            'CUSTARD APPLE - BOX (4KG)',
+            'BANANA - BOX (12KG)',
+        ])
+
+    def test_duplicate_keys_are_removed(self):
+        """Test that each key is indexed once"""
+        self.assertEqual(len(self.index), 5)
+
+    def test_prefix_matches_rank_first(self):
+        """Test ranking of prefix, word-start and inner matches"""
+        result = self.index.search('apple')
+        self.assertEqual(result, [
+            'APPLE CRIPPS RED - ECONOPACK (12KG)',
+            'APPLE CRIPPS RED - MARK 4 (18.3KG)',
+            'CUSTARD APPLE - BOX (4KG)',
+            'PINEAPPLE QUEEN - CARTON (8KG)',
+        ])
+
+    def test_limit(self):
+        """Test that results are capped by the limit"""
+        self.assertEqual(len(self.index.search('ap', limit=2)), 2)
+        self.assertEqual(len(self.index.search('apple', limit=3)), 3)
+
+    def test_short_and_long_terms(self):
+        """Test substring queries shorter and longer than the n-gram size"""
+        self.assertEqual(self.index.search('z'), [])
+        self.assertEqual(self.index.search('(8'), ['PINEAPPLE QUEEN - CARTON (8KG)'])
+        self.assertEqual(self.index.search('MARK 4 (18'), ['APPLE CRIPPS RED - MARK 4 (18.3KG)'])
+        self.assertEqual(self.index.search('mango'), [])
+
+    def test_empty_index(self):
+        """Test searching an empty index"""
+        self.assertEqual(CropSearchIndex([]).search('apple'), [])
+
+
+class FuzzyKeyIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        """Set up a fuzzy index over a few display keys"""
+        self.index = FuzzyKeyIndex([
+            'CARROTS - BAG (7.5KG)',
+            'CARROTS - POCKET (10KG)',
+            'TOMATOES - TOMATO BOX (4KG)',
+            'PINEAPPLE QUEEN - CARTON (8KG)',
+            'POTATOES - BAG (10KG)',
+            'POTATOES - BAG - THRIFT PACK (10KG)',
+        ])
+
+    def test_normalize(self):
+        """Test that case, punctuation and plurals are normalized away"""
+        self.assertEqual(normalize('Carrots - Bag (7.5kg)'), ('CARROT', 'BAG', '7.5KG'))
+        self.assertEqual(normalize('tomatoes, cherries.'), ('TOMATO', 'CHERRY'))
+        self.assertEqual(normalize('GRASS'), ('GRASS',))
+
+    def test_edit_distance(self):
+        """Test the bounded edit distance, with swapped letters counting once"""
+        self.assertEqual(edit_distance('TOMATOE', 'TOMATO', 2), 1)
+        self.assertEqual(edit_distance('PINAPPLE', 'PINEAPPLE', 2), 1)
+        self.assertEqual(edit_distance('CARORT', 'CARROT', 2), 1)
+        self.assertEqual(edit_distance('CAROTS', 'CARROT', 2), 2)
+        self.assertEqual(edit_distance('BANANA', 'CARROT', 2), 3)
+
+    def test_resolve_near_misses(self):
+        """Test that a single close key is resolved despite case, plurals and typos"""
+        self.assertEqual(self.index.resolve('carrot - pocket'), 'CARROTS - POCKET (10KG)')
+        self.assertEqual(self.index.resolve('Tomatoe'), 'TOMATOES - TOMATO BOX (4KG)')
+        self.assertEqual(self.index.resolve('pinaple queen'), 'PINEAPPLE QUEEN - CARTON (8KG)')
+        self.assertEqual(self.index.resolve('potato bag 10kg'), 'POTATOES - BAG (10KG)')
+        self.assertEqual(self.index.resolve('potato thrift pack'), 'POTATOES - BAG - THRIFT PACK (10KG)')
+
+    def test_extra_words_are_suggested(self):
+        """Test that a key adding more than one word to the name is suggested rather than resolved"""
+        index = FuzzyKeyIndex(['CARROTS - BAG - THRIFT PACK (10KG)', 'CARROTS - BAG (7.5KG)'])
+        self.assertEqual(index.extra_words('carrots - bag (10kg)', 'CARROTS - BAG - THRIFT PACK (10KG)'),
+                         {'THRIFT', 'PACK'})
+        self.assertIsNone(index.resolve('carrots - bag (10kg)'))
+        self.assertEqual(index.suggest('carrots - bag (10kg)'), ['CARROTS - BAG - THRIFT PACK (10KG)'])
+        self.assertEqual(index.resolve('carrot bag thrift (10kg)'), 'CARROTS - BAG - THRIFT PACK (10KG)')
+
+    def test_ambiguous_and_distant_terms(self):
+        """Test that ties are suggested rather than resolved, and distant terms match nothing"""
+        self.assertIsNone(self.index.resolve('carrot'))
+        self.assertEqual(self.index.suggest('carrot'), ['CARROTS - BAG (7.5KG)', 'CARROTS - POCKET (10KG)'])
+        self.assertEqual(self.index.suggest('bag', limit=1), ['CARROTS - BAG (7.5KG)'])
+        self.assertEqual(self.index.suggest('mango'), [])
+        self.assertEqual(self.index.suggest('bat'), [])
+        self.assertEqual(self.index.suggest('  - '), [])
+
@@ -0,0 +1,37 @@
+from django.conf import settings
+
+
+def pragma_statements(pragmas):
+    """
+        Takes in a dict of SQLite pragma names and values as an argument.
+        Returns the PRAGMA statements that set them, in order.
+        Raises ValueError if a name or value is not a plain word or number.
+    """
+    statements = []
+    for name, value in pragmas.items():
+        if not name.isidentifier() or not (isinstance(value, int) or str(value).isidentifier()):
+            raise ValueError(f'Invalid SQLite pragma {name} = {value!r}')
+        statements.append(f'PRAGMA {name} = {value}')
+    return statements
+
+
+def apply_pragmas(cursor, pragmas):
+    """
+        Takes in a DB-API cursor on an SQLite connection and a dict of pragmas as arguments.
+        Sets each pragma on the connection.
+    """
+    for statement in pragma_statements(pragmas):
+        cursor.execute(statement)
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """
+        connection_created receiver that sets settings.SQLITE_PRAGMAS on every new
+        SQLite connection, so each worker process gets the same tuning.
+        Connections to any other database are left alone.
+    """
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', None)
+    if connection.vendor != 'sqlite' or not pragmas:
+        return
+    with connection.cursor() as cursor:
+        apply_pragmas(cursor, pragmas)
@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+from types import SimpleNamespace
+from django.db import connections
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import SimpleTestCase, override_settings
+from .db import configure_sqlite, pragma_statements
+
+PRAGMAS = {'busy_timeout': 2000, 'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'cache_size': -2048}
+
+
+class PragmaStatementsTest(SimpleTestCase):
+
+    def test_pragma_statements(self):
+        """Test that each pragma becomes one statement, in order"""
+        self.assertEqual(pragma_statements({'busy_timeout': 5000, 'journal_mode': 'WAL', 'cache_size': -64}),
+                         ['PRAGMA busy_timeout = 5000', 'PRAGMA journal_mode = WAL', 'PRAGMA cache_size = -64'])
+
+    def test_pragma_statements_rejects_sql(self):
+        """Test that names and values which are not plain words or numbers are refused"""
+        with self.assertRaises(ValueError):
+            pragma_statements({'journal_mode': 'WAL; DROP TABLE main_featureusage'})
+        with self.assertRaises(ValueError):
+            pragma_statements({'journal mode': 'WAL'})
+
+
+class ConfigureSqliteTest(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'db.sqlite3')
+
+    def connect(self):
+        connection = DatabaseWrapper({**connections['default'].settings_dict, 'NAME': self.path}, alias='pragmas')
+        connection.ensure_connection()
+        self.addCleanup(connection.close)
+        return connection
+
+    def pragma(self, connection, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    @override_settings(SQLITE_PRAGMAS=PRAGMAS)
+    def test_new_connections_get_the_pragmas(self):
+        """Test that a new SQLite connection is switched to WAL with the configured pragmas"""
+        connection = self.connect()
+        
+        self.assertEqual(self.pragma(connection, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(connection, 'busy_timeout'), 2000)
+        self.assertEqual(self.pragma(connection, 'synchronous'), 1)
+        self.assertEqual(self.pragma(connection, 'cache_size'), -2048)
+
+    @override_settings(SQLITE_PRAGMAS={})
+    def test_empty_pragmas_keep_sqlite_defaults(self):
+        """Test that turning the tuning off leaves the rollback journal in place"""
+        self.assertEqual(self.pragma(self.connect(), 'journal_mode'), 'delete')
+
+    @override_settings(SQLITE_PRAGMAS=PRAGMAS)
+    def test_other_databases_are_left_alone(self):
+        """Test that connections to other database vendors are not sent pragmas"""
+        connection = SimpleNamespace(vendor='postgresql', cursor=None)
+        configure_sqlite(sender=None, connection=connection)
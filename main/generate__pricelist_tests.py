@@ -1,14 +1,15 @@
+import gzip
+import json
 import unittest
 from unittest.mock import patch, mock_open
 import pandas as pd
-import sys
-import os
-
-# Add the path to import the module
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-
-# Import the functions to test
-from generate_pricelist import load_dataframe, get_matching_crops, priceOf, compare
+import main.generate_pricelist as generate_pricelist
+from main.benchmark import COLUMNS
+from main.generate_pricelist import (load_dataframe, get_matching_crops, priceOf, compare, price_batch,
+                                     ratio_matrix, ratio_rows, make_snapshot, build_snapshot, crop_catalogue,
+                                     resolve_crop, suggest_crops)
+from main.price_store import PriceStore
+from main.price_table import PriceTable
 
 
 class TestPriceListFunctions(unittest.TestCase):
@@ -37,11 +38,17 @@ class TestPriceListFunctions(unittest.TestCase):
             'AVERAGE PRICE': [90.0, 60.0, 35.0, 80.0]
         })
     
+    def use_pricelist(self, frame, version='test'):
+        """Serve the given dataframe from a price store for the duration of a test"""
+        store = PriceStore(None, None)
+        store.swap(make_snapshot(PriceTable.from_dataframe(frame), version))
+        return patch('main.generate_pricelist.store', store)
+    
     @patch('pandas.read_csv')
     def test_load_dataframe_success(self, mock_read_csv):
         """Test loading dataframe successfully"""
         # Mock the read_csv function to return our test data
-        mock_read_csv.return_value = pd.DataFrame([x[0].split(',') for x in self.test_data])
+        mock_read_csv.return_value = pd.DataFrame([x[0].split(',') for x in self.test_data], columns=COLUMNS)
         
         # Call the function
         result = load_dataframe()
@@ -66,14 +73,22 @@ class TestPriceListFunctions(unittest.TestCase):
         # Verify the function returns an empty DataFrame
         self.assertIsInstance(result, pd.DataFrame)
         self.assertTrue(result.empty)
+
+    def test_build_snapshot_unreadable_csv(self):
+        """Test that an unreadable csv is logged with its traceback and gives an empty snapshot"""
+        with self.assertLogs('main.generate_pricelist', level='ERROR') as logs:
+            snapshot = build_snapshot('/nonexistent/pricelist.csv', '2025-09-05-aaaa')
+        self.assertEqual(len(snapshot.table.keys()), 0)
+        self.assertIn('/nonexistent/pricelist.csv', logs.output[0])
+        self.assertIsNotNone(logs.records[0].exc_info)
     
     def test_get_matching_crops_empty_dataframe(self):
         """Test get_matching_crops with empty dataframe"""
         # Create an empty dataframe
         empty_df = pd.DataFrame()
         
-        # Patch the global df variable
-        with patch('generate_pricelist.df', empty_df):
+        # Serve the test dataframe from the price store
+        with self.use_pricelist(empty_df):
             result = get_matching_crops("apple")
             
             # Should return empty list
@@ -84,8 +99,8 @@ class TestPriceListFunctions(unittest.TestCase):
         # Create a dataframe without DESC column
         invalid_df = pd.DataFrame({'OTHER_COL': [1, 2, 3]})
         
-        # Patch the global df variable
-        with patch('generate_pricelist.df', invalid_df):
+        # Serve the test dataframe from the price store
+        with self.use_pricelist(invalid_df):
             result = get_matching_crops("apple")
             
             # Should return empty list
@@ -93,9 +108,9 @@ class TestPriceListFunctions(unittest.TestCase):
     
     def test_get_matching_crops_found(self):
         """Test get_matching_crops when matches are found"""
-        # Patch the global df variable
-        with patch('generate_pricelist.df', self.mock_df):
-            result = get_matching_crops("apple")
+        # Serve the test dataframe from the price store
+        with self.use_pricelist(self.mock_df):
+            result = get_matching_crops("carton")
             
             # Should return matching crops
             self.assertEqual(len(result), 2)
@@ -104,8 +119,8 @@ class TestPriceListFunctions(unittest.TestCase):
     
     def test_get_matching_crops_not_found(self):
         """Test get_matching_crops when no matches are found"""
-        # Patch the global df variable
-        with patch('generate_pricelist.df', self.mock_df):
+        # Serve the test dataframe from the price store
+        with self.use_pricelist(self.mock_df):
             result = get_matching_crops("mango")
             
             # Should return empty list
@@ -113,8 +128,8 @@ class TestPriceListFunctions(unittest.TestCase):
     
     def test_priceOf_found(self):
         """Test priceOf when crop is found"""
-        # Patch the global df variable
-        with patch('generate_pricelist.df', self.mock_df):
+        # Serve the test dataframe from the price store
+        with self.use_pricelist(self.mock_df):
             result = priceOf("RED DELICIOUS - CARTON")
             
             # Should return the correct price per kg
@@ -123,17 +138,17 @@ class TestPriceListFunctions(unittest.TestCase):
     
     def test_priceOf_not_found(self):
         """Test priceOf when crop is not found"""
-        # Patch the global df variable
-        with patch('generate_pricelist.df', self.mock_df):
+        # Serve the test dataframe from the price store
+        with self.use_pricelist(self.mock_df):
             result = priceOf("MANGO - BOX")
             
-            # Should return error message
-            self.assertEqual(result, "Crop not found on list.")
+            # Should return None, which the buy page shows as not on the pricelist
+            self.assertIsNone(result)
     
     def test_compare_success(self):
         """Test compare with valid crops"""
-        # Patch the global df variable
-        with patch('generate_pricelist.df', self.mock_df):
+        # Serve the test dataframe from the price store
+        with self.use_pricelist(self.mock_df):
             crop1 = "RED DELICIOUS - CARTON"
             crop2 = "CAVENDISH - BOX"
             
@@ -150,17 +165,91 @@ class TestPriceListFunctions(unittest.TestCase):
             self.assertEqual(result[4], f"{price1:.2f}")
             self.assertEqual(result[5], f"{price2:.2f}")
     
+    def test_near_miss_names_resolve(self):
+        """Test that prices and comparisons accept crop names with typos and plurals"""
+        with self.use_pricelist(self.mock_df):
+            self.assertEqual(priceOf("RED DELICOUS - CARTONS"), f"{90.0 / 18.0:.2f}")
+            self.assertEqual(compare("cavendish box", "NAVLE")[0], "Cavendish - Box")
+            self.assertEqual(resolve_crop("CARTON"), None)
+            self.assertEqual(suggest_crops("CARTON"), ["GRANNY SMITH - CARTON", "RED DELICIOUS - CARTON"])
+
     def test_compare_invalid_crop(self):
         """Test compare with invalid crops"""
-        # Patch the global df variable
-        with patch('generate_pricelist.df', self.mock_df):
+        # Serve the test dataframe from the price store
+        with self.use_pricelist(self.mock_df):
             crop1 = "RED DELICIOUS - CARTON"
             crop2 = "MANGO - BOX"  # Invalid crop
             
             result = compare(crop1, crop2)
             
-            # Should return error message
-            self.assertEqual(result, "Error comparing prices.")
+            # Should return None, which the barter page shows as not on the pricelist
+            self.assertIsNone(result)
+
+    
+    def test_price_batch(self):
+        """Test pricing several crops at once, with an unknown crop among them"""
+        with self.use_pricelist(self.mock_df, version='batch'):
+            version, results = price_batch(["CAVENDISH - BOX", "MANGO - BOX", "NAVEL - BAG"])
+            
+            self.assertEqual(version, 'batch')
+            self.assertEqual(results[0], {'crop': "CAVENDISH - BOX", 'price_per_kg': 3.0,
+                                          'mass': 20.0, 'average_price': 60.0,
+                                          'min_price_per_kg': 3.0, 'max_price_per_kg': 3.0,
+                                          'grades': 1})
+            self.assertEqual(results[1], {'crop': "MANGO - BOX", 'error': 'Crop not found on list.'})
+            self.assertEqual(results[2]['price_per_kg'], 3.5)
+            self.assertEqual(price_batch([]), ('batch', []))
+    
+    def test_ratio_matrix(self):
+        """Test the barter ratio matrix, including masked zero prices"""
+        frame = self.mock_df.copy()
+        frame['AVERAGE PRICE'] = [90.0, 60.0, 0.0, 80.0]
+        with self.use_pricelist(frame, version='matrix'):
+            matrix = ratio_matrix()
+            
+            self.assertEqual(matrix.keys, ["CAVENDISH - BOX", "GRANNY SMITH - CARTON",
+                                           "NAVEL - BAG", "RED DELICIOUS - CARTON"])
+            _, rows = ratio_rows(matrix, ["RED DELICIOUS - CARTON", "CAVENDISH - BOX"],
+                                 ["CAVENDISH - BOX", "RED DELICIOUS - CARTON"])
+            (_, red_delicious), (_, cavendish) = rows
+            self.assertAlmostEqual(red_delicious[0], round((90.0 / 18.0) / (60.0 / 20.0), 4))
+            self.assertAlmostEqual(cavendish[1], round((60.0 / 20.0) / (90.0 / 18.0), 4))
+            # Only the prices are kept, not an n x n matrix
+            self.assertEqual(matrix.price_per_kg.shape, (4,))
+            
+            # Built once per dataset version
+            self.assertIs(ratio_matrix(), matrix)
+            
+            columns, rows = ratio_rows(matrix, ["NAVEL - BAG", "CAVENDISH - BOX"],
+                                       ["CAVENDISH - BOX", "RED DELICIOUS - CARTON"])
+            self.assertEqual(columns, ["CAVENDISH - BOX", "RED DELICIOUS - CARTON"])
+            self.assertEqual(list(rows), [("NAVEL - BAG", [None, None]),
+                                          ("CAVENDISH - BOX", [1.0, 0.6])])
+            
+            with self.assertRaises(KeyError):
+                ratio_rows(matrix, ["MANGO - BOX"])
+    
+    def test_crop_catalogue(self):
+        """Test the crop catalogue is sorted JSON, precompressed, built once per version"""
+        with self.use_pricelist(self.mock_df, version='catalogue'):
+            catalogue = crop_catalogue()
+            
+            self.assertEqual(catalogue.version, 'catalogue')
+            self.assertEqual(json.loads(catalogue.json), ["CAVENDISH - BOX", "GRANNY SMITH - CARTON",
+                                                          "NAVEL - BAG", "RED DELICIOUS - CARTON"])
+            self.assertEqual(gzip.decompress(catalogue.gzip), catalogue.json)
+            self.assertIs(crop_catalogue(), catalogue)
+    
+    def test_priceOf_follows_swapped_snapshot(self):
+        """Test that lookups use the new pricelist once it is swapped in"""
+        with self.use_pricelist(self.mock_df):
+            self.assertEqual(priceOf("NAVEL - BAG"), "3.50")
+            
+            replaced_df = self.mock_df.copy()
+            replaced_df['AVERAGE PRICE'] = [90.0, 60.0, 70.0, 80.0]
+            generate_pricelist.store.swap(make_snapshot(PriceTable.from_dataframe(replaced_df), 'replaced'))
+            self.assertEqual(priceOf("NAVEL - BAG"), "7.00")
+            self.assertEqual(generate_pricelist.store.version, 'replaced')
 
 
 if __name__ == '__main__':
@@ -1,90 +1,291 @@
-import os
-import re
-import pandas as pd
+import gzip
+import json
+import logging
+import math
+from collections import namedtuple
 from django.conf import settings
+from main.crop_search import CropSearchIndex
+from main.metrics import timed
+from main.price_store import PriceSnapshot, PriceStore, latest_pricelist
 
+logger = logging.getLogger(__name__)
 
-CSV_PATH = os.path.join(settings.BASE_DIR, 'main/data', '05_09_2025.csv')
 
-
-def load_dataframe():
+def load_dataframe(path=None):
     """
+        Takes in an optional csv path as an argument, defaulting to the newest pricelist.
         Reads the csv pricelist.
         Returns an edited dataframe of the pricelist.
     """
+    import pandas as pd
+
     try:
-        df=pd.read_csv(CSV_PATH, encoding='utf-8')
-        df['DESC'] = df['DESC'].apply(lambda x: re.sub(r'["]', '', x.upper()))
-        df['CONTAINER'] = df['CONTAINER'].apply(lambda x: re.sub(r'["]', '', x.upper()))
+        df=pd.read_csv(path or latest_pricelist(settings.PRICELIST_DIR), encoding='utf-8')
+        df['DESC'] = df['DESC'].str.upper().str.replace('"', '', regex=False)
+        df['CONTAINER'] = df['CONTAINER'].str.upper().str.replace('"', '', regex=False)
         return df
     
-    except Exception as e:
-        print("Error loading CSV", e)
+    except Exception:
+        logger.exception('Could not load the pricelist csv')
         return pd.DataFrame()
 
 
-df = load_dataframe()
+def make_snapshot(table, version, path=None):
+    """
+        Takes in a price table, its dataset version and its csv path as arguments.
+        Returns a price snapshot holding the table and its search index.
+    """
+    return PriceSnapshot(version, path, table, CropSearchIndex(table.keys()))
 
-    
-def get_matching_crops(crop):
+
+def build_snapshot(path, version):
+    """
+        Takes in a csv path and its dataset version as arguments.
+        Returns a price snapshot of the csv, or an empty one if there is no path
+        or the csv cannot be read.
+    """
+    from main.price_table import PriceTable
+
+    try:
+        table = PriceTable.from_csv(path) if path else PriceTable.empty()
+    except Exception:
+        logger.exception('Could not load the pricelist csv %s', path)
+        table = PriceTable.empty()
+    return make_snapshot(table, version, path)
+
+
+def save_snapshot(snapshot, directory):
+    """
+        Takes in a price snapshot and a cache directory as arguments.
+        Writes the snapshot's table as NumPy arrays and a string table.
+    """
+    snapshot.table.save(directory)
+
+
+def load_snapshot(directory, path, version):
+    """
+        Takes in a cache directory, its csv path and dataset version as arguments.
+        Returns a price snapshot over the memory-mapped table, without reading the csv.
+    """
+    from main.price_table import PriceTable
+
+    return make_snapshot(PriceTable.load(directory), version, path)
+
+
+# Pandas and the pricelist are only loaded on the first lookup, not at import time
+store = PriceStore(settings.PRICELIST_DIR, build_snapshot,
+                   reload_interval=settings.PRICELIST_RELOAD_INTERVAL,
+                   cache_dir=settings.PRICELIST_CACHE_DIR,
+                   save=save_snapshot, load=load_snapshot)
+
+
+@timed('crop_search')
+def get_matching_crops(crop, limit=None):
     """ 
+        Takes in a crop name and an optional result limit as arguments.
+        Returns a ranked list of crops that match the argument from the crop pricelist,
+        prefix matches first.
+    """
+    return store.snapshot().search.search(crop, limit=limit)
+
+
+def _resolve(snapshot, crop):
+    """
+        Takes in a price snapshot and a crop name as arguments.
+        Returns the display key the name means: the name itself if it is a key,
+        otherwise the one key it matches despite case, punctuation, plurals or
+        small typos, or None.
+    """
+    if snapshot.table.position(crop) is not None:
+        return crop
+    return snapshot.search.fuzzy.resolve(crop)
+
+
+@timed('crop_search')
+def resolve_crop(crop):
+    """
         Takes in a crop name as an argument.
-        Returns a list of crops that matches the argument from the crop pricelist.
+        Returns the display key on the pricelist it means, or None if there is no
+        single close match.
     """
-    if df.empty or 'DESC' not in df.columns:
-        return []
+    return _resolve(store.snapshot(), crop)
 
-    try:
-        display_matches = df['DESC'] + " - " + df['CONTAINER']
-        matches = display_matches[display_matches.str.contains(crop, case=False, na=False)]
-        unqiue_value = set(matches)
-        return list(unqiue_value)
-    except (ValueError, IndexError):
-        return "Please enter a longer word"
 
+@timed('crop_search')
+def suggest_crops(crop, limit=5):
+    """
+        Takes in a crop name and a result limit as arguments.
+        Returns up to limit display keys close to the name, best first.
+    """
+    return store.snapshot().search.fuzzy.suggest(crop, limit=limit)
 
+
+def _price_of(snapshot, crop):
+    """
+        Takes in a price snapshot and a crop name as arguments.
+        Returns the formatted price per kg of the crop in the snapshot, averaged across its grades.
+        The name is resolved to a display key as in resolve_crop.
+    """
+    crop = _resolve(snapshot, crop)
+    position = None if crop is None else snapshot.table.position(crop)
+    if position is None:
+        return None
+    price_per_kg = float(snapshot.table.key_price_per_kg[position])
+    if math.isnan(price_per_kg):
+        return "error"
+    return f'{price_per_kg:.2f}'
+
+
+@timed('price_lookup')
 def priceOf(crop):
     """ 
         Takes in a crop name as an argument.
         Returns the price crop that matches the argument from the crop pricelist.
     """
-    display_matches = df['DESC'] + " - " + df['CONTAINER']
-    crop_list = list(display_matches)
-    if crop in crop_list:
-        crop_index = display_matches[display_matches == crop].index[0]
-        crop_mass = float(df.iloc[crop_index]['MASS'])
-        crop_price = float(df.iloc[crop_index]['AVERAGE PRICE'])
-        try:
-            price_per_kg = crop_price / crop_mass
-            return f'{price_per_kg:.2f}'
-        except (ValueError, IndexError):
-            return "error"
-    else: 
-        return None
+    return _price_of(store.snapshot(), crop)
+
+
+@timed('price_lookup')
+def price_batch(crops):
+    """
+        Takes in a list of crop names as an argument.
+        Returns the dataset version and a result per crop, in order, holding its
+        price per kg, mass and average price across its grades, its lowest and highest
+        price per kg and number of grades, or an error if it is not on the pricelist.
+    """
+    import numpy as np
+
+    snapshot = store.snapshot()
+    table = snapshot.table
+    positions = [table.position(crop) for crop in crops]
+    found = np.array([position for position in positions if position is not None], dtype=np.intp)
+    columns = zip(np.round(table.key_price_per_kg[found], 2).tolist(),
+                  np.round(table.mass[table.first_rows[found]], 2).tolist(),
+                  np.round(table.key_price[found], 2).tolist(),
+                  np.round(table.key_min_per_kg[found], 2).tolist(),
+                  np.round(table.key_max_per_kg[found], 2).tolist(),
+                  table.key_grades[found].tolist())
 
+    def number(value):
+        return None if math.isnan(value) else value
 
+    results = []
+    for crop, position in zip(crops, positions):
+        if position is None:
+            results.append({'crop': crop, 'error': 'Crop not found on list.'})
+            continue
+        price_per_kg, mass, price, lowest, highest, grades = next(columns)
+        results.append({
+            'crop': crop,
+            'price_per_kg': number(price_per_kg),
+            'mass': number(mass),
+            'average_price': number(price),
+            'min_price_per_kg': number(lowest),
+            'max_price_per_kg': number(highest),
+            'grades': grades,
+        })
+    return snapshot.version, results
+
+
+@timed('price_lookup')
 def compare(crop1, crop2):
     """ 
         Takes in two crop names as arguments.
         Returns the price of crops and 
         the comparsion between the two crops in weight and price.
+        Names are resolved to display keys as in resolve_crop.
     """
-    display_matches = df['DESC'] + " - " + df['CONTAINER']
-    crop_list = list(display_matches)
-    if crop1 in crop_list and crop2 in crop_list:
-        price1 = priceOf(crop1)  
-        price2 = priceOf(crop2)
-        x = float(price1)
-        y = float(price2)
+    snapshot = store.snapshot()
+    crop1 = _resolve(snapshot, crop1)
+    crop2 = _resolve(snapshot, crop2)
+    if crop1 is not None and crop2 is not None:
+        price1 = _price_of(snapshot, crop1)
+        price2 = _price_of(snapshot, crop2)
         try:
+            x = float(price1)
+            y = float(price2)
             first_comparsion = x / y
             second_comparsion =  y / x
             result = (crop1.title(), f'{first_comparsion:.2f}', 
                     crop2.title(), f'{second_comparsion:.2f}',
                     f'{x:.2f}',f'{y:.2f}')
             return result
-        except (ValueError, IndexError):
+        except (ValueError, ZeroDivisionError):
             return "Error comparing prices."
     else: 
         return None
-    
\ No newline at end of file
+    
+
+RatioMatrix = namedtuple('RatioMatrix', ['version', 'keys', 'positions', 'price_per_kg'])
+
+_ratio_matrix = None
+
+
+def ratio_matrix():
+    """
+        Returns the barter ratio matrix for the current pricelist, built once per dataset version.
+        Only each crop's price per kg is kept, NaN where it is not positive; ratio_rows works
+        out the requested rows from it, so the full n x n matrix is never held in memory.
+    """
+    global _ratio_matrix
+    import numpy as np
+
+    snapshot = store.snapshot()
+    matrix = _ratio_matrix
+    if matrix is not None and matrix.version == snapshot.version:
+        return matrix
+
+    table = snapshot.table
+    keys = sorted(table.keys())
+    price_per_kg = table.key_price_per_kg[np.array([table.position(key) for key in keys], dtype=np.intp)]
+    price_per_kg = np.where(price_per_kg > 0, price_per_kg, np.nan)
+
+    matrix = RatioMatrix(snapshot.version, keys, {key: i for i, key in enumerate(keys)}, price_per_kg)
+    _ratio_matrix = matrix
+    return matrix
+
+
+def ratio_rows(matrix, rows=None, columns=None):
+    """
+        Takes in a ratio matrix and optional lists of row and column crop names as arguments.
+        Returns the selected column names and a generator of (crop, ratios) per selected row,
+        where ratios[j] is how many kg of columns[j] trade for one kg of the row's crop,
+        rounded to 4 places, and None for crops without a positive price per kg.
+        Raises KeyError naming the first crop that is not in the matrix.
+    """
+    import numpy as np
+
+    row_keys = rows or matrix.keys
+    column_keys = columns or matrix.keys
+    row_positions = [matrix.positions[key] for key in row_keys]
+    column_prices = matrix.price_per_kg[np.array([matrix.positions[key] for key in column_keys], dtype=np.intp)]
+
+    def generate():
+        for key, position in zip(row_keys, row_positions):
+            with np.errstate(divide='ignore', invalid='ignore'):
+                values = np.round(matrix.price_per_kg[position] / column_prices, 4).tolist()
+            yield key, [None if math.isnan(value) else value for value in values]
+
+    return column_keys, generate()
+
+
+Catalogue = namedtuple('Catalogue', ['version', 'json', 'gzip'])
+
+_catalogue = None
+
+
+def crop_catalogue():
+    """
+        Returns the catalogue of display keys for the current pricelist as a sorted JSON list,
+        both plain and gzip-compressed, built once per dataset version.
+    """
+    global _catalogue
+    snapshot = store.snapshot()
+    catalogue = _catalogue
+    if catalogue is not None and catalogue.version == snapshot.version:
+        return catalogue
+
+    body = json.dumps(sorted(snapshot.table.keys()), separators=(',', ':')).encode()
+    catalogue = Catalogue(snapshot.version, body, gzip.compress(body, mtime=0))
+    _catalogue = catalogue
+    return catalogue
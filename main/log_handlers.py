@@ -0,0 +1,233 @@
+import atexit
+import copy
+import gzip
+import json
+import logging
+import os
+import queue
+import shutil
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from .metrics import LOG_RECORDS_DROPPED
+
+try:
+    import fcntl
+except ImportError:
+    # Windows, where the development server logs from a single process
+    fcntl = None
+
+
+def gzip_namer(name):
+    """
+        Takes in the name a rotated log file would get as an argument.
+        Returns it with a .gz suffix, as the rotated file is compressed.
+    """
+    return name + '.gz'
+
+
+def gzip_rotator(source, destination):
+    """
+        Takes in the log file being rotated and the name it rotates to as arguments.
+        Compresses it to the destination and removes the original.
+    """
+    with open(source, 'rb') as log_file, gzip.open(destination, 'wb') as compressed:
+        shutil.copyfileobj(log_file, compressed)
+    os.remove(source)
+
+
+class SharedFileMixin:
+    """
+        Lets every worker process append to and rotate the same log file. Each record
+        is written while holding an exclusive flock on "<log file>.lock", so the
+        processes take turns: a process reopens the file first if another has rotated
+        it away, and only the process that finds the file full rotates it.
+        Without fcntl (Windows), the file is only safe to share within one process.
+    """
+
+    def _lock(self):
+        """
+            Returns this process's open lock file, opening a new one after a fork,
+            as a flock is shared by every process holding the same open file.
+        """
+        if getattr(self, '_lock_pid', None) != os.getpid():
+            self._lock_file = open(self.baseFilename + '.lock', 'a')
+            self._lock_pid = os.getpid()
+        return self._lock_file
+
+    def reopen_if_rotated(self):
+        """
+            Closes the stream if the log file it writes to has been rotated away
+            by another process, so the next write opens the new file.
+            Returns True if it was closed.
+        """
+        if self.stream is None:
+            return False
+        try:
+            current = os.stat(self.baseFilename)
+        except FileNotFoundError:
+            current = None
+        opened = os.fstat(self.stream.fileno())
+        if current is not None and (current.st_dev, current.st_ino) == (opened.st_dev, opened.st_ino):
+            return False
+        self.stream.close()
+        self.stream = None
+        self.rotated_elsewhere()
+        return True
+
+    def rotated_elsewhere(self):
+        """
+            Called after another process rotated the log file.
+        """
+
+    def emit(self, record):
+        if fcntl is None:
+            return super().emit(record)
+        try:
+            lock = self._lock()
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        except OSError:
+            self.handleError(record)
+            return
+        try:
+            self.reopen_if_rotated()
+            super().emit(record)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def close(self):
+        if getattr(self, '_lock_pid', None) == os.getpid():
+            self._lock_file.close()
+            self._lock_pid = None
+        super().close()
+
+
+class CompressedRotatingFileHandler(SharedFileMixin, RotatingFileHandler):
+    """
+        RotatingFileHandler that gzips each file it rotates out, so maxBytes
+        and backupCount bound the disk used by the log. Safe to share between
+        worker processes, see SharedFileMixin.
+    """
+
+    def __init__(self, filename, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.namer = gzip_namer
+        self.rotator = gzip_rotator
+
+
+class CompressedTimedRotatingFileHandler(SharedFileMixin, TimedRotatingFileHandler):
+    """
+        TimedRotatingFileHandler that gzips each file it rotates out. Safe to
+        share between worker processes, see SharedFileMixin.
+    """
+
+    def __init__(self, filename, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.namer = gzip_namer
+        self.rotator = gzip_rotator
+
+    def rotated_elsewhere(self):
+        # Another process has done this rollover, so wait for the next one
+        self.rolloverAt = self.computeRollover(int(time.time()))
+
+
+class JsonFormatter(logging.Formatter):
+    """
+        Formats each record as one JSON object per line, with its time, level,
+        logger, message and any traceback.
+    """
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class QueueListenerHandler(QueueHandler):
+    """
+        Puts records on an in-memory queue and hands them to the wrapped handlers
+        from a background listener thread, so logging never waits on a file write.
+        The handlers are given in LOGGING as "cfg://handlers.<name>" references;
+        dictConfig sets up handlers in name order, so they must sort before this one.
+        The listener starts with the first record each process logs, so workers forked
+        from a preloaded app get their own. At most maxsize records wait on the queue;
+        records arriving when it is full are dropped and counted in self.dropped.
+        Records still queued when the process exits are written before it stops.
+    """
+
+    def __init__(self, handlers, respect_handler_level=True, maxsize=10000):
+        handlers = [handlers[i] for i in range(len(handlers))]
+        for handler in handlers:
+            if not isinstance(handler, logging.Handler):
+                raise ValueError(f'{handler!r} is not a configured handler')
+        super().__init__(queue.Queue(maxsize))
+        self.handlers = handlers
+        self.respect_handler_level = respect_handler_level
+        self.maxsize = maxsize
+        self.dropped = 0
+        self.listener = None
+        self._pid = None
+        atexit.register(self.stop)
+
+    def start(self):
+        """
+            Starts a listener thread for this process, with a new queue if the
+            handler was inherited from a parent process.
+        """
+        if self._pid == os.getpid():
+            return
+        if self._pid is not None:
+            self.queue = queue.Queue(self.maxsize)
+        self.listener = QueueListener(self.queue, *self.handlers,
+                                      respect_handler_level=self.respect_handler_level)
+        self.listener.start()
+        self._pid = os.getpid()
+
+    def emit(self, record):
+        # handle() holds self.lock, so only one thread starts the listener
+        self.start()
+        super().emit(record)
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            LOG_RECORDS_DROPPED.inc()
+
+    def prepare(self, record):
+        """
+            Takes in a record as an argument.
+            Returns a copy that can cross threads: its message is merged with its
+            arguments and any traceback kept as text, for the formatters to place.
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def stop(self):
+        """
+            Writes out every queued record and stops this process's listener thread.
+        """
+        if self._pid == os.getpid() and self.listener._thread is not None:
+            # QueueListener.stop() raises queue.Full on a full queue, so wait for room
+            self.queue.put(self.listener._sentinel)
+            self.listener._thread.join()
+            self.listener._thread = None
+            self._pid = None
+
+    def close(self):
+        self.stop()
+        super().close()
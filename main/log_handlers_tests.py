@@ -0,0 +1,140 @@
+import gzip
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from django.test import SimpleTestCase
+from .log_handlers import CompressedRotatingFileHandler, JsonFormatter, QueueListenerHandler, fcntl
+
+
+class LogHandlersTest(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.path = os.path.join(self.directory, 'test.log')
+        self.logger = logging.getLogger('main.log_handlers_tests')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+
+    def log_through(self, handler):
+        self.logger.addHandler(handler)
+        self.addCleanup(self.logger.removeHandler, handler)
+        self.addCleanup(handler.close)
+
+    def test_rotation_is_compressed_and_bounded(self):
+        """Test rotated files are gzipped and only backupCount of them are kept"""
+        handler = CompressedRotatingFileHandler(self.path, maxBytes=100, backupCount=2)
+        self.log_through(handler)
+        for i in range(20):
+            self.logger.info('line %02d %s', i, 'x' * 40)
+
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ['test.log', 'test.log.1.gz', 'test.log.2.gz', 'test.log.lock'])
+        with gzip.open(os.path.join(self.directory, 'test.log.1.gz'), 'rt') as rotated:
+            self.assertIn('line 17', rotated.read())
+
+    def test_queue_handler_writes_json_lines(self):
+        """Test records reach the file through the listener thread as JSON lines with tracebacks"""
+        file_handler = logging.FileHandler(self.path)
+        file_handler.setFormatter(JsonFormatter())
+        handler = QueueListenerHandler([file_handler])
+        self.log_through(handler)
+
+        self.logger.info('Buy %s', 'APPLE - CARTON')
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            self.logger.exception('failed')
+        handler.stop()
+        file_handler.close()
+
+        with open(self.path) as log_file:
+            entries = [json.loads(line) for line in log_file]
+        self.assertEqual([(entry['logger'], entry['level'], entry['message']) for entry in entries],
+                         [('main.log_handlers_tests', 'INFO', 'Buy APPLE - CARTON'),
+                          ('main.log_handlers_tests', 'ERROR', 'failed')])
+        self.assertNotIn('exception', entries[0])
+        self.assertIn('ZeroDivisionError', entries[1]['exception'])
+
+    def test_queue_handler_needs_configured_handlers(self):
+        """Test that a handler reference dictConfig could not resolve is rejected"""
+        with self.assertRaises(ValueError):
+            QueueListenerHandler(['cfg://handlers.missing'])
+
+    @unittest.skipIf(fcntl is None, 'needs fcntl to share the log between processes')
+    def test_processes_share_rotation(self):
+        """Test that processes rotating the same file lose no records"""
+        handler = CompressedRotatingFileHandler(self.path, maxBytes=400, backupCount=100)
+        self.log_through(handler)
+        workers = [multiprocessing.get_context('fork').Process(target=write_lines, args=(self.logger, worker))
+                   for worker in range(3)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        lines = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith('.gz'):
+                with gzip.open(path, 'rt') as rotated:
+                    lines += rotated.read().splitlines()
+            elif name == 'test.log':
+                with open(path) as log_file:
+                    lines += log_file.read().splitlines()
+        self.assertEqual(sorted(lines), sorted(f'worker {w} line {i:03d}' for w in range(3) for i in range(100)))
+
+    def test_forked_process_starts_its_own_listener(self):
+        """Test that a process forked after logging was configured still writes its records"""
+        file_handler = logging.FileHandler(self.path)
+        handler = QueueListenerHandler([file_handler])
+        self.log_through(handler)
+        self.logger.info('parent')
+
+        child = multiprocessing.get_context('fork').Process(target=log_and_stop, args=(self.logger, handler))
+        child.start()
+        child.join()
+        handler.stop()
+        file_handler.close()
+
+        with open(self.path) as log_file:
+            self.assertEqual(sorted(log_file.read().splitlines()), ['child', 'parent'])
+
+    def test_full_queue_drops_and_counts(self):
+        """Test that records arriving while the queue is full are dropped and counted"""
+        release = threading.Event()
+        handler = QueueListenerHandler([BlockingHandler(release)], maxsize=2)
+        self.log_through(handler)
+        self.addCleanup(release.set)
+
+        for i in range(10):
+            self.logger.info('record %d', i)
+
+        # The listener holds one record and the queue two more
+        self.assertGreaterEqual(handler.dropped, 7)
+
+
+class BlockingHandler(logging.Handler):
+
+    def __init__(self, gate):
+        super().__init__()
+        self.gate = gate
+
+    def emit(self, record):
+        self.gate.wait(5)
+
+
+def write_lines(logger, worker):
+    for i in range(100):
+        logger.info('worker %d line %03d', worker, i)
+
+
+def log_and_stop(logger, handler):
+    logger.info('child')
+    # Forked processes exit without running atexit handlers
+    handler.stop()
@@ -0,0 +1,52 @@
+import json
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from main.benchmark import run_benchmarks
+
+
+class Command(BaseCommand):
+    help = ("Times loading, searching, price lookups and comparisons on synthetic pricelists "
+            "of several sizes and saves the results as JSON, so runs can be compared over time.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[580, 50000, 1000000],
+                            help='Pricelist sizes in rows (default: 580 50000 1000000).')
+        parser.add_argument('--queries', type=int, default=1000,
+                            help='Searches, lookups and comparisons timed per size (default: 1000).')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the synthetic data.')
+        parser.add_argument('--output', default=None,
+                            help='JSON results file (default: a timestamped file in BENCHMARK_DIR).')
+        parser.add_argument('--baseline', default=None,
+                            help='Earlier JSON results to compare throughput against.')
+
+    def handle(self, *args, **options):
+        report = run_benchmarks(options['sizes'], options['queries'], options['seed'])
+
+        baseline = {}
+        if options['baseline']:
+            with open(options['baseline']) as baseline_file:
+                baseline = {result['rows']: result for result in json.load(baseline_file)['results']}
+
+        for result in report['results']:
+            self.stdout.write(f"{result['rows']} rows, {result['distinct_crops']} crops, "
+                              f"table {result['table_bytes'] / 1024:.1f} KiB, "
+                              f"build peak {result['build_snapshot']['peak_bytes'] / 1024:.1f} KiB")
+            for name, timing in result.items():
+                if not isinstance(timing, dict):
+                    continue
+                unit = 'rows' if 'rows_per_second' in timing else 'ops'
+                line = f"  {name:<22} {timing[f'{unit}_per_second']:>14,.1f} {unit}/s"
+                before = baseline.get(result['rows'], {}).get(name)
+                if before and before.get(f'{unit}_per_second'):
+                    line += f"  ({timing[f'{unit}_per_second'] / before[f'{unit}_per_second']:.2f}x baseline)"
+                self.stdout.write(line)
+
+        output = options['output']
+        if output is None:
+            os.makedirs(settings.BENCHMARK_DIR, exist_ok=True)
+            stamp = report['created_at'][:19].replace(':', '').replace('-', '')
+            output = os.path.join(settings.BENCHMARK_DIR, f'pricelist-{stamp}.json')
+        with open(output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+        self.stdout.write(f'Saved results to {output}')
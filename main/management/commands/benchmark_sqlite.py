@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from main.sqlite_benchmark import sqlite_write_benchmark
+
+
+class Command(BaseCommand):
+    help = ("Times several processes writing feature usage to one SQLite file, first with "
+            "SQLite's default journal and sync settings and then with SQLITE_PRAGMAS, "
+            "and reports the write throughput and lock errors of each.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Writer processes (default: 4).')
+        parser.add_argument('--transactions', type=int, default=500,
+                            help='Transactions written by each process (default: 500).')
+        parser.add_argument('--batch-size', type=int, default=5,
+                            help='Usage events per transaction (default: 5).')
+
+    def handle(self, *args, **options):
+        if not settings.SQLITE_PRAGMAS:
+            self.stdout.write('SQLITE_PRAGMAS is empty, so both runs use the defaults.')
+        arguments = (options['workers'], options['transactions'], options['batch_size'])
+        default = sqlite_write_benchmark({}, *arguments)
+        tuned = sqlite_write_benchmark(settings.SQLITE_PRAGMAS, *arguments)
+
+        for name, result in (('default', default), ('SQLITE_PRAGMAS', tuned)):
+            self.stdout.write(f"{name:<15} {result['journal_mode']:<8} "
+                              f"{result['ops_per_second']:>10,.1f} transactions/s "
+                              f"{result['rows_per_second']:>12,.1f} rows/s "
+                              f"{result['errors']:>5} lock errors")
+        if default['ops_per_second'] and tuned['ops_per_second']:
+            self.stdout.write(f"SQLITE_PRAGMAS writes {tuned['ops_per_second'] / default['ops_per_second']:.2f}x "
+                              f"as fast with {options['workers']} workers.")
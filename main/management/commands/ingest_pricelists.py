@@ -0,0 +1,94 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from main.models import PricelistIngest, PricePoint
+from main.price_store import dated_pricelists, file_hash, pricelist_date
+from main.price_table import price_rows
+
+
+class Command(BaseCommand):
+    help = ("Ingests new and changed DD_MM_YYYY.csv pricelists into the price history table. "
+            "Files are parsed in a process pool and each is written in its own transaction "
+            "together with its content hash, so unchanged files are skipped and an "
+            "interrupted run can simply be run again.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*',
+                            help='Pricelists to ingest (default: every dated pricelist in --dir).')
+        parser.add_argument('--dir', default=settings.PRICELIST_DIR,
+                            help='Directory of pricelists to scan (default: PRICELIST_DIR).')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Parsing processes; 1 parses in this process (default: one per CPU).')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows per INSERT (default: 1000).')
+        parser.add_argument('--force', action='store_true',
+                            help='Ingest every pricelist, even those already ingested unchanged.')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        ingested = dict(PricelistIngest.objects.values_list('name', 'sha1'))
+        pending = []
+        skipped = 0
+        for path in options['paths'] or dated_pricelists(options['dir']):
+            if pricelist_date(path) is None:
+                raise CommandError(f'Not a dated pricelist: {path}')
+            try:
+                sha1 = file_hash(path)
+            except OSError as e:
+                raise CommandError(f'Could not read {path}: {e}')
+            if not options['force'] and ingested.get(os.path.basename(path)) == sha1:
+                skipped += 1
+            else:
+                pending.append((path, sha1))
+        self.stdout.write(f'{len(pending)} pricelists to ingest, {skipped} unchanged.')
+
+        rows = prices = 0
+        for path, sha1, (row_count, file_prices) in self.parse(pending, options['workers']):
+            with transaction.atomic():
+                PricePoint.replace_date(pricelist_date(path), file_prices, options['batch_size'])
+                PricelistIngest.objects.update_or_create(
+                    name=os.path.basename(path),
+                    defaults={'sha1': sha1, 'date': pricelist_date(path),
+                              'rows': row_count, 'prices': len(file_prices)},
+                )
+            rows += row_count
+            prices += len(file_prices)
+            self.stdout.write(f'{path}: {row_count} rows, {len(file_prices)} prices')
+
+        seconds = time.perf_counter() - start
+        rate = f'{rows / seconds:,.0f}' if seconds else '-'
+        self.stdout.write(f'Ingested {len(pending)} pricelists ({rows} rows, {prices} prices) '
+                          f'in {seconds:.2f}s: {rate} rows/s.')
+
+    @staticmethod
+    def parse(pending, workers):
+        """
+            Takes in (path, sha1) pairs and the number of parsing processes as arguments.
+            Yields (path, sha1, price_rows(path)) for each as soon as it is parsed,
+            so earlier files are written while later ones are still being read.
+            Raises CommandError if a pricelist cannot be read.
+        """
+        if workers <= 1 or len(pending) <= 1:
+            for path, sha1 in pending:
+                yield path, sha1, Command.read(lambda: price_rows(path), path)
+            return
+
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+            futures = {pool.submit(price_rows, path): (path, sha1) for path, sha1 in pending}
+            for future in as_completed(futures):
+                path, sha1 = futures[future]
+                yield path, sha1, Command.read(future.result, path)
+
+    @staticmethod
+    def read(parse, path):
+        """
+            Takes in a function returning a pricelist's parsed rows and the pricelist path.
+            Returns its result, or raises CommandError if the pricelist cannot be read.
+        """
+        try:
+            return parse()
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Could not read {path}: {e}')
@@ -0,0 +1,18 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ("Loads dated DD_MM_YYYY.csv pricelists into the price history table, "
+            "replacing any prices already stored for their dates. Runs ingest_pricelists "
+            "with --force, so each file is also recorded for later incremental ingests.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*',
+                            help='Pricelists to load (default: every dated pricelist in PRICELIST_DIR).')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows per INSERT (default: 1000).')
+
+    def handle(self, *args, **options):
+        call_command('ingest_pricelists', *options['paths'], force=True, batch_size=options['batch_size'],
+                     stdout=self.stdout, stderr=self.stderr)
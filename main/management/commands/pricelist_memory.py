@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from main.generate_pricelist import store
+
+
+def process_memory():
+    """
+        Returns this process's resident, proportional (shared pages split between
+        the processes using them), shared and private memory in bytes,
+        or None where /proc/self/smaps_rollup is not available.
+    """
+    fields = {'Rss': 'rss', 'Pss': 'pss', 'Shared_Clean': 'shared', 'Shared_Dirty': 'shared',
+              'Private_Clean': 'private', 'Private_Dirty': 'private'}
+    try:
+        with open('/proc/self/smaps_rollup') as smaps:
+            lines = smaps.readlines()
+    except OSError:
+        return None
+
+    memory = {'rss': 0, 'pss': 0, 'shared': 0, 'private': 0}
+    for line in lines:
+        name, _, value = line.partition(':')
+        if name in fields:
+            memory[fields[name]] += int(value.split()[0]) * 1024
+    return memory
+
+
+class Command(BaseCommand):
+    help = ("Loads the current pricelist snapshot and reports the memory it takes in this process, "
+            "split into bytes memory-mapped from the shared snapshot cache and private bytes.")
+
+    def handle(self, *args, **options):
+        snapshot = store.snapshot()
+        usage = snapshot.table.memory_usage()
+        self.stdout.write(f'Pricelist {snapshot.version}: {len(snapshot.table)} rows')
+        for name in ('arrays', 'strings', 'index', 'total', 'mapped', 'private'):
+            self.stdout.write(f'  {name:<8} {usage[name] / 1024:>10.1f} KiB')
+
+        memory = process_memory()
+        if memory is not None:
+            self.stdout.write('Process')
+            for name in ('rss', 'pss', 'shared', 'private'):
+                self.stdout.write(f'  {name:<8} {memory[name] / 1024:>10.1f} KiB')
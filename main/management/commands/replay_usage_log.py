@@ -0,0 +1,55 @@
+import json
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from main.replay import parse_log, replay, summarize
+
+
+class Command(BaseCommand):
+    help = ("Replays the requests recorded in an access log such as feature_usage.log against a "
+            "running server, and reports p50/p95/p99 latency and throughput per endpoint.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', default=os.path.join(settings.BASE_DIR, 'feature_usage.log'),
+                            help='Access log to replay (default: feature_usage.log).')
+        parser.add_argument('--url', default='http://127.0.0.1:8000',
+                            help='Base URL of the server under test (default: http://127.0.0.1:8000).')
+        parser.add_argument('--concurrency', type=int, default=8,
+                            help='Simulated clients sending requests at once (default: 8).')
+        parser.add_argument('--speedup', type=float, default=1.0,
+                            help='Replay this many times faster than logged; 0 sends as fast as possible.')
+        parser.add_argument('--interval', type=float, default=0.1,
+                            help='Seconds between requests when the log has no timestamps (default: 0.1).')
+        parser.add_argument('--limit', type=int, default=None, help='Only replay the first N requests.')
+        parser.add_argument('--timeout', type=float, default=10.0, help='Seconds before a request fails.')
+        parser.add_argument('--links', action='store_true',
+                            help='Send buy and barter posts as GET links, reported separately as "(link)".')
+        parser.add_argument('--output', default=None, help='Also save the summary as JSON to this file.')
+
+    def handle(self, *args, **options):
+        from main.generate_pricelist import store
+
+        with open(options['log'], encoding='utf-8', errors='replace') as log_file:
+            requests = parse_log(log_file, options['interval'])
+        if options['limit'] is not None:
+            requests = requests[:options['limit']]
+
+        # Form posts are not logged with their bodies, so they are filled with real crop names
+        crops = sorted(store.snapshot().table.keys())
+        results, elapsed = replay(requests, options['url'], options['concurrency'],
+                                  options['speedup'], crops, options['timeout'], links=options['links'])
+        summary = summarize(results, elapsed)
+
+        self.stdout.write(f'Replayed {len(results)} of {len(requests)} logged requests in {elapsed:.1f}s')
+        self.stdout.write(f"{'endpoint':<24} {'requests':>8} {'errors':>6} {'p50 ms':>9} "
+                          f"{'p95 ms':>9} {'p99 ms':>9} {'req/s':>8}")
+        for name, row in summary.items():
+            self.stdout.write(f"{name:<24} {row['requests']:>8} {row['errors']:>6} {row['p50_ms']:>9.2f} "
+                              f"{row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f} {row['requests_per_second']:>8.1f}")
+
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                json.dump({'log': options['log'], 'url': options['url'],
+                           'concurrency': options['concurrency'], 'speedup': options['speedup'],
+                           'links': options['links'],
+                           'seconds': round(elapsed, 3), 'endpoints': summary}, output_file, indent=2)
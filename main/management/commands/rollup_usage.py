@@ -0,0 +1,43 @@
+from datetime import datetime, time, timedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from main.models import FeatureUsage, FeatureUsageDaily
+
+
+class Command(BaseCommand):
+    help = ("Rebuilds the daily feature usage rollups from the FeatureUsage table, up to "
+            "yesterday. Today's rollups are left to the usage writer, which is still adding "
+            "to them. Run it to catch up events written outside the app.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Only rebuild the N days before today (default: every day before today).')
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        events = FeatureUsage.objects.filter(used_at__lt=timezone.make_aware(datetime.combine(today, time.min)))
+        rollups = FeatureUsageDaily.objects.filter(day__lt=today)
+        if options['days']:
+            since = today - timedelta(days=options['days'])
+            events = events.filter(used_at__gte=timezone.make_aware(datetime.combine(since, time.min)))
+            rollups = rollups.filter(day__gte=since)
+
+        counts = (
+            events.annotate(day=TruncDate('used_at'))
+            .values('day', 'feature_name')
+            .annotate(count=Count('id'))
+        )
+        with transaction.atomic():
+            rollups.delete()
+            # An event flushed just after midnight can still add yesterday's row meanwhile
+            created = FeatureUsageDaily.objects.bulk_create(
+                (FeatureUsageDaily(day=row['day'], feature_name=row['feature_name'], count=row['count'])
+                 for row in counts),
+                update_conflicts=True,
+                unique_fields=['day', 'feature_name'],
+                update_fields=['count'],
+            )
+        self.stdout.write(f'Rebuilt {len(created)} daily rollups.')
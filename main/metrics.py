@@ -0,0 +1,445 @@
+import atexit
+import json
+import logging
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+
+try:
+    import fcntl
+except ImportError:
+    # Windows, where the development server runs as a single process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+# Latency buckets in seconds, from a cached autocomplete hit up to a cold pricelist load
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_labels(names, values):
+    """
+        Takes in label names and their values as arguments.
+        Returns them in Prometheus text format, e.g. {view="buy",status="200"}.
+    """
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def format_value(value):
+    """
+        Takes in a sample value as an argument.
+        Returns it in Prometheus text format, with whole numbers written without a decimal point.
+    """
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    """
+        A named metric with a fixed list of label names, holding one value per
+        combination of label values. Updates take a lock, so a metric can be
+        shared by every thread in the process.
+    """
+
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def values(self):
+        """
+            Returns a copy of this process's values, keyed by their label values.
+        """
+        with self._lock:
+            return dict(self._values)
+
+    def reset(self):
+        """
+            Forgets every value, as a forked process has not answered its parent's requests.
+        """
+        self._lock = threading.Lock()
+        self._values = {}
+
+    @staticmethod
+    def merge(values, other):
+        """
+            Takes in two sets of values as arguments.
+            Adds the second into the first and returns it.
+        """
+        for key, value in other.items():
+            values[key] = values.get(key, 0) + value
+        return values
+
+    def samples(self, values=None):
+        """
+            Takes in optional values to show instead of this process's.
+            Yields (suffix, label names, label values, value) for every sample.
+        """
+        values = self.values() if values is None else values
+        for key, value in sorted(values.items()):
+            yield '', self.labels, key, value
+
+    def render(self, values=None):
+        """
+            Takes in optional values to show instead of this process's.
+            Returns the metric in Prometheus text exposition format.
+        """
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for suffix, names, label_values, value in self.samples(values):
+            lines.append(f'{self.name}{suffix}{format_labels(names, label_values)} {format_value(value)}')
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    """
+        Counts observations into cumulative buckets, plus their sum and count,
+        so a scraper can work out percentiles over any time window.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        """
+            Takes in an observed value and its label values as arguments.
+            Adds it to the bucket it falls in and to the sum and count.
+        """
+        bucket = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][bucket] += 1
+            state[1] += value
+
+    def values(self):
+        with self._lock:
+            return {key: [[*counts], total] for key, (counts, total) in self._values.items()}
+
+    @staticmethod
+    def merge(values, other):
+        for key, (counts, total) in other.items():
+            if key in values:
+                values[key] = [[a + b for a, b in zip(values[key][0], counts)], values[key][1] + total]
+            else:
+                values[key] = [[*counts], total]
+        return values
+
+    def samples(self, values=None):
+        values = self.values() if values is None else values
+        names = self.labels + ('le',)
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield '_bucket', names, key + (format_value(bound),), cumulative
+            yield '_sum', self.labels, key, total
+            yield '_count', self.labels, key, cumulative
+
+
+REQUEST_LATENCY = Histogram('barter_request_duration_seconds',
+                            'Time spent answering a request, by URL name.', ['view'])
+REQUESTS = Counter('barter_requests_total', 'Requests answered, by URL name and status code.',
+                   ['view', 'status'])
+IN_FLIGHT = Gauge('barter_requests_in_flight', 'Requests being answered right now, by URL name.',
+                  ['view'])
+STAGE_LATENCY = Histogram('barter_stage_duration_seconds',
+                          'Time spent in an internal stage of a request, such as a price lookup, '
+                          'an ORM write or template rendering.', ['stage'])
+LOG_RECORDS_DROPPED = Counter('barter_log_records_dropped_total',
+                              'Log records dropped because the log queue was full.')
+USAGE_EVENTS_DROPPED = Counter('barter_usage_events_dropped_total',
+                               'Feature usage events dropped, because the usage queue was full '
+                               'or because every attempt to write them failed.', ['reason'])
+
+REGISTRY = [REQUEST_LATENCY, REQUESTS, IN_FLIGHT, STAGE_LATENCY, LOG_RECORDS_DROPPED, USAGE_EVENTS_DROPPED]
+
+
+def reset_after_fork():
+    """
+        Empties every registered metric in a newly forked process.
+    """
+    for metric in REGISTRY:
+        metric.reset()
+
+
+os.register_at_fork(after_in_child=reset_after_fork)
+
+
+class MetricsDirectory:
+    """
+        Shares the registered metrics between the worker processes of one host, in the
+        manner of prometheus_client's multiprocess mode: each process writes its values
+        to its own JSON file in the directory from a background thread every interval
+        seconds and when it exits, and a scrape adds up every process's file.
+        A process holds a lock on its file's lock file for as long as it runs. A scrape
+        merges the counters and histograms of files whose lock is free into one archive
+        file and deletes them; their gauges are dropped, as they only count live workers.
+        Without fcntl (Windows), every file counts as live and none are archived.
+        Empty the directory whenever the server is restarted.
+    """
+
+    archive = 'archive.json'
+
+    def __init__(self, path, interval=1.0):
+        self.path = path
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._pid = None
+        self._name = None
+        self._lock_file = None
+        self._thread = None
+        self._thread_pid = None
+        os.makedirs(path, exist_ok=True)
+        atexit.register(self.write_at_exit)
+
+    def filename(self):
+        """
+            Returns this process's file, locking its lock file the first time in each
+            process. The name holds the pid and the time of the first write, so a later
+            process given the same pid gets a file of its own.
+        """
+        if self._pid != os.getpid():
+            if self._lock_file is not None:
+                # Inherited from the parent, which keeps its lock through its own copy
+                self._lock_file.close()
+            self._pid = os.getpid()
+            self._name = f'{self._pid}-{time.time_ns()}'
+            self._lock_file = open(os.path.join(self.path, f'{self._name}.lock'), 'w')
+            if fcntl is not None:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        return os.path.join(self.path, f'{self._name}.json')
+
+    def start(self):
+        """
+            Starts this process's writer thread if it is not running yet, so requests
+            never wait on the write. A forked worker starts its own.
+        """
+        if self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread_pid != os.getpid():
+                self._thread_pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='metrics-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        """
+            Writer thread loop, writing every interval seconds until the directory is removed.
+        """
+        while True:
+            time.sleep(self.interval)
+            if not os.path.isdir(self.path):
+                return
+            self.write()
+
+    def write(self):
+        """
+            Writes this process's values to its file, replacing it in one step.
+        """
+        with self._lock:
+            values = {metric.name: metric.values() for metric in REGISTRY}
+            try:
+                path = self.filename()
+                write_values(path, values)
+            except OSError as error:
+                logger.warning('Could not write metrics to %s: %s', self.path, error)
+
+    def write_at_exit(self):
+        """
+            Writes this process's final values, unless the directory has been removed.
+        """
+        if os.path.isdir(self.path):
+            self.write()
+
+    def alive(self, name):
+        """
+            Takes in the name of a process's file, without its extension, as an argument.
+            Returns True if the process that wrote it still holds its lock.
+        """
+        if name == self._name or fcntl is None:
+            return True
+        try:
+            descriptor = os.open(os.path.join(self.path, f'{name}.lock'), os.O_RDWR)
+        except OSError:
+            return False
+        try:
+            fcntl.flock(descriptor, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        finally:
+            os.close(descriptor)
+        return False
+
+    @contextmanager
+    def _archive_lock(self):
+        """
+            Lets one process at a time read and rewrite the archive.
+        """
+        with open(os.path.join(self.path, 'archive.lock'), 'w') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def collect(self):
+        """
+            Returns the values of every registered metric added up across the archive
+            and the files of every live process, keyed by metric name. Files of
+            processes that have exited are merged into the archive and deleted.
+        """
+        self.write()
+        totals = {}
+        with self._archive_lock():
+            archive = read_values(os.path.join(self.path, self.archive)) or {}
+            dead = []
+            for filename in sorted(os.listdir(self.path)):
+                name, extension = os.path.splitext(filename)
+                if extension != '.json' or filename == self.archive:
+                    continue
+                values = read_values(os.path.join(self.path, filename))
+                if values is None:
+                    continue
+                if self.alive(name):
+                    add_values(totals, values)
+                else:
+                    add_values(archive, values, gauges=False)
+                    dead.append(name)
+            if dead:
+                write_values(os.path.join(self.path, self.archive), archive)
+                for name in dead:
+                    for extension in ('.json', '.lock'):
+                        try:
+                            os.remove(os.path.join(self.path, name + extension))
+                        except FileNotFoundError:
+                            pass
+        add_values(totals, archive)
+        return totals
+
+
+def add_values(totals, values, gauges=True):
+    """
+        Takes in running totals and one file's values, both keyed by metric name,
+        and whether to include gauges.
+        Adds the values into the totals and returns them.
+    """
+    for metric in REGISTRY:
+        if metric.kind == 'gauge' and not gauges:
+            continue
+        metric.merge(totals.setdefault(metric.name, {}), values.get(metric.name, {}))
+    return totals
+
+
+def write_values(path, values):
+    """
+        Takes in a file path and metric values keyed by metric name as arguments.
+        Writes the values to the file as JSON, replacing it in one step.
+    """
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as metrics_file:
+        json.dump({name: [[list(key), value] for key, value in metric_values.items()]
+                   for name, metric_values in values.items()}, metrics_file)
+    os.replace(temporary, path)
+
+
+def read_values(path):
+    """
+        Takes in a file path as an argument.
+        Returns the metric values written to it, or None if it cannot be read.
+    """
+    try:
+        with open(path) as metrics_file:
+            values = json.load(metrics_file)
+    except (OSError, ValueError):
+        return None
+    return {name: {tuple(key): value for key, value in metric_values} for name, metric_values in values.items()}
+
+
+@lru_cache(maxsize=None)
+def shared_directory(path, interval=1.0):
+    """
+        Takes in a directory path and a write interval as arguments.
+        Returns the MetricsDirectory for the path, or None if the path is empty.
+    """
+    if not path:
+        return None
+    return MetricsDirectory(path, interval)
+
+
+def render_metrics(directory=None):
+    """
+        Takes in an optional MetricsDirectory shared by the worker processes.
+        Returns every registered metric in Prometheus text exposition format,
+        added up across the workers when a directory is given.
+    """
+    totals = directory.collect() if directory is not None else {}
+    return '\n'.join(metric.render(totals.get(metric.name)) for metric in REGISTRY) + '\n'
+
+
+@contextmanager
+def stage(name):
+    """
+        Takes in a stage name as an argument.
+        Times the block it wraps into the stage latency histogram.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - start, name)
+
+
+def timed(name):
+    """
+        Takes in a stage name as an argument.
+        Decorates a function so every call is timed as that stage.
+    """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                STAGE_LATENCY.observe(time.perf_counter() - start, name)
+        return wrapper
+    return decorator
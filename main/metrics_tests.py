@@ -0,0 +1,175 @@
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from .metrics import (IN_FLIGHT, REQUEST_LATENCY, REQUESTS, STAGE_LATENCY, Counter, Gauge, Histogram,
+                      MetricsDirectory, stage)
+
+
+def serve_request(path):
+    """Records one request the way a worker would, then exits with the gauge still raised"""
+    IN_FLIGHT.inc('test_shared')
+    REQUESTS.inc('test_shared', '200')
+    REQUEST_LATENCY.observe(0.2, 'test_shared')
+    MetricsDirectory(path).write()
+
+
+def run_workers(path, count):
+    """Runs each worker in its own forked process, one after another"""
+    context = multiprocessing.get_context('fork')
+    for _ in range(count):
+        worker = context.Process(target=serve_request, args=(path,))
+        worker.start()
+        worker.join()
+
+
+class MetricTypesTest(SimpleTestCase):
+
+    def test_histogram(self):
+        """Test that observations land in cumulative buckets with their sum and count"""
+        histogram = Histogram('test_seconds', 'Test latency.', ['view'], buckets=(0.1, 1.0))
+        histogram.observe(0.05, 'buy')
+        histogram.observe(0.1, 'buy')
+        histogram.observe(3.0, 'buy')
+        
+        self.assertEqual(histogram.render().splitlines(), [
+            '# HELP test_seconds Test latency.',
+            '# TYPE test_seconds histogram',
+            'test_seconds_bucket{view="buy",le="0.1"} 2',
+            'test_seconds_bucket{view="buy",le="1"} 2',
+            'test_seconds_bucket{view="buy",le="+Inf"} 3',
+            'test_seconds_sum{view="buy"} 3.15',
+            'test_seconds_count{view="buy"} 3',
+        ])
+
+    def test_counter_and_gauge(self):
+        """Test counters add up per label and gauges go both ways"""
+        counter = Counter('test_total', 'Test count.', ['view', 'status'])
+        counter.inc('buy', '200')
+        counter.inc('buy', '200')
+        counter.inc('buy', '500')
+        self.assertIn('test_total{view="buy",status="200"} 2', counter.render())
+        self.assertIn('test_total{view="buy",status="500"} 1', counter.render())
+        
+        gauge = Gauge('test_in_flight', 'Test gauge.', ['view'])
+        gauge.inc('buy')
+        gauge.dec('buy')
+        self.assertIn('test_in_flight{view="buy"} 0', gauge.render())
+
+    def test_stage(self):
+        """Test that a timed block is recorded under its stage"""
+        with stage('test_stage'):
+            pass
+        self.assertIn('barter_stage_duration_seconds_count{stage="test_stage"} 1', STAGE_LATENCY.render())
+
+
+class MetricsDirectoryTest(SimpleTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_collect_adds_up_processes(self):
+        """Test that counters and histograms add up across exited workers but their gauges do not"""
+        run_workers(self.tmp.name, 3)
+        directory = MetricsDirectory(self.tmp.name)
+        REQUESTS.inc('test_shared', '200')
+        IN_FLIGHT.inc('test_shared')
+        try:
+            totals = directory.collect()
+            # The exited workers' files are now in the archive, which is only counted once
+            self.assertEqual(directory.collect(), totals)
+        finally:
+            REQUESTS.inc('test_shared', '200', amount=-1)
+            IN_FLIGHT.dec('test_shared')
+        
+        self.assertEqual(totals[REQUESTS.name][('test_shared', '200')], 4)
+        self.assertEqual(totals[REQUEST_LATENCY.name][('test_shared',)][1], 3 * 0.2)
+        self.assertEqual(totals[IN_FLIGHT.name][('test_shared',)], 1)
+        self.assertEqual(sorted(os.listdir(self.tmp.name)),
+                         sorted(['archive.json', 'archive.lock', f'{directory._name}.json', f'{directory._name}.lock']))
+
+    def test_reused_pid_is_not_live(self):
+        """Test that a file is live only while the process that wrote it holds its lock, not while its pid runs"""
+        # Written by an earlier process that had this process's pid
+        with open(os.path.join(self.tmp.name, f'{os.getpid()}-1.json'), 'w') as metrics_file:
+            json.dump({IN_FLIGHT.name: [[['test_reused'], 1]], REQUESTS.name: [[['test_reused', '200'], 2]]},
+                      metrics_file)
+        open(os.path.join(self.tmp.name, f'{os.getpid()}-1.lock'), 'w').close()
+        
+        totals = MetricsDirectory(self.tmp.name).collect()
+        self.assertNotIn(('test_reused',), totals[IN_FLIGHT.name])
+        self.assertEqual(totals[REQUESTS.name][('test_reused', '200')], 2)
+        self.assertNotIn(f'{os.getpid()}-1.json', os.listdir(self.tmp.name))
+
+    def test_writer_thread(self):
+        """Test that values are written by the background thread rather than by the caller"""
+        directory = MetricsDirectory(self.tmp.name, interval=0.01)
+        directory.start()
+        directory.start()
+        self.assertTrue(directory._thread.is_alive())
+        deadline = time.monotonic() + 5
+        while directory._name is None or not os.path.exists(os.path.join(self.tmp.name, f'{directory._name}.json')):
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+    def test_forked_worker_starts_empty(self):
+        """Test that a forked worker does not report its parent's counts again"""
+        REQUESTS.inc('test_fork', '200')
+        try:
+            run_workers(self.tmp.name, 1)
+            totals = MetricsDirectory(self.tmp.name).collect()
+        finally:
+            REQUESTS.inc('test_fork', '200', amount=-1)
+        self.assertEqual(totals[REQUESTS.name][('test_fork', '200')], 1)
+        self.assertEqual(totals[REQUESTS.name][('test_shared', '200')], 1)
+
+
+class MetricsViewTest(TestCase):
+
+    def test_metrics_require_staff_or_token(self):
+        """Test that /metrics is only served to staff users or with the scraper token"""
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+        
+        User.objects.create_user(username='user', password='password')
+        self.client.login(username='user', password='password')
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+        self.client.logout()
+        
+        with override_settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+    def test_metrics_record_views_and_stages(self):
+        """Test that requests are recorded per URL name along with their internal stages"""
+        User.objects.create_user(username='staff', password='password', is_staff=True)
+        self.client.login(username='staff', password='password')
+        self.client.get('/autocomplete/', {'term': 'ap'})
+        self.client.post('/buy/', {'crop': 'APPLE FUJI - MARK 4 (18.3KG)'})
+        self.client.get('/no-such-page/')
+        
+        response = self.client.get('/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('barter_requests_total{view="autocomplete",status="200"}', body)
+        self.assertIn('barter_request_duration_seconds_count{view="buy"}', body)
+        self.assertIn('barter_requests_total{view="unmatched",status="404"}', body)
+        self.assertIn('barter_requests_in_flight{view="metrics"} 1', body)
+        for name in ('crop_search', 'price_lookup', 'orm_write', 'template_render'):
+            self.assertIn(f'barter_stage_duration_seconds_count{{stage="{name}"}}', body)
+
+    def test_metrics_add_up_workers(self):
+        """Test that /metrics/ reports every worker sharing METRICS_DIR, not just the one answering"""
+        User.objects.create_user(username='staff', password='password', is_staff=True)
+        self.client.login(username='staff', password='password')
+        with tempfile.TemporaryDirectory() as path, override_settings(METRICS_DIR=path):
+            run_workers(path, 2)
+            body = self.client.get('/metrics/').content.decode()
+        self.assertIn('barter_requests_total{view="test_shared",status="200"} 2', body)
+        self.assertIn('barter_request_duration_seconds_count{view="test_shared"} 2', body)
+        self.assertNotIn('barter_requests_in_flight{view="test_shared"}', body)
+        self.assertIn('barter_requests_in_flight{view="metrics"} 1', body)
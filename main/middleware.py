@@ -0,0 +1,190 @@
+import cProfile
+import io
+import os
+import pstats
+import re
+import time
+from datetime import datetime
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.urls import Resolver404, resolve
+from whitenoise.middleware import WhiteNoiseMiddleware
+from .metrics import IN_FLIGHT, REQUEST_LATENCY, REQUESTS, shared_directory
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+        WhiteNoise that also runs in an async middleware chain.
+        WhiteNoiseMiddleware is sync only, so under ASGI Django would move every
+        request to a thread and back just to pass through it.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, **kwargs):
+        super().__init__(get_response, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
+
+class MetricsMiddleware:
+    """
+        Records each request's latency, status code and the number of requests
+        in flight, labelled with the URL name of the view answering it
+        (or "unmatched" for URLs that match no view).
+        Works in both sync and async middleware chains.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def view_name(request):
+        """
+            Takes in a request as an argument.
+            Returns the URL name of the view it is routed to.
+        """
+        try:
+            return resolve(request.path_info, getattr(request, 'urlconf', None)).url_name or 'unnamed'
+        except Resolver404:
+            return 'unmatched'
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        view = self.view_name(request)
+        IN_FLIGHT.inc(view)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            IN_FLIGHT.dec(view)
+        self.record(view, start, response)
+        return response
+
+    async def __acall__(self, request):
+        view = self.view_name(request)
+        IN_FLIGHT.inc(view)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            IN_FLIGHT.dec(view)
+        self.record(view, start, response)
+        return response
+
+    @staticmethod
+    def record(view, start, response):
+        REQUEST_LATENCY.observe(time.perf_counter() - start, view)
+        REQUESTS.inc(view, str(response.status_code))
+        directory = shared_directory(settings.METRICS_DIR, settings.METRICS_WRITE_INTERVAL)
+        if directory is not None:
+            # The values are written by a background thread, never on the request path
+            directory.start()
+
+
+class ProfilingMiddleware:
+    """
+        Runs a request under cProfile when a staff user asks for it with an
+        X-Profile header or a ?profile query flag, and saves the stats to
+        settings.PROFILE_DIR as a .prof file plus a text summary of the top functions.
+        The response names them in an X-Profile-Id header.
+        Other requests only pay for a header and query string check, and the
+        middleware is left out altogether when PROFILE_DIR is empty.
+        Under ASGI the profile is of the event loop thread, so it also catches
+        other requests served meanwhile and misses work handed to threads.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILE_DIR:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def requested(request):
+        """
+            Takes in a request as an argument.
+            Returns True if it asks to be profiled, before checking who sent it.
+        """
+        if 'HTTP_X_PROFILE' in request.META:
+            return True
+        return 'profile' in request.META.get('QUERY_STRING', '') and 'profile' in request.GET
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not (self.requested(request) and request.user.is_staff):
+            return self.get_response(request)
+
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        response = profile.runcall(self.get_response, request)
+        return self.save(profile, request, response, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        if not self.requested(request):
+            return await self.get_response(request)
+        # request.auser() only arrives in Django 5.0, and the lazy user loads from the database
+        if not await sync_to_async(lambda: request.user.is_staff)():
+            return await self.get_response(request)
+
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            response = await self.get_response(request)
+        finally:
+            profile.disable()
+        return self.save(profile, request, response, time.perf_counter() - start)
+
+    @staticmethod
+    def save(profile, request, response, seconds):
+        """
+            Takes in a finished profile, its request and response and the seconds it took.
+            Writes the .prof stats and the text summary and names them on the response.
+            Returns the response.
+        """
+        directory = settings.PROFILE_DIR
+        slug = re.sub(r'[^A-Za-z0-9]+', '-', request.path).strip('-') or 'index'
+        profile_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{slug}"
+        os.makedirs(directory, exist_ok=True)
+        profile.dump_stats(os.path.join(directory, f'{profile_id}.prof'))
+
+        summary = io.StringIO()
+        summary.write(f'{request.method} {request.get_full_path()} -> {response.status_code} '
+                      f'in {seconds * 1000:.1f} ms\n\n')
+        stats = pstats.Stats(profile, stream=summary)
+        stats.sort_stats('cumulative').print_stats(settings.PROFILE_TOP_FUNCTIONS)
+        stats.sort_stats('tottime').print_stats(settings.PROFILE_TOP_FUNCTIONS)
+        with open(os.path.join(directory, f'{profile_id}.txt'), 'w') as summary_file:
+            summary_file.write(summary.getvalue())
+
+        response['X-Profile-Id'] = profile_id
+        return response
+
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.23 on 2026-10-17 22:35
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0002_featureusage'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='featureusage',
+            name='used_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
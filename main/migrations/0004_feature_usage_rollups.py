@@ -0,0 +1,37 @@
+# Generated by Django 4.2.23 on 2026-10-17 22:36
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_alter_featureusage_used_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeatureUsageDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('feature_name', models.CharField(max_length=100)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='featureusage',
+            name='feature_name',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='featureusage',
+            name='used_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.AddConstraint(
+            model_name='featureusagedaily',
+            constraint=models.UniqueConstraint(fields=('day', 'feature_name'), name='unique_feature_usage_day'),
+        ),
+    ]
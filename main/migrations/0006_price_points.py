@@ -0,0 +1,28 @@
+# Generated by Django 4.2.23 on 2026-10-17 22:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_feedback_newest_first_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PricePoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255)),
+                ('date', models.DateField(db_index=True)),
+                ('mass', models.FloatField(null=True)),
+                ('average_price', models.FloatField(null=True)),
+                ('price_per_kg', models.FloatField(null=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='pricepoint',
+            constraint=models.UniqueConstraint(fields=('key', 'date'), name='unique_price_point'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.23 on 2026-10-17 22:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_price_points'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PricelistIngest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('sha1', models.CharField(max_length=40)),
+                ('date', models.DateField()),
+                ('rows', models.PositiveIntegerField()),
+                ('prices', models.PositiveIntegerField()),
+                ('ingested_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollups(apps, schema_editor):
+    """
+        Builds the daily rollups of the FeatureUsage rows written before the rollups
+        existed, so the dashboard shows their history straight after migrating.
+        Rollups already written by the app are kept; `manage.py rollup_usage` rebuilds them.
+    """
+    FeatureUsage = apps.get_model('main', 'FeatureUsage')
+    FeatureUsageDaily = apps.get_model('main', 'FeatureUsageDaily')
+    db_alias = schema_editor.connection.alias
+    counts = (
+        FeatureUsage.objects.using(db_alias)
+        .annotate(day=TruncDate('used_at'))
+        .values('day', 'feature_name')
+        .annotate(count=Count('id'))
+    )
+    FeatureUsageDaily.objects.using(db_alias).bulk_create(
+        (FeatureUsageDaily(day=row['day'], feature_name=row['feature_name'], count=row['count'])
+         for row in counts),
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_pricelist_ingest'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
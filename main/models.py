@@ -1,18 +1,171 @@
-from django.db import models
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, models, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
 
 class Feedback(models.Model):
     name = models.CharField(max_length=100, blank=True, null=True)
     message = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='feedback_newest_first'),
+        ]
+
     def __str__(self) -> str:
         return f"Message from {self.name or 'Anonymous'}"
 
+    @property
+    def cursor(self):
+        """
+            Returns an opaque "microseconds-id" position of this message in the inbox.
+        """
+        return f"{(self.created_at - EPOCH) // timedelta(microseconds=1)}-{self.id}"
+
+    @classmethod
+    def page(cls, before=None, size=20):
+        """
+            Takes in an optional cursor and a page size as arguments.
+            Returns up to size messages, newest first, that come after the cursor,
+            and the cursor of the next page (None on the last page).
+            Seeks on (created_at, id) so every page costs the same, however deep.
+            Raises ValueError if the cursor is malformed.
+        """
+        messages = cls.objects.order_by('-created_at', '-id')
+        if before:
+            micros, _, message_id = before.partition('-')
+            try:
+                created_at = EPOCH + timedelta(microseconds=int(micros))
+            except OverflowError:
+                raise ValueError(f'Invalid inbox cursor: {before}')
+            messages = messages.filter(Q(created_at__lt=created_at) |
+                                       Q(created_at=created_at, id__lt=int(message_id)))
+        messages = list(messages[:size + 1])
+        if len(messages) > size:
+            return messages[:size], messages[size - 1].cursor
+        return messages, None
+
+
+class PricePoint(models.Model):
+    """
+        Price of one crop display key on one pricelist date, averaged across its
+        grades as priceOf answers it. Indexed on (key, date) so a crop's history
+        between two dates is a range scan, and on date for a whole day's prices.
+    """
+    key = models.CharField(max_length=255)
+    date = models.DateField(db_index=True)
+    mass = models.FloatField(null=True)
+    average_price = models.FloatField(null=True)
+    price_per_kg = models.FloatField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['key', 'date'], name='unique_price_point'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.key}, {self.date}, {self.price_per_kg}"
+
+    @classmethod
+    def history(cls, key, start=None, end=None):
+        """
+            Takes in a display key and optional first and last dates as arguments.
+            Returns the key's price points between them, inclusive, oldest first.
+        """
+        points = cls.objects.filter(key=key)
+        if start:
+            points = points.filter(date__gte=start)
+        if end:
+            points = points.filter(date__lte=end)
+        return points.order_by('date')
+
+    @classmethod
+    def on(cls, day):
+        """
+            Takes in a date as an argument.
+            Returns every key's price point on that date, by key.
+        """
+        return cls.objects.filter(date=day).order_by('key')
+
+    @classmethod
+    def replace_date(cls, day, prices, batch_size=1000):
+        """
+            Takes in a pricelist date, its (key, mass, average price, price per kg)
+            rows and an insert batch size as arguments.
+            Replaces the date's price points with the rows, in batches.
+            Call it inside a transaction.
+        """
+        cls.objects.filter(date=day).delete()
+        cls.objects.bulk_create(
+            (cls(key=key, date=day, mass=mass, average_price=price, price_per_kg=price_per_kg)
+             for key, mass, price, price_per_kg in prices),
+            batch_size=batch_size,
+        )
+
+
+class PricelistIngest(models.Model):
+    """
+        Record of a pricelist file whose prices are in PricePoint, by name and
+        content hash, written in the same transaction as its prices so an
+        interrupted ingest leaves neither behind.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    sha1 = models.CharField(max_length=40)
+    date = models.DateField()
+    rows = models.PositiveIntegerField()
+    prices = models.PositiveIntegerField()
+    ingested_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"{self.name}, {self.sha1[:8]}, {self.ingested_at}"
+
 
 class FeatureUsage(models.Model):
-    feature_name = models.CharField(max_length=100)
+    feature_name = models.CharField(max_length=100, db_index=True)
     details = models.TextField(blank=True, null=True)
-    used_at = models.DateTimeField(auto_now_add=True)
+    # Set when the event happens, not when the usage buffer writes it
+    used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self) -> str:
+        return f"{self.feature_name}, {self.details}, {self.used_at}"
+
+
+class FeatureUsageDaily(models.Model):
+    """
+        Number of FeatureUsage events per feature per day, kept up to date as
+        events are written so the dashboard never has to count the raw events.
+    """
+    day = models.DateField()
+    feature_name = models.CharField(max_length=100)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'feature_name'], name='unique_feature_usage_day'),
+        ]
 
     def __str__(self) -> str:
-        return f"{self.feature_name}, {self.details}, {self.used_at}"
\ No newline at end of file
+        return f"{self.feature_name}, {self.day}, {self.count}"
+
+    @classmethod
+    def add_events(cls, events, using=DEFAULT_DB_ALIAS):
+        """
+            Takes in a list of FeatureUsage events and the database alias to write to as arguments.
+            Adds them to the rollups of their day and feature.
+        """
+        counts = Counter((timezone.localdate(event.used_at), event.feature_name) for event in events)
+        for (day, feature_name), count in counts.items():
+            rollup = cls.objects.using(using).filter(day=day, feature_name=feature_name)
+            if rollup.update(count=F('count') + count):
+                continue
+            try:
+                with transaction.atomic(using=using):
+                    cls.objects.using(using).create(day=day, feature_name=feature_name, count=count)
+            except IntegrityError:
+                # Another worker created the row first
+                rollup.update(count=F('count') + count)
@@ -1,7 +1,9 @@
 from django.test import TestCase
 from django.db import models
-from .models import Feedback
-from datetime import datetime
+from .models import Feedback, FeatureUsage, FeatureUsageDaily
+from datetime import date, datetime
+from django.db import IntegrityError
+from django.utils import timezone
 from unittest.mock import patch
 
 
@@ -168,4 +170,86 @@ class FeedbackModelTest(TestCase):
         # Django automatically creates verbose names from field names
         self.assertEqual(name_field.verbose_name, "name")
         self.assertEqual(message_field.verbose_name, "message")
-        self.assertEqual(created_at_field.verbose_name, "created at")
\ No newline at end of file
+        self.assertEqual(created_at_field.verbose_name, "created at")
+
+
+class FeedbackPageTest(TestCase):
+
+    def setUp(self):
+        """Create messages, two of them sharing a timestamp"""
+        with patch('django.utils.timezone.now') as mock_now:
+            for minute in (0, 1, 1, 2, 3):
+                mock_now.return_value = timezone.make_aware(datetime(2025, 9, 5, 10, minute))
+                Feedback.objects.create(message=f"Message at {minute}")
+        self.newest_first = list(Feedback.objects.order_by('-created_at', '-id'))
+
+    def test_pages_cover_every_message_once(self):
+        """Test that following the cursors visits every message once, newest first"""
+        seen = []
+        cursor = None
+        while True:
+            messages, cursor = Feedback.page(cursor, size=2)
+            seen.extend(messages)
+            if cursor is None:
+                break
+        self.assertEqual(seen, self.newest_first)
+
+    def test_last_page_has_no_cursor(self):
+        """Test that a page holding the rest of the messages has no next cursor"""
+        messages, cursor = Feedback.page(None, size=5)
+        self.assertEqual(len(messages), 5)
+        self.assertIsNone(cursor)
+
+    def test_malformed_cursor(self):
+        """Test that malformed cursors raise ValueError"""
+        for cursor in ('abc', '123', '99999999999999999999999-1'):
+            with self.assertRaises(ValueError):
+                Feedback.page(cursor)
+
+
+class FeatureUsageDailyTest(TestCase):
+
+    def test_add_events(self):
+        """Test that events are added to the rollup of their day and feature"""
+        day1 = timezone.make_aware(datetime(2025, 9, 5, 10, 0, 0))
+        day2 = timezone.make_aware(datetime(2025, 9, 6, 9, 0, 0))
+        FeatureUsageDaily.add_events([
+            FeatureUsage(feature_name='Buy', used_at=day1),
+            FeatureUsage(feature_name='Buy', used_at=day1),
+            FeatureUsage(feature_name='Barter', used_at=day1),
+        ])
+        FeatureUsageDaily.add_events([
+            FeatureUsage(feature_name='Buy', used_at=day1),
+            FeatureUsage(feature_name='Buy', used_at=day2),
+        ])
+        
+        counts = {(r.day.isoformat(), r.feature_name): r.count for r in FeatureUsageDaily.objects.all()}
+        self.assertEqual(counts, {
+            ('2025-09-05', 'Buy'): 3,
+            ('2025-09-05', 'Barter'): 1,
+            ('2025-09-06', 'Buy'): 1,
+        })
+    
+    def test_unique_day_and_feature(self):
+        """Test that there is one rollup per day and feature"""
+        FeatureUsageDaily.objects.create(day=date(2025, 9, 5), feature_name='Buy', count=1)
+        with self.assertRaises(IntegrityError):
+            FeatureUsageDaily.objects.create(day=date(2025, 9, 5), feature_name='Buy', count=1)
+
+    def test_backfill_migration(self):
+        """Test that migrating builds rollups for existing events and keeps rollups already written"""
+        from importlib import import_module
+        from types import SimpleNamespace
+        from django.apps import apps
+        from django.db import connection
+        backfill_rollups = import_module('main.migrations.0008_backfill_feature_usage_rollups').backfill_rollups
+        
+        used_at = timezone.make_aware(datetime(2025, 9, 5, 10, 0, 0))
+        FeatureUsage.objects.bulk_create([FeatureUsage(feature_name='Buy', used_at=used_at)] * 2 +
+                                         [FeatureUsage(feature_name='Barter', used_at=used_at)])
+        FeatureUsageDaily.objects.create(day=date(2025, 9, 5), feature_name='Barter', count=5)
+        # RunPython only uses the schema editor's connection
+        backfill_rollups(apps, SimpleNamespace(connection=connection))
+        
+        counts = {r.feature_name: r.count for r in FeatureUsageDaily.objects.filter(day=date(2025, 9, 5))}
+        self.assertEqual(counts, {'Buy': 2, 'Barter': 5})
@@ -0,0 +1,271 @@
+import hashlib
+import os
+import pickle
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from datetime import date
+
+
+# Bump when the snapshot layout changes so old cache files are ignored
+SNAPSHOT_FORMAT = 4
+
+PRICELIST_NAME = re.compile(r'^(\d{2})_(\d{2})_(\d{4})\.csv$')
+
+PriceSnapshot = namedtuple('PriceSnapshot', ['version', 'path', 'table', 'search'])
+
+
+def pricelist_date(path):
+    """
+        Takes in a pricelist path as an argument.
+        Returns the date in its DD_MM_YYYY.csv name, or None if it is not a dated pricelist.
+    """
+    match = PRICELIST_NAME.match(os.path.basename(path))
+    if not match:
+        return None
+    day, month, year = match.groups()
+    try:
+        return date(int(year), int(month), int(day))
+    except ValueError:
+        return None
+
+
+def dated_pricelists(data_dir):
+    """
+        Takes in the pricelist directory as an argument.
+        Returns the paths of its DD_MM_YYYY.csv pricelists, oldest first.
+    """
+    try:
+        names = os.listdir(data_dir)
+    except (OSError, TypeError):
+        return []
+    dated = [(pricelist_date(name), name) for name in names]
+    return [os.path.join(data_dir, name) for day, name in sorted(item for item in dated if item[0])]
+
+
+def latest_pricelist(data_dir):
+    """
+        Takes in the pricelist directory as an argument.
+        Returns the path of the newest DD_MM_YYYY.csv pricelist, or None if there is none.
+    """
+    pricelists = dated_pricelists(data_dir)
+    return pricelists[-1] if pricelists else None
+
+
+def file_signature(path):
+    """
+        Takes in a file path as an argument.
+        Returns a (path, mtime, size) tuple that changes whenever the file does.
+    """
+    stat = os.stat(path)
+    return (path, stat.st_mtime_ns, stat.st_size)
+
+
+def file_hash(path):
+    """
+        Takes in a file path as an argument.
+        Returns the SHA-1 hex digest of its contents.
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as hashed_file:
+        for chunk in iter(lambda: hashed_file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_version(path):
+    """
+        Takes in a pricelist path as an argument.
+        Returns a dataset version id made of the list date and a content hash,
+        e.g. "2025-09-05-1a2b3c4d".
+    """
+    digest = file_hash(path)[:8]
+    match = PRICELIST_NAME.match(os.path.basename(path))
+    if match:
+        day, month, year = match.groups()
+        return f'{year}-{month}-{day}-{digest}'
+    return digest
+
+
+def pickle_snapshot(snapshot, directory):
+    """
+        Takes in a snapshot and an existing directory as arguments.
+        Writes the whole snapshot into the directory as a pickle.
+    """
+    with open(os.path.join(directory, 'snapshot.pickle'), 'wb') as cache_file:
+        pickle.dump(snapshot, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def unpickle_snapshot(directory, path, version):
+    """
+        Takes in a directory written by pickle_snapshot, the csv path and the dataset version as arguments.
+        Returns the snapshot read back from it.
+    """
+    with open(os.path.join(directory, 'snapshot.pickle'), 'rb') as cache_file:
+        return pickle.load(cache_file)
+
+
+class PriceStore:
+    """
+        Holds the current pricelist snapshot and swaps in newer lists.
+        A snapshot is never changed once built, so a request that holds one
+        keeps a consistent view while a newer version is built in the background.
+        Built snapshots are cached in cache_dir, one directory per version, written
+        by save(snapshot, directory) and read back by load(directory, path, version).
+    """
+
+    def __init__(self, data_dir, build, reload_interval=0, cache_dir=None,
+                 save=pickle_snapshot, load=unpickle_snapshot):
+        self.data_dir = data_dir
+        self.build = build
+        self.reload_interval = reload_interval
+        self.cache_dir = cache_dir
+        self.save = save
+        self.load = load
+        self._current = None
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._building = False
+
+    @property
+    def version(self):
+        """
+            Returns the dataset version id of the current snapshot.
+        """
+        return self.snapshot().version
+
+    def snapshot(self):
+        """
+            Returns the current snapshot, loading it on first use.
+            Every reload_interval seconds it also checks for a newer pricelist
+            and starts building it in the background.
+        """
+        current = self._current
+        if current is None:
+            return self.reload()
+        if self.reload_interval and time.monotonic() - self._checked_at >= self.reload_interval:
+            self.reload_in_background()
+        return current
+
+    def swap(self, snapshot, signature=None):
+        """
+            Takes in a snapshot and its file signature as arguments.
+            Makes the snapshot current in a single assignment.
+        """
+        self._signature = signature
+        self._current = snapshot
+
+    def _changed_path(self):
+        """
+            Returns the newest pricelist path and signature if they differ
+            from the current snapshot, otherwise (None, None).
+        """
+        self._checked_at = time.monotonic()
+        path = latest_pricelist(self.data_dir)
+        if path is None:
+            return None, None
+        try:
+            signature = file_signature(path)
+        except OSError:
+            return None, None
+        if signature == self._signature:
+            return None, None
+        return path, signature
+
+    def cache_path(self, signature, version):
+        """
+            Takes in a pricelist's file signature and dataset version as arguments.
+            Returns the directory of its cached snapshot, keyed on the csv path, mtime and hash.
+        """
+        key = hashlib.sha1(repr((SNAPSHOT_FORMAT, signature)).encode()).hexdigest()[:8]
+        return os.path.join(self.cache_dir, f'{version}-{key}')
+
+    def _read_cache(self, path, signature, version):
+        """
+            Returns the cached snapshot for a pricelist, or None if there is no usable one.
+        """
+        if not self.cache_dir:
+            return None
+        try:
+            return self.load(self.cache_path(signature, version), path, version)
+        except (OSError, ValueError, KeyError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None
+
+    def _write_cache(self, signature, version, snapshot):
+        """
+            Writes a snapshot to the cache, replacing older cached versions.
+            The snapshot is written to a temporary directory and renamed into place,
+            so other processes never see a half-written one.
+            Empty snapshots are not cached, as they usually mean the csv failed to load.
+            Failures are ignored, the cache only speeds up the next start.
+        """
+        if not self.cache_dir or not len(snapshot.table):
+            return
+        path = self.cache_path(signature, version)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = tempfile.mkdtemp(dir=self.cache_dir, suffix='.tmp')
+            try:
+                self.save(snapshot, tmp)
+                os.replace(tmp, path)
+            except (OSError, pickle.PicklingError):
+                # Another process may have cached the same version first
+                shutil.rmtree(tmp, ignore_errors=True)
+                return
+            # Processes still using an older version keep their mappings after it is removed
+            for name in os.listdir(self.cache_dir):
+                if name == os.path.basename(path) or name.endswith('.tmp'):
+                    continue
+                old = os.path.join(self.cache_dir, name)
+                if os.path.isdir(old):
+                    shutil.rmtree(old, ignore_errors=True)
+                else:
+                    os.remove(old)
+        except OSError:
+            pass
+
+    def reload(self):
+        """
+            Builds the newest pricelist if it has changed and swaps it in,
+            using the cached snapshot when there is one.
+            Returns the current snapshot.
+        """
+        with self._lock:
+            path, signature = self._changed_path()
+            if path is not None:
+                version = file_version(path)
+                snapshot = self._read_cache(path, signature, version)
+                if snapshot is None:
+                    snapshot = self.build(path, version)
+                    self._write_cache(signature, version, snapshot)
+                    # Serve the cached copy when there is one, sharing it with other processes
+                    snapshot = self._read_cache(path, signature, version) or snapshot
+                self.swap(snapshot, signature)
+            elif self._current is None:
+                self.swap(self.build(None, 'empty'))
+            return self._current
+
+    def reload_in_background(self):
+        """
+            Starts a daemon thread running reload(), unless one is already running.
+            Returns the thread, or None if no thread was started.
+        """
+        with self._lock:
+            if self._building:
+                return None
+            self._building = True
+            self._checked_at = time.monotonic()
+
+        def run():
+            try:
+                self.reload()
+            finally:
+                self._building = False
+
+        thread = threading.Thread(target=run, name='pricelist-reload', daemon=True)
+        thread.start()
+        return thread
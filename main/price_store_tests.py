@@ -0,0 +1,119 @@
+import os
+import shutil
+import tempfile
+import unittest
+from .price_store import PriceSnapshot, PriceStore, latest_pricelist, file_version
+
+
+def build(path, version):
+    """Build a stand-in snapshot recording which file it came from"""
+    build.calls += 1
+    with open(path) as csv_file:
+        return PriceSnapshot(version, os.path.basename(path), csv_file.read(), None)
+build.calls = 0
+
+
+class PriceStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        """Create a pricelist directory with two daily lists"""
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir)
+        self.write('31_08_2025.csv', 'august')
+        self.write('01_09_2025.csv', 'september')
+        self.write('notes.csv', 'not a pricelist')
+
+    def write(self, name, content):
+        """Write a file into the pricelist directory"""
+        path = os.path.join(self.data_dir, name)
+        with open(path, 'w') as csv_file:
+            csv_file.write(content)
+        return path
+
+    def test_latest_pricelist(self):
+        """Test that the newest list is picked by its date, not its name"""
+        self.assertEqual(latest_pricelist(self.data_dir),
+                         os.path.join(self.data_dir, '01_09_2025.csv'))
+        self.assertIsNone(latest_pricelist(os.path.join(self.data_dir, 'missing')))
+
+    def test_file_version(self):
+        """Test that the version holds the list date and changes with the content"""
+        path = os.path.join(self.data_dir, '01_09_2025.csv')
+        version = file_version(path)
+        self.assertTrue(version.startswith('2025-09-01-'))
+        self.write('01_09_2025.csv', 'september, corrected')
+        self.assertNotEqual(file_version(path), version)
+
+    def test_snapshot_loads_on_first_use(self):
+        """Test that the newest list is loaded on first use"""
+        store = PriceStore(self.data_dir, build)
+        snapshot = store.snapshot()
+        self.assertEqual((snapshot.path, snapshot.table), ('01_09_2025.csv', 'september'))
+        self.assertEqual(store.version, snapshot.version)
+
+    def test_reload_swaps_in_new_list(self):
+        """Test that a new list replaces the snapshot without touching the old one"""
+        store = PriceStore(self.data_dir, build)
+        old = store.snapshot()
+        
+        # Nothing changed, so the same snapshot is kept
+        self.assertIs(store.reload(), old)
+        
+        self.write('02_09_2025.csv', 'new day')
+        new = store.reload()
+        self.assertEqual((new.path, new.table), ('02_09_2025.csv', 'new day'))
+        self.assertIs(store.snapshot(), new)
+        self.assertEqual((old.path, old.table), ('01_09_2025.csv', 'september'))
+
+    def test_reload_in_background(self):
+        """Test that a background reload swaps in the new list"""
+        store = PriceStore(self.data_dir, build, reload_interval=60)
+        old = store.snapshot()
+        self.write('02_09_2025.csv', 'new day')
+        
+        thread = store.reload_in_background()
+        thread.join()
+        self.assertIsNot(store.snapshot(), old)
+        self.assertEqual(store.snapshot().path, '02_09_2025.csv')
+
+    def test_snapshot_cache(self):
+        """Test that a new store loads the cached snapshot instead of building it"""
+        cache_dir = os.path.join(self.data_dir, 'cache')
+        calls = build.calls
+        first = PriceStore(self.data_dir, build, cache_dir=cache_dir).snapshot()
+        self.assertEqual(build.calls, calls + 1)
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+        
+        # A second worker starting up reads the cache
+        second = PriceStore(self.data_dir, build, cache_dir=cache_dir).snapshot()
+        self.assertEqual(build.calls, calls + 1)
+        self.assertEqual(second, first)
+        
+        # Changing the list invalidates the cached copy and replaces it
+        self.write('01_09_2025.csv', 'september, corrected')
+        third = PriceStore(self.data_dir, build, cache_dir=cache_dir).snapshot()
+        self.assertEqual(build.calls, calls + 2)
+        self.assertEqual(third.table, 'september, corrected')
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+    def test_snapshot_cache_save_and_load(self):
+        """Test that the cache uses the given writer and reader, even in the building process"""
+        cache_dir = os.path.join(self.data_dir, 'cache')
+
+        def save(snapshot, directory):
+            with open(os.path.join(directory, 'table.txt'), 'w') as table_file:
+                table_file.write(snapshot.table)
+
+        def load(directory, path, version):
+            with open(os.path.join(directory, 'table.txt')) as table_file:
+                return PriceSnapshot(version, 'cached', table_file.read(), None)
+
+        snapshot = PriceStore(self.data_dir, build, cache_dir=cache_dir, save=save, load=load).snapshot()
+        self.assertEqual((snapshot.path, snapshot.table), ('cached', 'september'))
+        
+        # A leftover cache file from an older layout is cleared out
+        self.write('02_09_2025.csv', 'new day')
+        open(os.path.join(cache_dir, 'old.pickle'), 'w').close()
+        store = PriceStore(self.data_dir, build, cache_dir=cache_dir, save=save, load=load)
+        self.assertEqual(store.snapshot().table, 'new day')
+        self.assertEqual(os.listdir(cache_dir), [os.path.basename(store.cache_path(store._signature, store.version))])
@@ -0,0 +1,273 @@
+import json
+import math
+import os
+import sys
+import numpy as np
+
+
+def to_number(column):
+    """
+        Takes in a pricelist column as an argument.
+        Returns the column as a float64 array, with thousands separators removed
+        and unreadable values set to NaN.
+    """
+    import pandas as pd
+
+    numbers = pd.to_numeric(column.astype(str).str.replace(',', '', regex=False),
+                            errors='coerce')
+    return numbers.to_numpy(dtype=np.float64)
+
+
+def clean_strings(column):
+    """
+        Takes in a pricelist text column as an argument.
+        Returns a tuple of its distinct cleaned strings (upper case, no double quotes)
+        and an int32 array coding each row into that tuple.
+        The cleanup runs once per distinct value rather than once per row.
+    """
+    categorical = column.astype('category').cat
+    categories = categorical.categories.astype(str).str.upper().str.replace('"', '', regex=False)
+    # Missing values have code -1, which picks the '' appended at the end
+    cleaned = np.append(np.asarray(categories, dtype=object), '')
+    strings, remap = np.unique(cleaned, return_inverse=True)
+    codes = remap[categorical.codes.to_numpy()].astype(np.int32)
+    return tuple(sys.intern(str(string)) for string in strings), codes
+
+
+def aggregate_keys(pairs, price, price_per_kg, counts=None, grade_codes=None):
+    """
+        Takes in an int64 (DESC, CONTAINER) pair code per row, the price and price
+        per kg columns and optional COUNT and GRADE code columns as arguments.
+        Groups the rows by pair in one pass and returns a dict of per-key arrays,
+        keys ordered by their first row: the first row, the average price and
+        price per kg, the lowest and highest price per kg and the number of grades.
+        Averages are weighted by COUNT when every row of the key has one and are
+        plain means otherwise; rows without a price are left out of them.
+    """
+    _, first_index, inverse = np.unique(pairs, return_index=True, return_inverse=True)
+    order = np.argsort(first_index, kind='stable')
+    size = len(order)
+    rank = np.empty(size, dtype=np.intp)
+    rank[order] = np.arange(size)
+    group = rank[inverse.reshape(-1)]
+
+    weights = np.ones(len(pairs))
+    if counts is not None:
+        counted = np.isfinite(counts) & (counts > 0)
+        fully_counted = np.bincount(group, ~counted, minlength=size) == 0
+        weights = np.where(fully_counted[group] & counted, counts, 1.0)
+
+    def weighted_mean(values):
+        valid = ~np.isnan(values)
+        total = np.bincount(group, np.where(valid, weights, 0.0), minlength=size)
+        sums = np.bincount(group, np.where(valid, weights * values, 0.0), minlength=size)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(total > 0, sums / total, np.nan)
+
+    lowest = np.full(size, np.nan)
+    highest = np.full(size, np.nan)
+    np.fmin.at(lowest, group, price_per_kg)
+    np.fmax.at(highest, group, price_per_kg)
+
+    if grade_codes is None:
+        grades = np.bincount(group, minlength=size)
+    else:
+        stride = int(grade_codes.max(initial=0)) + 1
+        graded = np.unique(group.astype(np.int64) * stride + grade_codes)
+        grades = np.bincount(graded // stride, minlength=size)
+
+    return {
+        'first_rows': first_index[order].astype(np.int32),
+        'key_price': weighted_mean(price),
+        'key_price_per_kg': weighted_mean(price_per_kg),
+        'key_min_per_kg': lowest,
+        'key_max_per_kg': highest,
+        'key_grades': grades.astype(np.int32),
+    }
+
+
+class PriceTable:
+    """
+        Compact column store of the pricelist fields used to answer requests.
+        Descriptions and containers are held once each as interned strings and
+        referenced from each row by int32 codes. Masses, prices and the price
+        per kg are float64 NumPy columns, with NaN where a price per kg
+        cannot be worked out.
+        Rows sharing a display key (one per GRADE and COUNT) are also summed up
+        once per table into per-key arrays, see aggregate_keys, which lookups
+        answer from by the key's position.
+    """
+
+    COLUMNS = ['DESC', 'CONTAINER', 'MASS', 'AVERAGE PRICE']
+    # Read when present, to weight and count the rows of each key
+    GROUP_COLUMNS = ['GRADE', 'COUNT']
+
+    # Per-key arrays, in first row order
+    KEY_ARRAYS = ['first_rows', 'key_price', 'key_price_per_kg', 'key_min_per_kg',
+                  'key_max_per_kg', 'key_grades']
+    # Columns written to and mapped from a saved snapshot, one .npy file each
+    ARRAYS = ['desc_codes', 'container_codes', 'mass', 'price', 'price_per_kg'] + KEY_ARRAYS
+    STRINGS = 'strings.json'
+
+    def __init__(self, descs, desc_codes, containers, container_codes, mass, price,
+                 price_per_kg=None, keys=None, counts=None, grade_codes=None):
+        self.descs = descs
+        self.desc_codes = desc_codes
+        self.containers = containers
+        self.container_codes = container_codes
+        self.mass = mass
+        self.price = price
+        if price_per_kg is None:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                price_per_kg = np.where(mass > 0, price / mass, np.nan)
+        self.price_per_kg = price_per_kg
+
+        # Per-key aggregates of each distinct (DESC, CONTAINER) pair, unless loaded
+        if keys is None:
+            pairs = desc_codes.astype(np.int64) * max(len(containers), 1) + container_codes
+            keys = aggregate_keys(pairs, price, price_per_kg, counts, grade_codes)
+        for name in self.KEY_ARRAYS:
+            setattr(self, name, keys[name])
+
+        # Display key ("DESC - CONTAINER") to its position in the per-key arrays
+        first_rows = self.first_rows
+        self.index = {}
+        for position, (desc, container) in enumerate(zip(desc_codes[first_rows].tolist(),
+                                                         container_codes[first_rows].tolist())):
+            self.index[sys.intern(f'{descs[desc]} - {containers[container]}')] = position
+
+    def __len__(self):
+        return len(self.mass)
+
+    @classmethod
+    def empty(cls):
+        """
+            Returns a table with no rows.
+        """
+        no_codes = np.empty(0, dtype=np.int32)
+        no_values = np.empty(0, dtype=np.float64)
+        return cls((), no_codes, (), no_codes, no_values, no_values)
+
+    @classmethod
+    def from_dataframe(cls, frame):
+        """
+            Takes in a pricelist dataframe as an argument.
+            Returns a table of its DESC, CONTAINER, MASS and AVERAGE PRICE columns,
+            or an empty table if any of them is missing.
+        """
+        if frame.empty or any(column not in frame.columns for column in cls.COLUMNS):
+            return cls.empty()
+
+        descs, desc_codes = clean_strings(frame['DESC'])
+        containers, container_codes = clean_strings(frame['CONTAINER'])
+        counts = to_number(frame['COUNT']) if 'COUNT' in frame.columns else None
+        grade_codes = clean_strings(frame['GRADE'])[1] if 'GRADE' in frame.columns else None
+        return cls(descs, desc_codes, containers, container_codes,
+                   to_number(frame['MASS']), to_number(frame['AVERAGE PRICE']),
+                   counts=counts, grade_codes=grade_codes)
+
+    @classmethod
+    def from_csv(cls, path):
+        """
+            Takes in a csv pricelist path as an argument.
+            Returns a table read from only the columns it needs.
+            Raises ValueError if a column in COLUMNS is missing.
+        """
+        import pandas as pd
+
+        wanted = set(cls.COLUMNS + cls.GROUP_COLUMNS)
+        frame = pd.read_csv(path, encoding='utf-8', usecols=lambda name: name in wanted,
+                            dtype={'DESC': 'category', 'CONTAINER': 'category', 'AVERAGE PRICE': str,
+                                   'GRADE': 'category', 'COUNT': str})
+        missing = [column for column in cls.COLUMNS if column not in frame.columns]
+        if missing:
+            raise ValueError(f'Pricelist is missing columns: {", ".join(missing)}')
+        return cls.from_dataframe(frame)
+
+    def save(self, directory):
+        """
+            Takes in an existing directory as an argument.
+            Writes each column as a .npy file and the strings as a JSON table,
+            ready to be memory-mapped by load().
+        """
+        for name in self.ARRAYS:
+            np.save(os.path.join(directory, f'{name}.npy'), getattr(self, name), allow_pickle=False)
+        with open(os.path.join(directory, self.STRINGS), 'w', encoding='utf-8') as strings_file:
+            json.dump({'descs': self.descs, 'containers': self.containers}, strings_file)
+
+    @classmethod
+    def load(cls, directory):
+        """
+            Takes in a directory written by save() as an argument.
+            Returns a table whose columns are read-only memory maps of the saved files,
+            so every process loading the same snapshot shares one copy in the page cache.
+        """
+        arrays = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r', allow_pickle=False)
+                  for name in cls.ARRAYS}
+        with open(os.path.join(directory, cls.STRINGS), encoding='utf-8') as strings_file:
+            strings = json.load(strings_file)
+        descs = tuple(sys.intern(string) for string in strings['descs'])
+        containers = tuple(sys.intern(string) for string in strings['containers'])
+        return cls(descs, arrays['desc_codes'], containers, arrays['container_codes'],
+                   arrays['mass'], arrays['price'], arrays['price_per_kg'],
+                   keys={name: arrays[name] for name in cls.KEY_ARRAYS})
+
+    def keys(self):
+        """
+            Returns the distinct display keys in the table.
+        """
+        return self.index.keys()
+
+    def position(self, key):
+        """
+            Takes in a display key as an argument.
+            Returns the key's position in the per-key arrays, or None if it is not in the table.
+        """
+        return self.index.get(key)
+
+    def row(self, key):
+        """
+            Takes in a display key as an argument.
+            Returns the first row with that key, or None if there is none.
+        """
+        position = self.index.get(key)
+        return None if position is None else int(self.first_rows[position])
+
+    def key_prices(self):
+        """
+            Yields (display key, mass, average price, price per kg) for every key,
+            from its per-key averages, with None for missing numbers.
+        """
+        def number(value):
+            return None if math.isnan(value) else value
+
+        columns = zip(self.mass[self.first_rows].tolist(), self.key_price.tolist(),
+                      self.key_price_per_kg.tolist())
+        for key, (mass, price, price_per_kg) in zip(self.index, columns):
+            yield key, number(mass), number(price), number(price_per_kg)
+
+    def memory_usage(self):
+        """
+            Returns the approximate bytes held by the table's arrays, its strings
+            and its key index, plus their total. Array bytes are further split into
+            mapped bytes, shared with every process that loaded the same snapshot,
+            and private bytes held by this process alone.
+        """
+        columns = [getattr(self, name) for name in self.ARRAYS]
+        arrays = sum(column.nbytes for column in columns)
+        mapped = sum(column.nbytes for column in columns if isinstance(column, np.memmap))
+        strings = sum(sys.getsizeof(string) for string in self.descs + self.containers)
+        index = sys.getsizeof(self.index) + sum(sys.getsizeof(key) for key in self.index)
+        return {'arrays': arrays, 'strings': strings, 'index': index,
+                'total': arrays + strings + index,
+                'mapped': mapped, 'private': arrays - mapped + strings + index}
+
+
+def price_rows(path):
+    """
+        Takes in a csv pricelist path as an argument.
+        Returns its number of rows and the key_prices() of each display key.
+        Needs no Django setup, so process pool workers can run it.
+    """
+    table = PriceTable.from_csv(path)
+    return len(table), list(table.key_prices())
@@ -0,0 +1,95 @@
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from .price_table import PriceTable
+
+
+class PriceTableTest(unittest.TestCase):
+
+    def setUp(self):
+        """Set up a dataframe that mimics the CSV structure"""
+        self.frame = pd.DataFrame({
+            'ITEM': ['CADH', 'NAAR', 'APCR', 'APCR', 'BANA'],
+            'DESC': ['Cabbage "Drumhead"', 'NAARTJIE', 'APPLE CRIPPS RED', 'APPLE CRIPPS RED', None],
+            'CONTAINER': ['Bin (250kg)', 'BOX', 'MARK 4 (18.3kg)', 'MARK 4 (18.3kg)', 'BOX'],
+            'MASS': [250.0, 0.0, 18.3, 18.3, 12.0],
+            'AVERAGE PRICE': ['1,057.19', '20.00', '260.00', '250.00', '100.00']
+        })
+        self.table = PriceTable.from_dataframe(self.frame)
+
+    def test_strings_are_cleaned_and_shared(self):
+        """Test that strings are upper cased, unquoted and stored once"""
+        self.assertEqual(len(self.table), 5)
+        self.assertIn('CABBAGE DRUMHEAD - BIN (250KG)', self.table.keys())
+        self.assertEqual(self.table.containers.count('BOX'), 1)
+        self.assertEqual(self.table.desc_codes.dtype, np.int32)
+        
+        # Missing descriptions become empty strings
+        self.assertIn(' - BOX', self.table.keys())
+
+    def test_price_per_kg(self):
+        """Test the precomputed price per kg column"""
+        row = self.table.row('CABBAGE DRUMHEAD - BIN (250KG)')
+        self.assertAlmostEqual(self.table.price_per_kg[row], 1057.19 / 250.0)
+        
+        # Zero masses cannot be priced per kg
+        row = self.table.row('NAARTJIE - BOX')
+        self.assertTrue(np.isnan(self.table.price_per_kg[row]))
+
+    def test_row_is_first_match(self):
+        """Test that a duplicated key resolves to its first row"""
+        self.assertEqual(self.table.row('APPLE CRIPPS RED - MARK 4 (18.3KG)'), 2)
+        self.assertIsNone(self.table.row('MANGO - BOX'))
+
+    def test_key_aggregates(self):
+        """Test that a duplicated key is averaged across its rows, weighted by COUNT when all have one"""
+        position = self.table.position('APPLE CRIPPS RED - MARK 4 (18.3KG)')
+        self.assertAlmostEqual(self.table.key_price[position], 255.0)
+        self.assertAlmostEqual(self.table.key_min_per_kg[position], 250.0 / 18.3)
+        self.assertAlmostEqual(self.table.key_max_per_kg[position], 260.0 / 18.3)
+        self.assertEqual(self.table.key_grades[position], 2)
+
+        frame = self.frame.assign(GRADE=['1M', '1L', '1L', '1L', '2M'], COUNT=[None, 10, 30, 10, 5])
+        table = PriceTable.from_dataframe(frame)
+        position = table.position('APPLE CRIPPS RED - MARK 4 (18.3KG)')
+        self.assertAlmostEqual(table.key_price[position], (260.0 * 30 + 250.0 * 10) / 40)
+        self.assertAlmostEqual(table.key_price_per_kg[position], table.key_price[position] / 18.3)
+        self.assertEqual(table.key_grades[position], 1)
+
+        # A price that cannot be worked out is left out of the averages
+        self.assertTrue(np.isnan(table.key_price_per_kg[table.position('NAARTJIE - BOX')]))
+
+    def test_missing_columns(self):
+        """Test that a dataframe without the needed columns gives an empty table"""
+        self.assertEqual(len(PriceTable.from_dataframe(pd.DataFrame({'OTHER_COL': [1]}))), 0)
+        self.assertEqual(len(PriceTable.from_dataframe(pd.DataFrame())), 0)
+
+    def test_memory_usage(self):
+        """Test that the memory report adds up"""
+        usage = self.table.memory_usage()
+        self.assertEqual(usage['total'], usage['arrays'] + usage['strings'] + usage['index'])
+        # Per row codes and numbers, then per key rows, grades and four averages
+        self.assertEqual(usage['arrays'], 2 * 5 * 4 + 3 * 5 * 8 + 2 * 4 * 4 + 4 * 4 * 8)
+
+    def test_save_and_load(self):
+        """Test that a saved table loads back as read-only memory maps"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.table.save(directory)
+        loaded = PriceTable.load(directory)
+        
+        self.assertEqual(list(loaded.keys()), list(self.table.keys()))
+        self.assertEqual(loaded.row('APPLE CRIPPS RED - MARK 4 (18.3KG)'), 2)
+        np.testing.assert_array_equal(loaded.price_per_kg, self.table.price_per_kg)
+        np.testing.assert_array_equal(loaded.key_price_per_kg, self.table.key_price_per_kg)
+        self.assertIsInstance(loaded.key_grades, np.memmap)
+        self.assertIsInstance(loaded.price, np.memmap)
+        self.assertFalse(loaded.price.flags.writeable)
+        
+        # Mapped columns are shared, so only strings and the index are private
+        usage = loaded.memory_usage()
+        self.assertEqual(usage['mapped'], usage['arrays'])
+        self.assertEqual(usage['private'], usage['strings'] + usage['index'])
+        self.assertEqual(self.table.memory_usage()['mapped'], 0)
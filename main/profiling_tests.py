@@ -0,0 +1,63 @@
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+from django.contrib.auth.models import User
+from asgiref.sync import iscoroutinefunction
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from .middleware import ProfilingMiddleware
+
+
+class ProfilingMiddlewareTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.settings = override_settings(PROFILE_DIR=self.directory)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+
+    @patch('main.views.priceOf')
+    def test_staff_request_is_profiled(self, mock_priceOf):
+        """Test a staff request with ?profile saves its stats and a summary covering the view"""
+        mock_priceOf.return_value = '5.50'
+        staff = User.objects.create_user('staff', password='pass', is_staff=True)
+        self.client.force_login(staff)
+
+        response = self.client.post('/buy/?profile=1', {'crop': 'APPLE - CARTON'})
+        self.assertEqual(response.status_code, 200)
+        profile_id = response['X-Profile-Id']
+        self.assertTrue(os.path.exists(os.path.join(self.directory, f'{profile_id}.prof')))
+        with open(os.path.join(self.directory, f'{profile_id}.txt')) as summary:
+            text = summary.read()
+        self.assertTrue(text.startswith('POST /buy/?profile=1 -> 200'))
+        self.assertIn('(buy)', text)
+
+        response = self.client.get('/', headers={'X-Profile': '1'})
+        self.assertIn('X-Profile-Id', response)
+
+    def test_other_requests_are_not_profiled(self):
+        """Test that only staff can profile and only when they ask to"""
+        self.client.force_login(User.objects.create_user('user', password='pass'))
+        response = self.client.get('/?profile=1')
+        self.assertNotIn('X-Profile-Id', response)
+
+        self.client.force_login(User.objects.create_user('staff', password='pass', is_staff=True))
+        response = self.client.get('/')
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    async def test_async_chain_is_profiled(self):
+        """Test an async middleware chain stays async and profiles staff requests"""
+        async def view(request):
+            return HttpResponse()
+
+        middleware = ProfilingMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        request = AsyncRequestFactory().get('/', headers={'X-Profile': '1'})
+        request.user = User(username='staff', is_staff=True)
+
+        response = await middleware(request)
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         [f"{response['X-Profile-Id']}.prof", f"{response['X-Profile-Id']}.txt"])
@@ -0,0 +1,227 @@
+import http.client
+import math
+import random
+import re
+import secrets
+import threading
+import time
+from collections import defaultdict, namedtuple
+from datetime import datetime
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+
+# Access log lines as written by runserver, with or without the "[17/Oct/2026 10:00:00]" prefix:
+# "GET /autocomplete/?term=app HTTP/1.1" 200 1369
+LOG_LINE = re.compile(r'^(?:\[(?P<time>[^\]]+)\] )?"(?P<method>[A-Z]+) (?P<path>\S+) HTTP/[\d.]+" '
+                      r'(?P<status>\d{3}) (?P<size>\d+|-)')
+LOG_TIME = '%d/%b/%Y %H:%M:%S'
+
+LoggedRequest = namedtuple('LoggedRequest', ['offset', 'method', 'path'])
+Result = namedtuple('Result', ['endpoint', 'status', 'latency'])
+
+
+def parse_log(lines, interval=0.1):
+    """
+        Takes in the lines of an access log and the seconds between requests
+        to assume when the log has no timestamps.
+        Returns the logged requests in order, each with its offset in seconds
+        from the first one. Lines that are not requests are skipped.
+    """
+    requests = []
+    first = None
+    for line in lines:
+        match = LOG_LINE.match(line.strip())
+        if not match:
+            continue
+        offset = len(requests) * interval
+        if match.group('time'):
+            try:
+                logged_at = datetime.strptime(match.group('time'), LOG_TIME)
+            except ValueError:
+                logged_at = None
+            if logged_at is not None:
+                first = first or logged_at
+                offset = (logged_at - first).total_seconds()
+        requests.append(LoggedRequest(offset, match.group('method'), match.group('path')))
+    return requests
+
+
+def endpoint(path):
+    """
+        Takes in a request path as an argument.
+        Returns the endpoint it is reported under: the path without its query,
+        with every static asset grouped under /static/.
+    """
+    path = urlsplit(path).path
+    if path.startswith('/static/'):
+        return '/static/'
+    return path
+
+
+def form_body(path, crops, chooser):
+    """
+        Takes in a POST path, the crop names to pick from and a random.Random.
+        Returns a form body for the path, or None for posts that cannot be replayed,
+        as the log does not record what was posted.
+    """
+    path = urlsplit(path).path
+    if path == '/buy/':
+        return urlencode({'crop': chooser.choice(crops)})
+    if path == '/barter/':
+        return urlencode({'crop1': chooser.choice(crops), 'crop2': chooser.choice(crops)})
+    return None
+
+
+class Client:
+    """
+        One simulated browser and its cookies, so replayed form posts carry
+        a CSRF token the way a real one would.
+        Each request uses a new connection: on a kept-alive connection the
+        development server's separate header and body writes meet delayed ACKs
+        and add about 40 ms to every response.
+    """
+
+    def __init__(self, base_url, timeout=10.0):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port
+        self.https = parts.scheme == 'https'
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self.cookies = SimpleCookie()
+
+    def request(self, method, path, body=None):
+        """
+            Takes in a method, a path and an optional form body as arguments.
+            Sends the request and keeps any cookies it sets.
+            Returns the response status.
+        """
+        headers = {'Connection': 'close'}
+        if body is not None:
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            headers['X-CSRFToken'] = self.csrf_token()
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{name}={morsel.value}' for name, morsel in self.cookies.items())
+
+        connection_class = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        connection = connection_class(self.host, self.port, timeout=self.timeout)
+        try:
+            connection.request(method, self.prefix + path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+        finally:
+            connection.close()
+        for cookie in response.headers.get_all('Set-Cookie') or []:
+            self.cookies.load(cookie)
+        return response.status
+
+    def csrf_token(self):
+        """
+            Returns the CSRF token to post with: the one the server set, or else a new
+            random one, kept as the cookie as well. The buy and barter forms no longer
+            set a CSRF cookie, as their pages are cached, and Django accepts any
+            well-formed token sent in both the cookie and the X-CSRFToken header.
+        """
+        if 'csrftoken' not in self.cookies:
+            self.cookies['csrftoken'] = secrets.token_hex(16)
+        return self.cookies['csrftoken'].value
+
+
+def replay(requests, base_url, concurrency=8, speedup=1.0, crops=(), timeout=10.0, seed=0, links=False):
+    """
+        Takes in logged requests, the server's base URL, the number of simulated
+        clients, a speed-up factor (0 sends as fast as possible), crop names for
+        form posts, a per-request timeout, a random seed and whether to send buy
+        and barter posts as links.
+        Replays the requests in log order, each sent no earlier than its offset
+        divided by the speed-up. Buy and barter posts are sent with crops picked at
+        random; other posts cannot be rebuilt and are skipped. With links, those
+        posts are sent as the cacheable GET links their forms now submit instead,
+        reported under "<endpoint> (link)" so they are not mistaken for posts.
+        Returns the results and the seconds the replay took.
+    """
+    chooser = random.Random(seed)
+    crops = list(crops) or ['APPLE']
+    work = []
+    for request in requests:
+        body = None
+        name = endpoint(request.path)
+        if request.method == 'POST':
+            body = form_body(request.path, crops, chooser)
+            if body is None:
+                continue
+            if links:
+                request = request._replace(method='GET', path=f'{urlsplit(request.path).path}?{body}')
+                body = None
+                name += ' (link)'
+        work.append((request, body, name))
+
+    results = []
+    lock = threading.Lock()
+    position = iter(work)
+    start = time.perf_counter()
+
+    def run_client():
+        client = Client(base_url, timeout)
+        while True:
+            with lock:
+                item = next(position, None)
+            if item is None:
+                return
+            request, body, name = item
+            if speedup:
+                delay = start + request.offset / speedup - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            sent = time.perf_counter()
+            try:
+                status = client.request(request.method, request.path, body)
+            except (OSError, http.client.HTTPException):
+                status = None
+            result = Result(name, status, time.perf_counter() - sent)
+            with lock:
+                results.append(result)
+
+    threads = [threading.Thread(target=run_client, name=f'replay-{i}', daemon=True)
+               for i in range(max(1, concurrency))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - start
+
+
+def percentile(ordered, fraction):
+    """
+        Takes in sorted values and a fraction between 0 and 1 as arguments.
+        Returns the nearest-rank percentile of the values.
+    """
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def summarize(results, elapsed):
+    """
+        Takes in replay results and the seconds the replay took as arguments.
+        Returns, per endpoint and for all requests together, the request and
+        error counts, the p50, p95 and p99 latencies in milliseconds and the
+        throughput in requests per second. Failed requests and 5xx responses
+        count as errors.
+    """
+    groups = defaultdict(list)
+    for result in results:
+        groups[result.endpoint].append(result)
+        groups['ALL'].append(result)
+
+    summary = {}
+    for name, group in sorted(groups.items()):
+        latencies = sorted(result.latency * 1000 for result in group)
+        summary[name] = {
+            'requests': len(group),
+            'errors': sum(1 for result in group if result.status is None or result.status >= 500),
+            'p50_ms': round(percentile(latencies, 0.50), 2),
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+            'p99_ms': round(percentile(latencies, 0.99), 2),
+            'requests_per_second': round(len(group) / elapsed, 1) if elapsed else None,
+        }
+    return summary
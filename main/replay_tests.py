@@ -0,0 +1,92 @@
+from django.core.servers.basehttp import WSGIServer
+from django.test import LiveServerTestCase, SimpleTestCase
+from django.test.testcases import LiveServerThread
+from .models import FeatureUsage
+from .replay import LoggedRequest, Result, endpoint, parse_log, replay, summarize
+
+
+class ParseLogTest(SimpleTestCase):
+
+    def test_parse_log_without_timestamps(self):
+        """Test that requests are read in order, spaced by the interval, skipping other lines"""
+        lines = ['Watching for file changes with StatReloader\n',
+                 '"GET /autocomplete/?term=app HTTP/1.1" 200 1369\n',
+                 'Not Found: /favicon.ico\n',
+                 '"POST /buy/ HTTP/1.1" 200 2348\n',
+                 '"GET /static/main/css/style.css HTTP/1.1" 304 0\n']
+        self.assertEqual(parse_log(lines, interval=0.5), [
+            LoggedRequest(0.0, 'GET', '/autocomplete/?term=app'),
+            LoggedRequest(0.5, 'POST', '/buy/'),
+            LoggedRequest(1.0, 'GET', '/static/main/css/style.css'),
+        ])
+
+    def test_parse_log_with_timestamps(self):
+        """Test that logged times give the offsets when the log has them"""
+        lines = ['[17/Oct/2026 10:00:00] "GET / HTTP/1.1" 200 1755',
+                 '[17/Oct/2026 10:00:03] "GET /buy/ HTTP/1.1" 200 2201']
+        self.assertEqual([request.offset for request in parse_log(lines)], [0.0, 3.0])
+
+    def test_endpoint(self):
+        """Test that queries are dropped and static assets grouped"""
+        self.assertEqual(endpoint('/autocomplete/?term=app'), '/autocomplete/')
+        self.assertEqual(endpoint('/static/main/images/buy.png'), '/static/')
+
+
+class SummarizeTest(SimpleTestCase):
+
+    def test_summarize(self):
+        """Test the per endpoint percentiles, errors and throughput"""
+        results = [Result('/buy/', 200, ms / 1000) for ms in range(1, 101)]
+        results.append(Result('/barter/', 500, 0.2))
+        results.append(Result('/barter/', None, 0.3))
+        summary = summarize(results, elapsed=2.0)
+        
+        self.assertEqual(summary['/buy/'], {'requests': 100, 'errors': 0, 'p50_ms': 50.0, 'p95_ms': 95.0,
+                                            'p99_ms': 99.0, 'requests_per_second': 50.0})
+        self.assertEqual(summary['/barter/']['errors'], 2)
+        self.assertEqual(summary['ALL']['requests'], 102)
+
+
+class SingleThreadedServer(WSGIServer):
+    """
+        Answers one request at a time, on the live server thread, which already uses
+        the test's connections. The test's in-memory SQLite connection is shared with
+        the server, and two request threads cannot use it at once.
+    """
+
+    def __init__(self, *args, connections_override=None, **kwargs):
+        super().__init__(*args, **kwargs)
+
+
+class SingleThreadedLiveServerThread(LiveServerThread):
+    server_class = SingleThreadedServer
+
+
+class ReplayTest(LiveServerTestCase):
+    server_thread_class = SingleThreadedLiveServerThread
+
+    def test_replay_against_live_server(self):
+        """Test that logged requests, including a form post, are replayed against a server"""
+        requests = parse_log(['"GET / HTTP/1.1" 200 1755',
+                              '"GET /autocomplete/?term=app HTTP/1.1" 200 1369',
+                              '"POST /buy/ HTTP/1.1" 200 2348',
+                              '"POST /login/ HTTP/1.1" 302 0'], interval=0.01)
+        results, elapsed = replay(requests, self.live_server_url, concurrency=2, speedup=0,
+                                  crops=['APPLE FUJI - MARK 4 (18.3KG)'])
+        
+        # The login post cannot be rebuilt from the log, so it is skipped
+        self.assertEqual(sorted(result.endpoint for result in results), ['/', '/autocomplete/', '/buy/'])
+        self.assertTrue(all(result.status == 200 for result in results), results)
+        self.assertEqual(FeatureUsage.objects.filter(feature_name='Buy').count(), 1)
+        self.assertGreater(elapsed, 0)
+
+    def test_replay_posts_as_links(self):
+        """Test that posts sent as links are reported apart from real posts"""
+        requests = parse_log(['"POST /buy/ HTTP/1.1" 200 2348',
+                              '"POST /barter/ HTTP/1.1" 200 2501'], interval=0.01)
+        results, _ = replay(requests, self.live_server_url, concurrency=1, speedup=0,
+                            crops=['APPLE FUJI - MARK 4 (18.3KG)'], links=True)
+        
+        self.assertEqual([result.endpoint for result in results], ['/buy/ (link)', '/barter/ (link)'])
+        self.assertTrue(all(result.status == 200 for result in results))
+        self.assertEqual(FeatureUsage.objects.filter(feature_name__in=['Buy', 'Barter']).count(), 2)
@@ -0,0 +1,95 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from django.db import connections
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.db.models import Sum
+from django.test.utils import override_settings
+from main.benchmark import operation_result
+from main.models import FeatureUsage, FeatureUsageDaily
+from main.usage import UsageRecorder
+
+
+def benchmark_database(path, alias):
+    """
+        Takes in an SQLite file and a database alias as arguments.
+        Registers a connection to the file under the alias, with the same settings as
+        the default database apart from the engine, and returns its settings.
+        The connection is opened like any other, so connection_created runs
+        main.db.configure_sqlite on it.
+    """
+    settings_dict = {**connections['default'].settings_dict,
+                     'ENGINE': 'django.db.backends.sqlite3', 'NAME': path, 'OPTIONS': {}}
+    connections[alias] = DatabaseWrapper(settings_dict, alias)
+    return settings_dict
+
+
+def usage_writer(settings_dict, alias, pragmas, transactions, batch_size):
+    """
+        Takes in the benchmark database's settings and alias, the pragmas to set, a number of
+        transactions and the events per transaction.
+        Records usage events through a UsageRecorder and flushes one batch, plus its daily
+        rollups, per transaction, then reads the rollups back as a worker serving the
+        dashboard would.
+        Returns the worker's start and end times and the number of transactions that failed.
+    """
+    connections[alias] = DatabaseWrapper(settings_dict, alias)
+    # One attempt per batch, so a batch that hits "database is locked" counts as one failed transaction
+    recorder = UsageRecorder(max_queue=batch_size, batch_size=batch_size, background=False, using=alias,
+                             attempts=1)
+    rollups = FeatureUsageDaily.objects.using(alias).values('feature_name').annotate(total=Sum('count'))
+    with override_settings(SQLITE_PRAGMAS=pragmas):
+        start = time.time()
+        for _ in range(transactions):
+            for _ in range(batch_size):
+                recorder.record('Buy', 'CARROTS')
+            recorder.flush()
+            list(rollups.all())
+        end = time.time()
+        connections[alias].close()
+    return start, end, recorder.failed // batch_size
+
+
+def sqlite_write_benchmark(pragmas, workers=4, transactions=500, batch_size=5):
+    """
+        Takes in the pragmas to set on each connection, the number of writer processes,
+        the transactions each writes and the events per transaction.
+        Times the writers sharing one new SQLite file holding the FeatureUsage and
+        FeatureUsageDaily tables. Returns the results as a dict.
+    """
+    directory = tempfile.mkdtemp(prefix='sqlite-benchmark-')
+    alias = f'sqlite_benchmark_{os.getpid()}'
+    try:
+        with override_settings(SQLITE_PRAGMAS=pragmas):
+            settings_dict = benchmark_database(os.path.join(directory, 'usage.sqlite3'), alias)
+            with connections[alias].schema_editor() as editor:
+                editor.create_model(FeatureUsage)
+                editor.create_model(FeatureUsageDaily)
+            # Each writer opens its own connection rather than sharing this one
+            connections[alias].close()
+
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as pool:
+                runs = list(pool.map(usage_writer, [settings_dict] * workers, [alias] * workers,
+                                     [pragmas] * workers, [transactions] * workers, [batch_size] * workers))
+            seconds = max(end for _, end, _ in runs) - min(start for start, _, _ in runs)
+            errors = sum(run_errors for _, _, run_errors in runs)
+
+            with connections[alias].cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                journal_mode = cursor.fetchone()[0]
+            rows = FeatureUsage.objects.using(alias).count()
+            rollups = FeatureUsageDaily.objects.using(alias).aggregate(total=Sum('count'))['total'] or 0
+
+        results = operation_result(seconds, workers * transactions - errors)
+        results.update({'workers': workers, 'transactions': workers * transactions, 'errors': errors,
+                        'rows': rows, 'rows_per_second': round(rows / seconds, 1) if seconds else None,
+                        'rollups': rollups, 'journal_mode': journal_mode})
+        return results
+    finally:
+        if hasattr(connections._connections, alias):
+            connections[alias].close()
+            del connections[alias]
+        shutil.rmtree(directory, ignore_errors=True)
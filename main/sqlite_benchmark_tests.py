@@ -0,0 +1,28 @@
+import os
+import unittest
+from django.db import connections
+from .sqlite_benchmark import sqlite_write_benchmark
+
+
+class SqliteWriteBenchmarkTest(unittest.TestCase):
+
+    def test_concurrent_writers(self):
+        """Test that several writer processes commit every transaction with and without the tuned pragmas"""
+        default = sqlite_write_benchmark({}, workers=3, transactions=40, batch_size=2)
+        tuned = sqlite_write_benchmark({'busy_timeout': 5000, 'journal_mode': 'WAL', 'synchronous': 'NORMAL'},
+                                       workers=3, transactions=40, batch_size=2)
+        
+        self.assertEqual(default['journal_mode'], 'delete')
+        self.assertEqual(tuned['journal_mode'], 'wal')
+        self.assertEqual(tuned['errors'], 0)
+        self.assertEqual(tuned['rows'], 3 * 40 * 2)
+        self.assertEqual(default['rows'], (default['transactions'] - default['errors']) * 2)
+        self.assertGreater(tuned['ops_per_second'], 0)
+
+    def test_writes_go_through_the_models(self):
+        """Test that every written event is added to the daily rollups and the benchmark connection is removed"""
+        results = sqlite_write_benchmark({'journal_mode': 'WAL'}, workers=2, transactions=10, batch_size=3)
+        
+        self.assertEqual(results['rollups'], results['rows'])
+        self.assertEqual(results['rows'], 2 * 10 * 3)
+        self.assertFalse(hasattr(connections._connections, f'sqlite_benchmark_{os.getpid()}'))
@@ -0,0 +1,49 @@
+import os
+import subprocess
+import sys
+import time
+from django.conf import settings
+from django.test import SimpleTestCase
+
+
+# Seconds allowed for a cold `manage.py check`, and for the first autocomplete
+# request of a fresh process once the pricelist snapshot is cached
+CHECK_BUDGET = 3.0
+FIRST_REQUEST_BUDGET = 1.0
+
+FIRST_REQUEST = """
+import os, sys, time
+os.environ['DJANGO_SETTINGS_MODULE'] = 'barterapp.settings'
+import django
+django.setup()
+from django.test import RequestFactory
+from main.views import autocomplete
+assert 'pandas' not in sys.modules, 'pandas imported at start up'
+start = time.perf_counter()
+autocomplete(RequestFactory().get('/autocomplete/', {'term': 'ap'}))
+print(time.perf_counter() - start)
+"""
+
+
+def run_python(*args):
+    """Run python in the project directory and return its output"""
+    env = dict(os.environ, PYTHONPATH=settings.BASE_DIR)
+    return subprocess.run([sys.executable, *args], cwd=settings.BASE_DIR, env=env,
+                          capture_output=True, text=True, check=True).stdout
+
+
+class StartupBudgetTest(SimpleTestCase):
+
+    def test_manage_check_budget(self):
+        """Test that manage.py check stays within its time budget"""
+        start = time.perf_counter()
+        run_python('manage.py', 'check')
+        elapsed = time.perf_counter() - start
+        self.assertLess(elapsed, CHECK_BUDGET)
+
+    def test_first_request_budget(self):
+        """Test that the first request of a fresh process stays within its time budget"""
+        # The first run builds the snapshot cache, the second measures a cold start from it
+        run_python('-c', FIRST_REQUEST)
+        elapsed = float(run_python('-c', FIRST_REQUEST))
+        self.assertLess(elapsed, FIRST_REQUEST_BUDGET)
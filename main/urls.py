@@ -1,15 +1,25 @@
+from django.conf import settings
 from django.urls import path, include
 from django.contrib import admin
 from django.contrib.auth import views as auth_views
-from . import views
+from . import views, async_views
+
+# Views that answer from the in-memory pricelist run natively async under ASGI
+read_views = async_views if settings.ASYNC_VIEWS else views
 
 urlpatterns = [
     path('login/', auth_views.LoginView.as_view(template_name='main/login.html'), name='login'),
     path('logout/', auth_views.LogoutView.as_view(next_page='index'), name='logout'),
-    path('', views.index, name='index'),
-    path('autocomplete/', views.autocomplete, name='autocomplete'),
-    path('buy/', views.buy, name='buy'),
-    path('barter/', views.barter, name='barter'),
+    path('', read_views.index, name='index'),
+    path('autocomplete/', read_views.autocomplete, name='autocomplete'),
+    path('catalogue/<str:version>.json', read_views.catalogue, name='catalogue'),
+    path('prices/', read_views.prices, name='prices'),
+    path('prices/history/', views.price_history, name='price_history'),
+    path('buy/', read_views.buy, name='buy'),
+    path('barter/', read_views.barter, name='barter'),
+    path('barter/matrix/', views.barter_matrix, name='barter_matrix'),
     path('feedback/', views.feedback_view, name='feedback'),
     path('inbox/', views.inbox_view, name='inbox'),
+    path('inbox/more/', views.inbox_more, name='inbox_more'),
+    path('metrics/', views.metrics, name='metrics'),
 ]
\ No newline at end of file
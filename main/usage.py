@@ -0,0 +1,232 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+from .metrics import USAGE_EVENTS_DROPPED, stage
+from .models import FeatureUsage, FeatureUsageDaily
+
+
+logger = logging.getLogger('feature_usage')
+
+
+class UsageRecorder:
+    """
+        Write-behind buffer for FeatureUsage events.
+        Events are queued in memory and written with bulk_create by a background
+        thread once batch_size events are waiting or every flush_interval seconds,
+        and once more when the process exits. When the queue is full new events
+        are dropped and counted rather than slowing the request down. A batch
+        whose write fails is kept and tried again on the next flushes, and is
+        counted as failed once it has been tried attempts times.
+        Events are written to the database with the alias using.
+    """
+
+    def __init__(self, max_queue=10000, batch_size=100, flush_interval=5.0, background=True,
+                 using=DEFAULT_DB_ALIAS, attempts=3):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.background = background
+        self.using = using
+        self.attempts = attempts
+        self.dropped = 0
+        self.failed = 0
+        self.written = 0
+        # Batches whose write failed, with the number of attempts made so far
+        self._retry = []
+        self._exit_registered = False
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    @property
+    def pending(self):
+        """
+            Returns the number of events waiting to be written, including failed batches
+            waiting to be tried again.
+        """
+        return self._queue.qsize() + sum(len(batch) for _, batch in self._retry)
+
+    def record(self, feature_name, details=None):
+        """
+            Takes in a feature name and its details as arguments.
+            Queues a usage event stamped with the current time.
+            Returns False if the queue was full and the event was dropped.
+        """
+        if self.background:
+            self._ensure_worker()
+        event = FeatureUsage(feature_name=feature_name, details=details, used_at=timezone.now())
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            USAGE_EVENTS_DROPPED.inc('queue_full')
+            return False
+        if self._queue.qsize() >= self.batch_size:
+            self._wake.set()
+        return True
+
+    def _ensure_worker(self):
+        """
+            Starts the writer thread if this process does not have a running one.
+            A forked worker inherits neither the parent's thread nor its queued or failed events.
+        """
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self.max_queue)
+                self._retry = []
+                self._thread = None
+            if self._thread is None or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name='feature-usage-writer', daemon=True)
+                self._thread.start()
+                # A forked worker inherits the registration, and stop works in any process
+                if not self._exit_registered:
+                    atexit.register(self.stop)
+                    self._exit_registered = True
+
+    def _run(self):
+        """
+            Writer thread loop, flushing on each wake-up or timeout until stopped.
+        """
+        try:
+            while not self._stopping.is_set():
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+                try:
+                    self.flush()
+                except Exception:
+                    # Keep the thread alive; the events stay queued for the next flush
+                    logger.exception('Could not flush feature usage events')
+        finally:
+            connections[self.using].close()
+
+    def flush(self):
+        """
+            Writes every failed batch due another attempt and then every queued event,
+            in batches of batch_size, adding each batch to the daily rollups in the
+            same transaction.
+            Returns the number of events written.
+        """
+        events = []
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        with self._lock:
+            batches, self._retry = self._retry, []
+        batches += [(0, events[start:start + self.batch_size]) for start in range(0, len(events), self.batch_size)]
+
+        written = 0
+        self._recycle_connection()
+        for attempts, batch in batches:
+            try:
+                with stage('orm_write'), transaction.atomic(using=self.using):
+                    FeatureUsage.objects.using(self.using).bulk_create(batch)
+                    FeatureUsageDaily.add_events(batch, using=self.using)
+                written += len(batch)
+            except Exception:
+                # Not only DatabaseError: a closed connection raises InterfaceError
+                self._write_failed(attempts + 1, batch)
+                self._recycle_connection()
+        with self._lock:
+            self.written += written
+        return written
+
+    def _recycle_connection(self):
+        """
+            Closes the database connection if it is broken or older than CONN_MAX_AGE,
+            as Django does between requests, so the next query opens a new one.
+            A connection inside an atomic block is left to its owner.
+        """
+        connection = connections[self.using]
+        if not connection.in_atomic_block:
+            connection.close_if_unusable_or_obsolete()
+
+    def _write_failed(self, attempts, batch):
+        """
+            Takes in the number of attempts made to write a batch and the batch as arguments.
+            Called while handling the write's error. Keeps the batch for the next flush,
+            or counts it as failed once it has been tried self.attempts times.
+        """
+        if attempts < self.attempts:
+            for event in batch:
+                # bulk_create may have set ids that were rolled back with the transaction
+                event.pk = None
+            logger.warning('Could not write %d feature usage events (attempt %d of %d), will retry',
+                           len(batch), attempts, self.attempts, exc_info=True)
+            with self._lock:
+                self._retry.append((attempts, batch))
+            return
+        logger.exception('Dropped %d feature usage events after %d failed attempts', len(batch), attempts)
+        with self._lock:
+            self.failed += len(batch)
+        USAGE_EVENTS_DROPPED.inc('write_failed', amount=len(batch))
+
+    def stop(self):
+        """
+            Stops the writer thread and writes whatever is still queued.
+            Failed batches that still cannot be written are counted as failed.
+        """
+        self._stopping.set()
+        self._wake.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread() and self._pid == os.getpid():
+            thread.join(timeout=self.flush_interval)
+        self._thread = None
+        self.flush()
+        with self._lock:
+            lost = sum(len(batch) for _, batch in self._retry)
+            self._retry = []
+            self.failed += lost
+        if lost:
+            logger.error('Dropped %d feature usage events that could not be written before stopping', lost)
+            USAGE_EVENTS_DROPPED.inc('write_failed', amount=lost)
+
+
+recorder = UsageRecorder(
+    max_queue=settings.FEATURE_USAGE_BUFFER['MAX_QUEUE'],
+    batch_size=settings.FEATURE_USAGE_BUFFER['BATCH_SIZE'],
+    flush_interval=settings.FEATURE_USAGE_BUFFER['FLUSH_INTERVAL'],
+    attempts=settings.FEATURE_USAGE_BUFFER['ATTEMPTS'],
+)
+
+
+def record_usage(feature_name, details=None):
+    """
+        Takes in a feature name and its details as arguments.
+        Records a FeatureUsage event through the write-behind buffer,
+        or writes it straight away when the buffer is disabled.
+    """
+    if not settings.FEATURE_USAGE_BUFFER['ENABLED']:
+        with stage('orm_write'), transaction.atomic():
+            event = FeatureUsage.objects.create(feature_name=feature_name, details=details)
+            FeatureUsageDaily.add_events([event])
+        return
+    recorder.record(feature_name, details)
+
+
+async def arecord_usage(feature_name, details=None):
+    """
+        Takes in a feature name and its details as arguments.
+        Async counterpart of record_usage for async views. Queuing an event never
+        touches the database, so it runs on the event loop; only the unbuffered
+        fallback hands the write to a thread.
+    """
+    if not settings.FEATURE_USAGE_BUFFER['ENABLED']:
+        await sync_to_async(record_usage)(feature_name, details)
+        return
+    recorder.record(feature_name, details)
@@ -0,0 +1,184 @@
+import time
+from datetime import timedelta
+from unittest.mock import patch
+from django.db import DatabaseError, InterfaceError
+from django.db.models.query import QuerySet
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from .metrics import USAGE_EVENTS_DROPPED
+from .models import FeatureUsage, FeatureUsageDaily
+from .usage import UsageRecorder, record_usage
+
+
+class UsageRecorderTest(TestCase):
+
+    def test_events_are_written_on_flush(self):
+        """Test that queued events are only written when flushed"""
+        recorder = UsageRecorder(batch_size=2, background=False)
+        recorder.record('Buy', 'APPLE - CARTON')
+        recorder.record('Buy', 'ORANGE - BOX')
+        recorder.record('Site visit', 1)
+        
+        self.assertEqual(FeatureUsage.objects.count(), 0)
+        self.assertEqual(recorder.pending, 3)
+        
+        self.assertEqual(recorder.flush(), 3)
+        self.assertEqual(FeatureUsage.objects.count(), 3)
+        self.assertEqual(recorder.written, 3)
+        self.assertEqual(recorder.pending, 0)
+        
+        # The daily rollups are kept up to date in the same write
+        rollups = {r.feature_name: r.count for r in FeatureUsageDaily.objects.all()}
+        self.assertEqual(rollups, {'Buy': 2, 'Site visit': 1})
+
+    def test_event_time_is_kept(self):
+        """Test that events keep the time they were recorded, not the time they were written"""
+        recorder = UsageRecorder(background=False)
+        recorder.record('Buy', 'APPLE - CARTON')
+        recorded_at = timezone.now()
+        recorder.flush()
+        
+        used_at = FeatureUsage.objects.get().used_at
+        self.assertLessEqual(used_at, recorded_at)
+        self.assertLess(recorded_at - used_at, timedelta(seconds=1))
+
+    def test_full_queue_drops_events(self):
+        """Test that a full queue drops and counts new events"""
+        recorder = UsageRecorder(max_queue=2, background=False)
+        self.assertTrue(recorder.record('Buy', 'A'))
+        self.assertTrue(recorder.record('Buy', 'B'))
+        self.assertFalse(recorder.record('Buy', 'C'))
+        
+        self.assertEqual(recorder.dropped, 1)
+        recorder.flush()
+        self.assertEqual(FeatureUsage.objects.count(), 2)
+
+    def test_failed_batch_is_retried(self):
+        """Test that a batch whose write fails is kept and written by the next flush"""
+        recorder = UsageRecorder(batch_size=2, background=False)
+        recorder.record('Buy', 'A')
+        recorder.record('Buy', 'B')
+        with patch.object(FeatureUsageDaily, 'add_events', side_effect=DatabaseError('database is locked')), \
+                self.assertLogs('feature_usage', 'WARNING'):
+            self.assertEqual(recorder.flush(), 0)
+        self.assertEqual(recorder.pending, 2)
+        self.assertEqual(FeatureUsage.objects.count(), 0)
+        
+        self.assertTrue(all(event.pk is None for _, batch in recorder._retry for event in batch))
+        
+        recorder.record('Buy', 'C')
+        self.assertEqual(recorder.flush(), 3)
+        self.assertEqual(FeatureUsage.objects.count(), 3)
+        self.assertEqual(FeatureUsageDaily.objects.get().count, 3)
+        self.assertEqual(recorder.failed, 0)
+
+    def test_failed_batch_is_counted_after_its_attempts(self):
+        """Test that a batch which keeps failing is dropped and counted once it has been tried attempts times"""
+        recorder = UsageRecorder(background=False, attempts=2)
+        recorder.record('Buy', 'A')
+        recorder.record('Buy', 'B')
+        before = USAGE_EVENTS_DROPPED.values().get(('write_failed',), 0)
+        with patch.object(FeatureUsageDaily, 'add_events', side_effect=DatabaseError('database is locked')), \
+                self.assertLogs('feature_usage', 'WARNING') as logs:
+            recorder.flush()
+            self.assertEqual(recorder.failed, 0)
+            recorder.flush()
+        
+        self.assertEqual(recorder.failed, 2)
+        self.assertEqual(recorder.pending, 0)
+        self.assertEqual(USAGE_EVENTS_DROPPED.values()[('write_failed',)], before + 2)
+        self.assertIn('Dropped 2 feature usage events after 2 failed attempts', logs.output[-1])
+
+    def test_stop_counts_unwritten_batches(self):
+        """Test that failed batches still unwritten when the recorder stops are counted"""
+        recorder = UsageRecorder(background=False)
+        recorder.record('Buy', 'A')
+        with patch.object(FeatureUsageDaily, 'add_events', side_effect=DatabaseError('database is locked')), \
+                self.assertLogs('feature_usage', 'WARNING'):
+            recorder.flush()
+            recorder.stop()
+        self.assertEqual(recorder.failed, 1)
+        self.assertEqual(recorder.pending, 0)
+
+    @override_settings(FEATURE_USAGE_BUFFER={'ENABLED': False})
+    def test_record_usage_unbuffered(self):
+        """Test that record_usage writes straight away when the buffer is disabled"""
+        record_usage('Barter', 'Crop1 - A, Crop2 - B')
+        self.assertEqual(FeatureUsage.objects.get().details, 'Crop1 - A, Crop2 - B')
+
+
+class UsageRecorderThreadTest(TransactionTestCase):
+
+    def test_background_thread_flushes_and_stops(self):
+        """Test that the writer thread flushes a full batch and stop writes the rest"""
+        recorder = UsageRecorder(batch_size=2, flush_interval=10.0)
+        recorder.record('Buy', 'A')
+        recorder.record('Buy', 'B')
+        recorder.record('Buy', 'C')
+        recorder.stop()
+        
+        self.assertEqual(FeatureUsage.objects.count(), 3)
+        self.assertEqual(recorder.pending, 0)
+
+    def test_exit_handler_registered_once(self):
+        """Test that restarting the writer thread does not register stop at exit again"""
+        recorder = UsageRecorder(flush_interval=10.0)
+        with patch('main.usage.atexit.register') as register:
+            recorder.record('Buy', 'A')
+            recorder.stop()
+            recorder.record('Buy', 'B')
+            recorder.stop()
+        
+        register.assert_called_once_with(recorder.stop)
+        self.assertEqual(FeatureUsage.objects.count(), 2)
+
+    def wait_for(self, condition, timeout=5.0):
+        """Wait until condition() is true, or fail after timeout seconds"""
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                self.fail('Timed out waiting for the writer thread')
+            time.sleep(0.01)
+
+    def test_writer_survives_interface_error(self):
+        """Test that a closed connection fails one attempt without killing the writer thread"""
+        bulk_create = QuerySet.bulk_create
+        calls = []
+        def closed_once(queryset, *args, **kwargs):
+            calls.append(1)
+            if len(calls) == 1:
+                raise InterfaceError('connection already closed')
+            return bulk_create(queryset, *args, **kwargs)
+
+        recorder = UsageRecorder(batch_size=2, flush_interval=0.05)
+        with patch.object(QuerySet, 'bulk_create', autospec=True, side_effect=closed_once), \
+                self.assertLogs('feature_usage', 'WARNING') as logs:
+            recorder.record('Buy', 'A')
+            recorder.record('Buy', 'B')
+            self.wait_for(lambda: recorder.written == 2)
+            self.assertTrue(recorder._thread.is_alive())
+            
+            recorder.record('Buy', 'C')
+            self.wait_for(lambda: recorder.written == 3)
+        recorder.stop()
+        
+        self.assertIn('InterfaceError', logs.output[0])
+        self.assertEqual(FeatureUsage.objects.count(), 3)
+        self.assertEqual(recorder.failed, 0)
+
+    def test_dead_writer_thread_is_restarted(self):
+        """Test that recording starts a new writer thread if the old one has died"""
+        recorder = UsageRecorder(flush_interval=10.0)
+        recorder.record('Buy', 'A')
+        # End the thread but keep the reference to it, as when the thread crashes
+        dead = recorder._thread
+        recorder._stopping.set()
+        recorder._wake.set()
+        dead.join()
+        self.assertIs(recorder._thread, dead)
+        
+        recorder.record('Buy', 'B')
+        self.assertIsNot(recorder._thread, dead)
+        self.assertTrue(recorder._thread.is_alive())
+        recorder.stop()
+        self.assertEqual(FeatureUsage.objects.count(), 2)
@@ -1,53 +1,314 @@
+import csv
+import hmac
+import json
+from django.conf import settings
 from django.shortcuts import render, redirect
-from django.http import JsonResponse
-from django.views.decorators.http import require_GET
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
 from django.contrib.auth import authenticate, login
-from django.db.models import Count
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.core.exceptions import PermissionDenied
+from django.db.models import Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.utils.timezone import now, timedelta
 from main.forms import CropSearchForm, Compare, FeedbackForm
-from .generate_pricelist import get_matching_crops, priceOf, compare
-from .models import Feedback, FeatureUsage
+from .generate_pricelist import (get_matching_crops, priceOf, compare, price_batch,
+                                 ratio_matrix, ratio_rows, crop_catalogue,
+                                 resolve_crop, suggest_crops)
+from .models import Feedback, FeatureUsage, FeatureUsageDaily, PricePoint
+from .usage import record_usage
+from .caching import page_cache, price_cache
+from .metrics import render_metrics, shared_directory, stage, timed
+
+# Every page render is timed as its own stage on /metrics
+render = timed('template_render')(render)
 
 
 def index(request):
-    FeatureUsage.objects.create(
-        feature_name='Site visit',
-        details= 1)
+    record_usage('Site visit', 1)
     return render(request, 'main/index.html')
 
 
+def autocomplete_limit(request):
+    """
+        Takes in a request as an argument.
+        Returns the requested number of suggestions, clamped to the configured maximum.
+    """
+    try:
+        limit = int(request.GET.get('limit', settings.AUTOCOMPLETE_LIMIT))
+    except ValueError:
+        limit = settings.AUTOCOMPLETE_LIMIT
+    return max(1, min(limit, settings.AUTOCOMPLETE_MAX_LIMIT))
+
+
+def autocomplete_query(request):
+    return (request.GET.get('term', '').strip().upper(), autocomplete_limit(request))
+
+
 @require_GET
+@price_cache('autocomplete', autocomplete_query)
 def autocomplete(request):
     crop = request.GET.get('term', '').upper()
-    result = get_matching_crops(crop)
+    result = get_matching_crops(crop, limit=autocomplete_limit(request))
     return JsonResponse(result, safe=False)
 
 
-def buy(request):
+def catalogue_response(request, version):
+    """
+        Takes in a request and the catalogue version it asked for as arguments.
+        Returns the catalogue response, plain or gzip-compressed, or a redirect
+        to the current version.
+    """
+    crops = crop_catalogue()
+    if version != crops.version:
+        return redirect('catalogue', version=crops.version)
+
+    if 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+        response = HttpResponse(crops.gzip, content_type='application/json')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(crops.json, content_type='application/json')
+    patch_vary_headers(response, ['Accept-Encoding'])
+    patch_cache_control(response, public=True, max_age=365 * 24 * 60 * 60, immutable=True)
+    return response
+
+
+@require_GET
+def catalogue(request, version):
+    """
+        Serves every crop display key as JSON for the browser to filter autocomplete locally.
+        The URL carries the dataset version, so responses never change and are cached for a year;
+        a stale version redirects to the current one.
+    """
+    return catalogue_response(request, version)
+
+
+def prices_response(request):
+    """
+        Takes in a prices request as an argument.
+        Returns the priced batch, or a 400 response describing what is wrong with the body.
+    """
+    try:
+        crops = json.loads(request.body)['crops']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Expected a JSON body like {"crops": [...]}.'}, status=400)
+    if not isinstance(crops, list) or not all(isinstance(crop, str) for crop in crops):
+        return JsonResponse({'error': '"crops" must be a list of crop names.'}, status=400)
+    if len(crops) > settings.PRICE_BATCH_MAX:
+        return JsonResponse({'error': f'At most {settings.PRICE_BATCH_MAX} crops per request.'}, status=400)
+
+    version, results = price_batch([crop.strip().upper() for crop in crops])
+    return JsonResponse({'version': version, 'results': results})
+
+
+@csrf_exempt
+@require_POST
+def prices(request):
+    """
+        Prices a batch of crops in one request.
+        Takes a JSON body like {"crops": ["APPLE FUJI - MARK 4 (18.3KG)", ...]}.
+        Unknown crops are reported in their own result rather than failing the batch.
+    """
+    return prices_response(request)
+
+
+@require_GET
+def price_history(request):
+    """
+        Serves a crop's price per kg on every stored pricelist date as JSON, oldest first.
+        Takes ?crop=<display key> and optional ?start= and ?end= dates (YYYY-MM-DD), inclusive.
+    """
+    crop = request.GET.get('crop', '').strip().upper()
+    if not crop:
+        return JsonResponse({'error': 'Expected ?crop=<crop name>.'}, status=400)
+    dates = {}
+    for name in ('start', 'end'):
+        value = request.GET.get(name)
+        try:
+            dates[name] = parse_date(value) if value else None
+        except ValueError:
+            dates[name] = None
+        if value and dates[name] is None:
+            return JsonResponse({'error': f'"{name}" must be a date like 2025-09-05.'}, status=400)
+
+    points = PricePoint.history(crop, dates['start'], dates['end'])
+    return JsonResponse({
+        'crop': crop,
+        'history': [
+            {'date': day.isoformat(), 'price_per_kg': price_per_kg, 'mass': mass, 'average_price': price}
+            for day, price_per_kg, mass, price
+            in points.values_list('date', 'price_per_kg', 'mass', 'average_price')
+        ],
+    })
+
+
+class Echo:
+    """
+        File-like object whose write returns the value, so csv.writer rows can be streamed.
+    """
+    def write(self, value):
+        return value
+
+
+def barter_matrix_query(request):
+    return (request.GET.get('format', 'json'),
+            [crop.strip().upper() for crop in request.GET.getlist('row')],
+            [crop.strip().upper() for crop in request.GET.getlist('col')])
+
+
+@require_GET
+@price_cache('barter_matrix', barter_matrix_query)
+def barter_matrix(request):
+    """
+        Streams how many kg of each crop trade for one kg of every other crop,
+        as JSON or as CSV (?format=csv). Repeat ?row= and ?col= to pick crops.
+    """
+    output, row_crops, column_crops = barter_matrix_query(request)
+    if output not in ('json', 'csv'):
+        return JsonResponse({'error': 'format must be json or csv.'}, status=400)
+
+    matrix = ratio_matrix()
+    limit = settings.BARTER_MATRIX_MAX_KEYS
+    if len(row_crops or matrix.keys) > limit or len(column_crops or matrix.keys) > limit:
+        return JsonResponse({'error': f'At most {limit} rows and {limit} columns per request; '
+                                      'pick crops with ?row= and ?col=.'}, status=400)
+    try:
+        columns, rows = ratio_rows(matrix, row_crops, column_crops)
+    except KeyError as e:
+        return JsonResponse({'error': f'Crop not found on list: {e.args[0]}'}, status=404)
+
+    if output == 'csv':
+        writer = csv.writer(Echo())
+
+        def lines():
+            yield writer.writerow(['crop'] + columns)
+            for crop, ratios in rows:
+                yield writer.writerow([crop] + ['' if ratio is None else ratio for ratio in ratios])
+
+        response = StreamingHttpResponse(lines(), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="barter-matrix-{matrix.version}.csv"'
+        return response
+
+    def chunks():
+        yield f'{{"version": {json.dumps(matrix.version)}, "columns": {json.dumps(columns)}, "rows": ['
+        for i, (crop, ratios) in enumerate(rows):
+            yield (', ' if i else '') + json.dumps({'crop': crop, 'ratios': ratios})
+        yield ']}'
+
+    return StreamingHttpResponse(chunks(), content_type='application/json')
+
+
+def crop_query(crop):
+    """
+        Takes in a crop name as typed as an argument.
+        Returns it upper cased with runs of whitespace collapsed, the form in
+        which buy and barter results are looked up and cached.
+    """
+    return ' '.join(crop.split()).upper()
+
+
+def buy_query(request):
+    return crop_query(request.GET.get('crop', ''))
+
+
+def barter_query(request):
+    return crop_query(request.GET.get('crop1', '')), crop_query(request.GET.get('crop2', ''))
+
+
+def buy_page(request, form):
+    """
+        Takes in a request and its crop search form as arguments.
+        Returns the buy page, priced if the form is bound and valid, with close
+        crops suggested when the name is not on the pricelist. A priced result
+        names the crop it resolved to, which may differ from the name typed.
+    """
     result = None
-    form = CropSearchForm(request.POST or None)
-    if request.method == 'POST' and form.is_valid():
-        crop = form.cleaned_data['crop']
-        FeatureUsage.objects.create(
-            feature_name='Buy',
-            details=crop
-        )
-        result = [crop, priceOf(crop.upper())]
-    return render(request, 'main/buy.html', {'form': form, 'result': result})
-    
+    suggestions = []
+    crop = None
+    if form.is_bound and form.is_valid():
+        crop = crop_query(form.cleaned_data['crop'])
+        key = resolve_crop(crop)
+        if key is None:
+            result = [crop, None]
+            suggestions = suggest_crops(crop)
+        else:
+            result = [key, priceOf(key)]
+    return render(request, 'main/buy.html', {'form': form, 'result': result, 'suggestions': suggestions,
+                                             'query': crop})
 
-def barter(request):
+
+def barter_page(request, form):
+    """
+        Takes in a request and its compare form as arguments.
+        Returns the barter page, compared if the form is bound and valid, with close
+        crops suggested for any name not on the pricelist.
+    """
     result = None
-    form = Compare(request.POST or None)
-    if request.method == 'POST' and form.is_valid():
-        crop1 = form.cleaned_data['crop1']
-        crop2 = form.cleaned_data['crop2']
-        FeatureUsage.objects.create(
-            feature_name='Barter',
-            details= f'Crop1 - {crop1}, Crop2 - {crop2}'
-        )
-        result = compare(crop1.upper(), crop2.upper())
-    return render(request, 'main/barter.html', {'form': form, 'result': result})
+    suggestions = []
+    crops = None
+    if form.is_bound and form.is_valid():
+        crops = crop1, crop2 = crop_query(form.cleaned_data['crop1']), crop_query(form.cleaned_data['crop2'])
+        result = compare(crop1, crop2)
+        if result is None:
+            suggestions = [(crop, suggest_crops(crop)) for crop in crops if resolve_crop(crop) is None]
+    return render(request, 'main/barter.html', {'form': form, 'result': result, 'suggestions': suggestions,
+                                                'query': crops})
+
+
+@price_cache('buy', buy_query)
+@page_cache('buy', buy_query)
+def buy_result(request):
+    return buy_page(request, CropSearchForm({'crop': buy_query(request)}))
+
+
+@price_cache('barter', barter_query)
+@page_cache('barter', barter_query)
+def barter_result(request):
+    crop1, crop2 = barter_query(request)
+    return barter_page(request, Compare({'crop1': crop1, 'crop2': crop2}))
+
+
+def buy(request):
+    """
+        Prices a crop named in a posted form, or in a shareable /buy/?crop=... link.
+        Linked results are cached by dataset version and crop; usage is recorded
+        before the caches so every request is still counted.
+    """
+    if request.method == 'POST':
+        form = CropSearchForm(request.POST)
+        if form.is_valid():
+            record_usage('Buy', form.cleaned_data['crop'])
+        return buy_page(request, form)
+
+    crop = buy_query(request)
+    if not crop:
+        return buy_page(request, CropSearchForm())
+    record_usage('Buy', crop)
+    return buy_result(request)
+
+
+def barter(request):
+    """
+        Compares two crops named in a posted form, or in a shareable
+        /barter/?crop1=...&crop2=... link, cached like buy.
+    """
+    if request.method == 'POST':
+        form = Compare(request.POST)
+        if form.is_valid():
+            crop1 = form.cleaned_data['crop1']
+            crop2 = form.cleaned_data['crop2']
+            record_usage('Barter', f'Crop1 - {crop1}, Crop2 - {crop2}')
+        return barter_page(request, form)
+
+    crop1, crop2 = barter_query(request)
+    if not (crop1 or crop2):
+        return barter_page(request, Compare())
+    if crop1 and crop2:
+        record_usage('Barter', f'Crop1 - {crop1}, Crop2 - {crop2}')
+    return barter_result(request)
 
 
 def feedback_view(request):
@@ -55,7 +316,8 @@ def feedback_view(request):
         form = FeedbackForm(request.POST)
         print(form)
         if form.is_valid():
-            form.save()
+            with stage('orm_write'):
+                form.save()
             return redirect('index')
     else:
         form = FeedbackForm()
@@ -76,21 +338,85 @@ def user_login(request):
     return render(request, 'login')
 
 
+def staff_only(user):
+    """
+        Takes in a signed-in user as an argument.
+        Returns True for staff, or raises PermissionDenied so other users get a 403.
+    """
+    if not user.is_staff:
+        raise PermissionDenied
+    return True
+
+
+@login_required
+@user_passes_test(staff_only)
 def inbox_view(request):
-    messages = Feedback.objects.order_by('-created_at')
-    total_usage = FeatureUsage.objects.count()
-    feature_counts = FeatureUsage.objects.values('feature_name').annotate(count=Count('id'))
-    last_week = now() - timedelta(days=7)
+    try:
+        messages, next_cursor = Feedback.page(request.GET.get('before'), settings.INBOX_PAGE_SIZE)
+    except ValueError:
+        messages, next_cursor = Feedback.page(None, settings.INBOX_PAGE_SIZE)
+    rollups = FeatureUsageDaily.objects.all()
+    total_usage = rollups.aggregate(total=Sum('count'))['total'] or 0
+    feature_counts = rollups.values('feature_name').annotate(count=Sum('count')).order_by('feature_name')
+    last_week = (now() - timedelta(days=7)).date()
     daily_counts = (
-        FeatureUsage.objects.filter(used_at__gte=last_week)
-        .extra(select={'day': 'date(used_at)'})
+        rollups.filter(day__gte=last_week)
         .values('day')
-        .annotate(count=Count('id'))
+        .annotate(count=Sum('count'))
         .order_by('day')
     )
+    recent_usage = FeatureUsage.objects.order_by('-used_at')[:10]
     return render(request, 'main/inbox.html', {        
         'messages': messages,
+        'next_cursor': next_cursor,
         'total_usage': total_usage,
         'feature_counts': feature_counts,
         'daily_counts': list(daily_counts),
+        'recent_usage': recent_usage,
         })
+
+
+@require_GET
+@login_required
+@user_passes_test(staff_only)
+def inbox_more(request):
+    try:
+        messages, next_cursor = Feedback.page(request.GET.get('before'), settings.INBOX_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid cursor.'}, status=400)
+    return JsonResponse({
+        'messages': [
+            {'name': msg.name or 'Anonymous',
+             'message': msg.message,
+             'created_at': timezone.localtime(msg.created_at).strftime('%Y-%m-%d %H:%M')}
+            for msg in messages
+        ],
+        'next': next_cursor,
+    })
+
+
+def metrics_allowed(request):
+    """
+        Takes in a request as an argument.
+        Returns True for staff users, or for a request carrying settings.METRICS_TOKEN
+        as a bearer token.
+    """
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+    token = settings.METRICS_TOKEN
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(token) and hmac.compare_digest(header.encode(), f'Bearer {token}'.encode())
+
+
+@require_GET
+def metrics(request):
+    """
+        Serves per-view request latency, status counts, requests in flight and
+        internal stage timings in Prometheus text format, added up across every
+        worker process sharing settings.METRICS_DIR.
+    """
+    if not metrics_allowed(request):
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+    directory = shared_directory(settings.METRICS_DIR, settings.METRICS_WRITE_INTERVAL)
+    return HttpResponse(render_metrics(directory), content_type='text/plain; version=0.0.4; charset=utf-8')
+
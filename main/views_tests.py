@@ -1,12 +1,18 @@
-from django.test import TestCase, RequestFactory
+import gzip
+import json
+from django.test import TestCase, RequestFactory, override_settings
 from django.http import JsonResponse
 from django.shortcuts import render, redirect
-from django.contrib.auth.models import User
+from django.contrib.auth.models import AnonymousUser, User
 from django.contrib.messages import get_messages
-from unittest.mock import patch, MagicMock
-from .views import index, autocomplete, buy, barter, feedback_view, inbox_view
+from unittest.mock import patch, MagicMock, PropertyMock
+import numpy as np
+from django.core.cache import cache
+from .views import (index, autocomplete, catalogue, prices, barter_matrix, buy, barter,
+                    feedback_view, inbox_view, inbox_more, price_history)
+from .generate_pricelist import RatioMatrix, Catalogue
 from .forms import CropSearchForm, Compare, FeedbackForm
-from .models import Feedback
+from .models import Feedback, FeatureUsage, PricePoint
 
 
 class IndexViewTest(TestCase):
@@ -43,8 +49,8 @@ class AutocompleteViewTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.content, b'["APPLE - CARTON", "APPLE - BOX"]')
         
-        # Verify function was called with uppercase term
-        mock_get_matching_crops.assert_called_once_with('APPLE')
+        # Verify function was called with uppercase term and the default limit
+        mock_get_matching_crops.assert_called_once_with('APPLE', limit=10)
     
     @patch('main.views.get_matching_crops')
     def test_autocomplete_view_empty_term(self, mock_get_matching_crops):
@@ -64,7 +70,48 @@ class AutocompleteViewTest(TestCase):
         self.assertEqual(response.content, b'[]')
         
         # Verify function was called with empty string
-        mock_get_matching_crops.assert_called_once_with('')
+        mock_get_matching_crops.assert_called_once_with('', limit=10)
+    
+    @patch('main.views.get_matching_crops')
+    def test_autocomplete_view_limit(self, mock_get_matching_crops):
+        """Test autocomplete view passes a clamped limit"""
+        mock_get_matching_crops.return_value = []
+        
+        # Requested limit within range
+        autocomplete(RequestFactory().get('/autocomplete/', {'term': 'ap', 'limit': '5'}))
+        mock_get_matching_crops.assert_called_with('AP', limit=5)
+        
+        # Requested limit above the maximum
+        autocomplete(RequestFactory().get('/autocomplete/', {'term': 'ap', 'limit': '1000'}))
+        mock_get_matching_crops.assert_called_with('AP', limit=50)
+        
+        # Unreadable limit falls back to the default
+        autocomplete(RequestFactory().get('/autocomplete/', {'term': 'ap', 'limit': 'all'}))
+        mock_get_matching_crops.assert_called_with('AP', limit=10)
+    
+    @patch('main.views.get_matching_crops')
+    def test_autocomplete_view_etag(self, mock_get_matching_crops):
+        """Test that autocomplete answers are validated with an ETag and cacheable"""
+        mock_get_matching_crops.return_value = ['APPLE - CARTON']
+        
+        response = autocomplete(RequestFactory().get('/autocomplete/', {'term': 'apple'}))
+        etag = response['ETag']
+        self.assertIn('max-age=300', response['Cache-Control'])
+        
+        # The same query, however it is typed, gets the same ETag
+        response = autocomplete(RequestFactory().get('/autocomplete/', {'term': ' APPLE'}))
+        self.assertEqual(response['ETag'], etag)
+        
+        # A different query gets a different ETag
+        response = autocomplete(RequestFactory().get('/autocomplete/', {'term': 'orange'}))
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(mock_get_matching_crops.call_count, 3)
+        
+        # A matching If-None-Match is answered before any search runs
+        request = RequestFactory().get('/autocomplete/', {'term': 'apple'}, HTTP_IF_NONE_MATCH=etag)
+        response = autocomplete(request)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(mock_get_matching_crops.call_count, 3)
     
     def test_autocomplete_view_require_get(self):
         """Test that autocomplete view only accepts GET requests"""
@@ -76,6 +123,81 @@ class AutocompleteViewTest(TestCase):
             autocomplete(request)
 
 
+class PricesViewTest(TestCase):
+    
+    def post(self, body):
+        """Post a raw JSON body to the prices view"""
+        request = RequestFactory().post('/prices/', body, content_type='application/json')
+        return prices(request)
+    
+    @patch('main.views.price_batch')
+    def test_prices_view(self, mock_price_batch):
+        """Test prices view with a batch of crops"""
+        mock_price_batch.return_value = ('2025-09-05-abc', [
+            {'crop': 'APPLE - CARTON', 'price_per_kg': 5.0, 'mass': 18.0, 'average_price': 90.0},
+            {'crop': 'MANGO - BOX', 'error': 'Crop not found on list.'},
+        ])
+        
+        response = self.post('{"crops": ["apple - carton ", "Mango - Box"]}')
+        
+        # Check response
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual(data['version'], '2025-09-05-abc')
+        self.assertEqual(len(data['results']), 2)
+        
+        # Verify crops were normalised to display keys
+        mock_price_batch.assert_called_once_with(['APPLE - CARTON', 'MANGO - BOX'])
+    
+    @patch('main.views.price_batch')
+    def test_prices_view_bad_body(self, mock_price_batch):
+        """Test prices view rejects malformed batches"""
+        self.assertEqual(self.post('not json').status_code, 400)
+        self.assertEqual(self.post('{"crop": "APPLE"}').status_code, 400)
+        self.assertEqual(self.post('{"crops": "APPLE"}').status_code, 400)
+        self.assertEqual(self.post('{"crops": [1, 2]}').status_code, 400)
+        self.assertEqual(self.post(json.dumps({'crops': ['APPLE'] * 1001})).status_code, 400)
+        mock_price_batch.assert_not_called()
+    
+    def test_prices_view_require_post(self):
+        """Test that prices view only accepts POST requests"""
+        response = prices(RequestFactory().get('/prices/'))
+        self.assertEqual(response.status_code, 405)
+
+
+class PriceHistoryViewTest(TestCase):
+
+    def setUp(self):
+        for day, price in [('2025-09-01', 11.5), ('2025-09-05', 12.0), ('2025-09-08', 12.5)]:
+            PricePoint.objects.create(key='APPLE - CARTON', date=day, mass=10.0,
+                                      average_price=price * 10, price_per_kg=price)
+        PricePoint.objects.create(key='MANGO - BOX', date='2025-09-05', price_per_kg=30.0)
+
+    def get(self, **params):
+        """Get a price history as parsed JSON with its status code"""
+        response = price_history(RequestFactory().get('/prices/history/', params))
+        return response.status_code, json.loads(response.content)
+
+    def test_price_history(self):
+        """Test a crop's history is served oldest first, within the inclusive date range"""
+        status, data = self.get(crop='apple - carton')
+        self.assertEqual(status, 200)
+        self.assertEqual(data['crop'], 'APPLE - CARTON')
+        self.assertEqual([point['price_per_kg'] for point in data['history']], [11.5, 12.0, 12.5])
+
+        status, data = self.get(crop='APPLE - CARTON', start='2025-09-05', end='2025-09-08')
+        self.assertEqual(data['history'], [
+            {'date': '2025-09-05', 'price_per_kg': 12.0, 'mass': 10.0, 'average_price': 120.0},
+            {'date': '2025-09-08', 'price_per_kg': 12.5, 'mass': 10.0, 'average_price': 125.0},
+        ])
+
+    def test_price_history_bad_query(self):
+        """Test price history needs a crop and well-formed dates"""
+        self.assertEqual(self.get()[0], 400)
+        self.assertEqual(self.get(crop='APPLE - CARTON', start='05/09/2025')[0], 400)
+        self.assertEqual(self.get(crop='APPLE - CARTON', end='2025-02-30')[0], 400)
+
+
 class BuyViewTest(TestCase):
     
     @patch('main.views.priceOf')
@@ -101,6 +223,7 @@ class BuyViewTest(TestCase):
         # priceOf should not be called for GET requests
         mock_priceOf.assert_not_called()
     
+    @patch('main.views.resolve_crop', lambda crop: crop)
     @patch('main.views.priceOf')
     def test_buy_view_post_valid(self, mock_priceOf):
         """Test buy view with valid POST request"""
@@ -126,6 +249,20 @@ class BuyViewTest(TestCase):
         # Verify priceOf was called with uppercase crop name
         mock_priceOf.assert_called_once_with('APPLE - CARTON')
     
+    @patch('main.views.resolve_crop', lambda crop: None)
+    @patch('main.views.suggest_crops')
+    @patch('main.views.priceOf')
+    def test_buy_view_post_not_found(self, mock_priceOf, mock_suggest_crops):
+        """Test buy view suggests close crops when the name is not on the pricelist"""
+        mock_priceOf.return_value = None
+        mock_suggest_crops.return_value = ['CARROTS - BAG (7.5KG)', 'CARROTS - POCKET (10KG)']
+
+        response = self.client.post('/buy/', {'crop': 'carrot'})
+
+        self.assertEqual(response.context['suggestions'], mock_suggest_crops.return_value)
+        self.assertContains(response, 'Did you mean CARROTS - BAG (7.5KG), CARROTS - POCKET (10KG)?')
+        mock_suggest_crops.assert_called_once_with('CARROT')
+
     @patch('main.views.priceOf')
     def test_buy_view_post_invalid(self, mock_priceOf):
         """Test buy view with invalid POST request"""
@@ -150,6 +287,66 @@ class BuyViewTest(TestCase):
         mock_priceOf.assert_not_called()
 
 
+class BuyBarterLinkTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    @patch('main.views.resolve_crop', lambda crop: crop)
+    @patch('main.views.priceOf')
+    def test_buy_link(self, mock_priceOf):
+        """Test a /buy/?crop= link is priced once, then served from the page cache and revalidated"""
+        mock_priceOf.return_value = '5.50'
+
+        response = self.client.get('/buy/', {'crop': 'apple - carton'})
+        self.assertContains(response, 'The average price of APPLE - CARTON is R5.50/kg.')
+        self.assertIn('max-age=300', response['Cache-Control'])
+        self.assertNotIn('csrftoken', response.cookies)
+
+        # Other spellings of the same crop share the cached page
+        cached = self.client.get('/buy/', {'crop': ' Apple -  Carton'})
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual(cached['ETag'], response['ETag'])
+        self.assertEqual(self.client.get('/buy/', {'crop': 'APPLE - CARTON'},
+                                         headers={'If-None-Match': response['ETag']}).status_code, 304)
+        mock_priceOf.assert_called_once_with('APPLE - CARTON')
+
+        # Usage is recorded for every request, cached or not
+        self.assertEqual(FeatureUsage.objects.filter(feature_name='Buy').count(), 3)
+
+    @patch('main.views.resolve_crop', lambda crop: 'CARROTS - BAG (7.5KG)')
+    @patch('main.views.priceOf')
+    def test_buy_link_names_resolved_crop(self, mock_priceOf):
+        """Test a misspelt link shows and caches the crop it resolved to, not the name typed"""
+        mock_priceOf.return_value = '4.00'
+
+        response = self.client.get('/buy/', {'crop': 'carot bag'})
+        self.assertContains(response, 'The average price of CARROTS - BAG (7.5KG) is R4.00/kg.')
+        self.assertNotContains(response, 'CAROT BAG is')
+        mock_priceOf.assert_called_once_with('CARROTS - BAG (7.5KG)')
+
+    @patch('main.views.compare')
+    def test_barter_link(self, mock_compare):
+        """Test a /barter/?crop1=&crop2= link is compared once and cached"""
+        mock_compare.return_value = ('Apple - Carton', '1.50', 'Orange - Box', '0.67', '5.50', '8.25')
+
+        for _ in range(2):
+            response = self.client.get('/barter/', {'crop1': 'apple - carton', 'crop2': 'orange - box'})
+            self.assertContains(response, '1kg of Apple - Carton is equal to 1.50 kgs of Orange - Box.')
+        mock_compare.assert_called_once_with('APPLE - CARTON', 'ORANGE - BOX')
+        self.assertEqual(FeatureUsage.objects.filter(feature_name='Barter').count(), 2)
+
+    @patch('main.views.compare')
+    def test_barter_link_missing_crop(self, mock_compare):
+        """Test a barter link naming one crop shows the form errors without recording usage"""
+        response = self.client.get('/barter/', {'crop1': 'apple - carton'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].errors)
+        mock_compare.assert_not_called()
+        self.assertFalse(FeatureUsage.objects.exists())
+
+
 class BarterViewTest(TestCase):
     
     @patch('main.views.compare')
@@ -231,6 +428,99 @@ class BarterViewTest(TestCase):
         mock_compare.assert_not_called()
 
 
+class BarterMatrixViewTest(TestCase):
+    
+    def setUp(self):
+        keys = ['APPLE - CARTON', 'ORANGE - BOX']
+        self.matrix = RatioMatrix('2025-09-05-abc', keys, {'APPLE - CARTON': 0, 'ORANGE - BOX': 1},
+                                  np.array([1.0, 0.5]))
+    
+    def get(self, params):
+        """Request the matrix and return the response and its streamed body"""
+        with patch('main.views.ratio_matrix', return_value=self.matrix):
+            response = barter_matrix(RequestFactory().get('/barter/matrix/', params))
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body.decode()
+    
+    def test_barter_matrix_json(self):
+        """Test the full matrix as JSON"""
+        response, body = self.get({})
+        
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(body)
+        self.assertEqual(data['version'], '2025-09-05-abc')
+        self.assertEqual(data['columns'], ['APPLE - CARTON', 'ORANGE - BOX'])
+        self.assertEqual(data['rows'][1], {'crop': 'ORANGE - BOX', 'ratios': [0.5, 1.0]})
+    
+    def test_barter_matrix_csv_subset(self):
+        """Test a filtered matrix as CSV"""
+        response, body = self.get({'format': 'csv', 'row': 'orange - box', 'col': 'APPLE - CARTON'})
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(body.splitlines(), ['crop,APPLE - CARTON', 'ORANGE - BOX,0.5'])
+    
+    def test_barter_matrix_errors(self):
+        """Test unknown crops and formats"""
+        self.assertEqual(self.get({'row': 'MANGO'})[0].status_code, 404)
+        self.assertEqual(self.get({'format': 'xml'})[0].status_code, 400)
+
+    @override_settings(BARTER_MATRIX_MAX_KEYS=1)
+    def test_barter_matrix_size_limit(self):
+        """Test that a matrix larger than BARTER_MATRIX_MAX_KEYS must be asked for in parts"""
+        response, body = self.get({})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('?row=', body)
+        self.assertEqual(self.get({'row': 'APPLE - CARTON', 'col': 'ORANGE - BOX'})[0].status_code, 200)
+
+
+class CatalogueViewTest(TestCase):
+    
+    def setUp(self):
+        body = b'["APPLE - CARTON","ORANGE - BOX"]'
+        self.catalogue = Catalogue('2025-09-05-abc', body, gzip.compress(body, mtime=0))
+    
+    def get(self, version, **headers):
+        with patch('main.views.crop_catalogue', return_value=self.catalogue):
+            return catalogue(RequestFactory().get(f'/catalogue/{version}.json', **headers), version)
+    
+    def test_catalogue_view(self):
+        """Test the catalogue is served plain and cached for good"""
+        response = self.get('2025-09-05-abc')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), ['APPLE - CARTON', 'ORANGE - BOX'])
+        self.assertNotIn('Content-Encoding', response)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+    
+    def test_catalogue_view_gzip(self):
+        """Test the precompressed catalogue is sent to clients accepting gzip"""
+        response = self.get('2025-09-05-abc', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(response.content)), ['APPLE - CARTON', 'ORANGE - BOX'])
+    
+    def test_catalogue_view_stale_version(self):
+        """Test an old version redirects to the current catalogue"""
+        response = self.get('2025-08-01-def')
+        
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Location'], '/catalogue/2025-09-05-abc.json')
+    
+    def test_catalogue_url_only_on_search_pages(self):
+        """Test the pricelist is only consulted by pages with a crop search"""
+        with patch('main.context_processors.store') as mock_store:
+            type(mock_store).version = version = PropertyMock(return_value='2025-09-05-abc')
+            for path in ('/', '/feedback/', '/login/'):
+                self.assertNotContains(self.client.get(path), 'CROP_CATALOGUE_URL')
+            version.assert_not_called()
+            
+            self.assertContains(self.client.get('/buy/'), '/catalogue/2025-09-05-abc.json')
+            version.assert_called()
+
+
 class FeedbackViewTest(TestCase):
     
     def test_feedback_view_get(self):
@@ -299,7 +589,8 @@ class InboxViewTest(TestCase):
         # Create a test user
         self.user = User.objects.create_user(
             username='testuser',
-            password='testpass123'
+            password='testpass123',
+            is_staff=True
         )
         
         # Create some test feedback messages
@@ -310,6 +601,7 @@ class InboxViewTest(TestCase):
         """Test that inbox view requires login"""
         # Create a request without authentication
         request = RequestFactory().get('/inbox/')
+        request.user = AnonymousUser()
         
         # Call the view - should redirect to login
         response = inbox_view(request)
@@ -318,6 +610,13 @@ class InboxViewTest(TestCase):
         self.assertEqual(response.status_code, 302)
         self.assertTrue(response.url.startswith('/accounts/login/'))
     
+    def test_inbox_view_requires_staff(self):
+        """Test that signed-in users who are not staff cannot read the inbox"""
+        self.client.force_login(User.objects.create_user(username='visitor', password='testpass123'))
+        
+        self.assertEqual(self.client.get('/inbox/').status_code, 403)
+        self.assertEqual(self.client.get('/inbox/more/').status_code, 403)
+    
     def test_inbox_view_authenticated(self):
         """Test inbox view with authenticated user"""
         # Create a request with authentication
@@ -348,4 +647,48 @@ class InboxViewTest(TestCase):
         # Check that messages are ordered correctly
         messages = response.context_data['messages']
         self.assertEqual(messages[0].message, 'Message 2')  # Most recent first
-        self.assertEqual(messages[1].message, 'Message 1')
\ No newline at end of file
+        self.assertEqual(messages[1].message, 'Message 1')
+
+    def test_inbox_page_title(self):
+        """Test that the inbox title is plain text and the load more script is included once"""
+        self.client.force_login(self.user)
+        response = self.client.get('/inbox/')
+        
+        self.assertContains(response, "<title> BoB's Inbox </title>")
+        self.assertContains(response, '/inbox/more/', count=1)
+
+
+class InboxMoreViewTest(TestCase):
+    
+    def setUp(self):
+        for i in range(3):
+            Feedback.objects.create(name=f'User{i}', message=f'Message {i}')
+        self.user = User.objects.create_user(username='staff', password='testpass123', is_staff=True)
+    
+    def get(self, params=None):
+        request = RequestFactory().get('/inbox/more/', params or {})
+        request.user = self.user
+        return inbox_more(request)
+    
+    @override_settings(INBOX_PAGE_SIZE=2)
+    def test_inbox_more_pages(self):
+        """Test that the load more endpoint pages through messages by cursor"""
+        first = json.loads(self.get().content)
+        self.assertEqual([m['message'] for m in first['messages']], ['Message 2', 'Message 1'])
+        self.assertIsNotNone(first['next'])
+        
+        second = json.loads(self.get({'before': first['next']}).content)
+        self.assertEqual([m['message'] for m in second['messages']], ['Message 0'])
+        self.assertIsNone(second['next'])
+    
+    def test_inbox_more_bad_cursor(self):
+        """Test that a malformed cursor is rejected"""
+        response = self.get({'before': 'abc'})
+        self.assertEqual(response.status_code, 400)
+    
+    def test_inbox_more_requires_login(self):
+        """Test that anonymous callers are sent to the login page instead of getting messages"""
+        response = self.client.get('/inbox/more/')
+        
+        self.assertEqual(response.status_code, 302)
+        self.assertNotIn(b'Message', response.content)
@@ -0,0 +1,97 @@
+const SUGGESTION_LIMIT = 10;
+const DEBOUNCE_MS = 150;
+
+// Every crop display key for the current pricelist, filtered in the browser once loaded.
+// Until then (or if it fails to load) suggestions come from the server.
+let catalogue = null;
+let pendingRequest = null;
+
+function filterCatalogue(term){
+    // Same ranking as the server: prefix matches, then word starts, then anywhere
+    term = term.toUpperCase();
+    const prefix = [], word = [], inner = [];
+    for (const key of catalogue){
+        const position = key.indexOf(term);
+        if (position === 0){
+            prefix.push(key);
+            if (prefix.length >= SUGGESTION_LIMIT) break;
+        } else if (position > 0){
+            ((' ' + key).includes(' ' + term) ? word : inner).push(key);
+        }
+    }
+    return prefix.concat(word, inner).slice(0, SUGGESTION_LIMIT);
+}
+
+function fetchSuggestions(term){
+    // Abort the previous request so a slow answer can never overwrite a newer one
+    if (pendingRequest) pendingRequest.abort();
+    pendingRequest = new AbortController();
+    return fetch(`${AUTOCOMPLETE_URL}?term=${encodeURIComponent(term)}&limit=${SUGGESTION_LIMIT}`,
+                 {signal: pendingRequest.signal})
+        .then(res => res.json());
+}
+
+document.addEventListener('DOMContentLoaded', ()=>{
+    const suggestions = document.getElementById('suggestions');
+    if (!suggestions) {
+        return;
+    }
+    suggestions.hidden = true;
+
+    fetch(CROP_CATALOGUE_URL)
+    .then(res => res.ok ? res.json() : null)
+    .then(data => { catalogue = data; })
+    .catch(() => {});
+
+    function showSuggestions(input, data){
+        suggestions.hidden = false
+        suggestions.innerHTML = '';
+        data.forEach(item => {
+            const li = document.createElement('li');
+            li.textContent = item;
+            li.onclick =()=>{
+            input.value = item;
+            suggestions.innerHTML = '';
+            suggestions.hidden = true;
+            };
+            suggestions.appendChild(li);
+        });
+    }
+
+    ['crop','crop2'].forEach(id => {
+        const input = document.getElementById(id);
+        if (!input){
+            console.error('Could not find input element.');
+            console.log('Available inputs:', document.querySelectorAll('input'));
+            return;
+        }
+
+        let timer = null;
+        input.addEventListener('input', ()=>{
+        clearTimeout(timer);
+        const term = input.value.trim();
+        if(term.length > 1){
+            if (catalogue){
+                showSuggestions(input, filterCatalogue(term));
+                return;
+            }
+            timer = setTimeout(() => {
+                fetchSuggestions(term)
+                .then(data => {
+                    if (input.value.trim() === term) showSuggestions(input, data);
+                })
+                .catch(err => {
+                    if (err.name !== 'AbortError') console.error(err);
+                });
+            }, DEBOUNCE_MS);
+
+        } else{
+            suggestions.innerHTML = '';
+        }
+    });
+});
+});
+
+document.getElementById('closeButton')?.addEventListener('click', function(){
+    document.getElementById('close').style.display = 'none';
+})